@@ -0,0 +1,58 @@
+"""
+SQLite tuning
+
+Every new SQLite connection is configured with the pragmas of SQLITE_PRAGMAS from the
+connection_created signal:
+
+- journal_mode=WAL lets readers run while a writer commits, instead of the rollback
+  journal locking out the whole database,
+- synchronous=NORMAL syncs only at checkpoints, which is safe in WAL mode (a power cut
+  may lose the last commits, never corrupt the database),
+- busy_timeout makes a writer wait for the lock instead of failing with
+  "database is locked",
+- mmap_size and cache_size keep the hot pages in memory across requests.
+
+Read replicas (see project.replicas) only get the pragmas that don't write to the file.
+
+The connections are kept open between requests (CONN_MAX_AGE) with health checks, so
+the pragmas and the page cache are paid for once per connection, not per request.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from project.replicas import replica_aliases
+
+# Pragmy, ktere zapisuji do souboru databaze; replika je jen pro cteni
+WRITE_PRAGMAS = ("journal_mode", "synchronous")
+
+
+def pragma_statements(pragmas):
+    """
+    :param pragmas: Dictionary of pragma names and values.
+    :return: List of PRAGMA statements.
+    """
+    return [f"PRAGMA {name} = {value}" for name, value in pragmas.items()]
+
+
+def apply_pragmas(sqlite_connection, pragmas):
+    """
+    Sets the pragmas on a connection of the sqlite3 module.
+
+    :param sqlite_connection: sqlite3.Connection.
+    :param pragmas: Dictionary of pragma names and values.
+    """
+    for statement in pragma_statements(pragmas):
+        sqlite_connection.execute(statement)
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """Applies SQLITE_PRAGMAS to a new SQLite connection."""
+    if connection.vendor != "sqlite":
+        return
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", {})
+    if connection.alias in replica_aliases():
+        pragmas = {name: value for name, value in pragmas.items() if name not in WRITE_PRAGMAS}
+    # Primo na sqlite3 spojeni, mimo transakce a logovani dotazu
+    apply_pragmas(connection.connection, pragmas)
@@ -0,0 +1,260 @@
+"""
+Request metrics
+
+Collects per-view latency, database and template timings and response sizes and
+renders them in the Prometheus text format.
+
+Every thread records into its own shard, so recording takes no lock; the shards are
+only summed up when the metrics are scraped.
+
+The queries are timed by an execute wrapper installed once on every database connection
+when it is created. It records into the QueryTimer of the current request, found in a
+context variable, which also reaches the threads running the queries of async views;
+outside requests it only passes the query through.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (1000, 5000, 10000, 50000, 100000, 500000, 1000000, 5000000)
+
+HISTOGRAMS = {
+    "replacement_http_request_duration_seconds": ("Request latency in seconds.", LATENCY_BUCKETS),
+    "replacement_db_queries_per_request": ("Database queries per request.", QUERY_COUNT_BUCKETS),
+    "replacement_db_query_duration_seconds": ("Database time per request in seconds.", LATENCY_BUCKETS),
+    "replacement_template_render_duration_seconds": ("Template render time in seconds.", LATENCY_BUCKETS),
+    "replacement_http_response_size_bytes": ("Response body size in bytes.", SIZE_BUCKETS),
+}
+REQUESTS_TOTAL = "replacement_http_requests_total"
+
+
+class MetricsRegistry:
+    """Registry of histograms and counters, sharded per thread."""
+
+    def __init__(self):
+        self.local = threading.local()
+        self.shards = []
+        self.lock = threading.Lock()
+
+    def shard(self):
+        """
+        Returns the shard of the current thread, registering it on first use.
+
+        :return: Dictionary of the thread's metrics.
+        """
+        try:
+            return self.local.shard
+        except AttributeError:
+            shard = self.local.shard = {}
+            with self.lock:
+                self.shards.append(shard)
+            return shard
+
+    def observe(self, name, label, value):
+        """
+        Records a value of a histogram.
+
+        :param name: Name of the histogram from HISTOGRAMS.
+        :param label: Value of the 'view' label.
+        :param value: Observed value.
+        """
+        shard = self.shard()
+        key = (name, label)
+        entry = shard.get(key)
+        if entry is None:
+            entry = shard[key] = [[0] * (len(HISTOGRAMS[name][1]) + 1), 0.0]
+        entry[0][bisect_left(HISTOGRAMS[name][1], value)] += 1
+        entry[1] += value
+
+    def inc(self, name, labels):
+        """
+        Increments a counter.
+
+        :param name: Name of the counter.
+        :param labels: Tuple of (label name, value) pairs.
+        """
+        shard = self.shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0) + 1
+
+    def collect(self):
+        """
+        Sums up the shards of all threads.
+
+        :return: Tuple (histograms, counters) keyed by (name, label).
+        """
+        histograms = {}
+        counters = {}
+        with self.lock:
+            shards = list(self.shards)
+        for shard in shards:
+            for key, entry in list(shard.items()):
+                if key[0] in HISTOGRAMS:
+                    total = histograms.setdefault(key, [[0] * len(entry[0]), 0.0])
+                    total[0] = [a + b for a, b in zip(total[0], entry[0])]
+                    total[1] += entry[1]
+                else:
+                    counters[key] = counters.get(key, 0) + entry
+        return histograms, counters
+
+    def render(self, extra_lines=()):
+        """
+        Renders all metrics in the Prometheus text exposition format.
+
+        :param extra_lines: Additional lines appended to the output.
+        :return: Metrics as text.
+        """
+        histograms, counters = self.collect()
+        lines = []
+
+        for name, (help_text, bounds) in HISTOGRAMS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (metric, view), (buckets, total) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(bounds + ("+Inf",), buckets):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{view="{view}"}} {total}')
+                lines.append(f'{name}_count{{view="{view}"}} {cumulative}')
+
+        lines.append(f"# HELP {REQUESTS_TOTAL} Requests by view, method and status code.")
+        lines.append(f"# TYPE {REQUESTS_TOTAL} counter")
+        for (name, labels), value in sorted(counters.items()):
+            label_text = ",".join(f'{label}="{label_value}"' for label, label_value in labels)
+            lines.append(f"{name}{{{label_text}}} {value}")
+
+        lines.extend(extra_lines)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+class QueryTimer:
+    """Counter of the queries of one request and their time."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+_query_timer = ContextVar("request_query_timer", default=None)
+
+
+def time_query(execute, sql, params, many, context):
+    """Database execute wrapper recording the query into the QueryTimer of the current request."""
+    timer = _query_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.duration += time.perf_counter() - started
+        timer.count += 1
+
+
+def install_query_timer(connection):
+    """
+    Installs time_query on the connection, once.
+
+    :param connection: Django database connection (DatabaseWrapper).
+    """
+    if time_query not in connection.execute_wrappers:
+        # Na zacatek, execute_wrapper() odebira pri ukonceni posledni wrapper seznamu
+        connection.execute_wrappers.insert(0, time_query)
+
+
+@receiver(connection_created)
+def install_query_timer_on_connect(sender, connection, **kwargs):
+    """Installs time_query on every new database connection."""
+    install_query_timer(connection)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records request latency, database query count and time, template render time
+    and response size per URL name (for example 'replacement:brand-list').
+
+    Works in both the sync (WSGI) and the async (ASGI) stack. The per-request work is
+    setting the context variable of the query timer, the connections are not touched.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Spojeni otevrena pred nactenim middleware
+        for connection in connections.all(initialized_only=True):
+            install_query_timer(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        started = time.perf_counter()
+        timer = QueryTimer()
+        token = _query_timer.set(timer)
+        try:
+            response = self.get_response(request)
+        finally:
+            _query_timer.reset(token)
+        self.record(request, response, time.perf_counter() - started, timer)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        timer = QueryTimer()
+        token = _query_timer.set(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _query_timer.reset(token)
+        self.record(request, response, time.perf_counter() - started, timer)
+        return response
+
+    @staticmethod
+    def record(request, response, duration, timer):
+        """
+        Records the latency, size, status and database queries of the response.
+
+        :param request: The HTTP request object.
+        :param response: The response.
+        :param duration: Duration of the request in seconds.
+        :param timer: QueryTimer of the request.
+        :return: Value of the 'view' label.
+        """
+        view = request.resolver_match.view_name if request.resolver_match else "unresolved"
+        registry.observe("replacement_http_request_duration_seconds", view, duration)
+        registry.observe("replacement_db_queries_per_request", view, timer.count)
+        registry.observe("replacement_db_query_duration_seconds", view, timer.duration)
+        if not response.streaming:
+            registry.observe("replacement_http_response_size_bytes", view, len(response.content))
+        registry.inc(REQUESTS_TOTAL, (("view", view), ("method", request.method), ("status", response.status_code)))
+        return view
+
+    def process_template_response(self, request, response):
+        """
+        Measures the rendering of a TemplateResponse, which happens after the view returns.
+        """
+        started = time.perf_counter()
+        view = request.resolver_match.view_name if request.resolver_match else "unresolved"
+        response.add_post_render_callback(
+            lambda rendered: registry.observe(
+                "replacement_template_render_duration_seconds", view, time.perf_counter() - started
+            )
+        )
+        return response
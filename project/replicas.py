@@ -0,0 +1,197 @@
+"""
+Read replicas
+
+Listing, detail, search, export and dashboard requests only read, so their queries can
+go to read-only replicas (REPLACEMENT_READ_REPLICAS, aliases of DATABASES) and leave the
+primary database to the edits, the admin and the importer.
+
+- ReplicaRoutingMiddleware keeps a RoutingState per request in a context variable.
+- Views opt in with replacement.utils.ReplicaReadMixin; everything else reads from the
+  primary.
+- Only the models of REPLICATED_APPS are read from the replicas; sessions and users
+  stay on the primary, so a fresh login is never lost to the replica lag.
+- The first write of a request pins it to the primary, so it reads its own writes.
+  The pin is also kept for REPLACEMENT_REPLICA_PIN_SECONDS by a cookie, so the redirect
+  after an edit doesn't show the replica's older data.
+- Code outside requests (commands, reports) can use read_from_replicas().
+
+Without configured replicas the middleware is not used and all queries go to the
+primary as before.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+PRIMARY = "default"
+PIN_COOKIE = "replica_pin"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+# Aplikace, jejichz modely se smi cist z replik
+REPLICATED_APPS = ("replacement",)
+
+
+class RoutingState:
+    """Routing of the queries of one request (or of a read_from_replicas block)."""
+
+    def __init__(self, pinned=False):
+        """
+        :param pinned: Whether all queries go to the primary from the start.
+        """
+        self.pinned = pinned
+        self.use_replicas = False
+        self.wrote = False
+
+
+_routing_state = ContextVar("replica_routing_state", default=None)
+
+
+def replica_aliases():
+    """
+    :return: List of the database aliases of the read replicas.
+    """
+    return list(getattr(settings, "REPLACEMENT_READ_REPLICAS", []))
+
+
+def use_replicas():
+    """Lets the reads of the current request go to the replicas, unless it is pinned to the primary."""
+    state = _routing_state.get()
+    if state is not None:
+        state.use_replicas = True
+
+
+@contextmanager
+def read_from_replicas():
+    """
+    Routes the reads in the block to the replicas, for use outside of requests.
+
+    :return: Context manager yielding the RoutingState.
+    """
+    state = RoutingState()
+    state.use_replicas = True
+    token = _routing_state.set(state)
+    try:
+        yield state
+    finally:
+        _routing_state.reset(token)
+
+
+def stream_with_state(state, content):
+    """
+    Iterates streaming content with the routing state of its request.
+
+    A streaming response is consumed after the middleware returned, so the queries of
+    the generator would otherwise run without the request's state.
+
+    :param state: RoutingState of the request.
+    :param content: Iterable streaming content.
+    :return: Generator of the same chunks.
+    """
+    iterator = iter(content)
+    while True:
+        token = _routing_state.set(state)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _routing_state.reset(token)
+        yield chunk
+
+
+class ReplicaRouter:
+    """Sends reads of opted-in requests to a random replica, everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        state = _routing_state.get()
+        if state is None or not state.use_replicas or state.pinned:
+            return None
+        if model._meta.app_label not in REPLICATED_APPS:
+            return None
+        replicas = replica_aliases()
+        return random.choice(replicas) if replicas else None
+
+    def db_for_write(self, model, **hints):
+        state = _routing_state.get()
+        if state is not None:
+            # Dalsi cteni pozadavku uz jdou na primarni databazi
+            state.pinned = state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Repliky jsou kopie primarni databaze
+        databases = {PRIMARY, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replica_aliases():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Creates the RoutingState of every request and sets the pin cookie after a write.
+
+    Requests other than GET, HEAD and OPTIONS and requests with the pin cookie are pinned
+    to the primary from the start.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replica_aliases():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        state = self.state_for(request)
+        token = _routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing_state.reset(token)
+        return self.finish(state, response)
+
+    async def __acall__(self, request):
+        state = self.state_for(request)
+        token = _routing_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing_state.reset(token)
+        return self.finish(state, response)
+
+    @staticmethod
+    def state_for(request):
+        """
+        :param request: The HTTP request object.
+        :return: New RoutingState of the request.
+        """
+        return RoutingState(pinned=request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES)
+
+    @staticmethod
+    def finish(state, response):
+        """
+        Sets the pin cookie after a write and keeps the state for streaming content.
+
+        :param state: RoutingState of the request.
+        :param response: The response.
+        :return: The response.
+        """
+        if state.wrote:
+            response.set_cookie(
+                PIN_COOKIE, "1", max_age=settings.REPLACEMENT_REPLICA_PIN_SECONDS, httponly=True, samesite="Lax"
+            )
+        if response.streaming and not response.is_async:
+            response.streaming_content = stream_with_state(state, response.streaming_content)
+        return response
@@ -46,6 +46,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Prvni, aby merila celou dobu pozadavku
+    'project.metrics.RequestMetricsMiddleware',
+    # Obaluje vse ostatni, aby videla kazdy zapis pozadavku
+    'project.replicas.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,13 +66,20 @@ TEMPLATES = [
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'project/templates',
                  ],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Zkompilovane sablony se drzi v pameti procesu, pri DEBUG se po zmene souboru nactou znovu
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'replacement.context_processors.brands',
             ],
         },
     },
@@ -84,9 +95,89 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Spojeni zustava otevrene mezi pozadavky, pred pouzitim se overi
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Jak dlouho (v sekundach) ceka zapis na zamek databaze
+            'timeout': 20,
+        },
+    }
+}
+
+# Repliky jen pro cteni (aliasy z DATABASES) pro vypisy, detail, hledani, export a prehled.
+# Lokalne napr. kopie SQLite obnovovana prikazem sync_replica:
+#   DATABASES['replica'] = {'ENGINE': 'django.db.backends.sqlite3',
+#                           'NAME': 'file:' + str(BASE_DIR / 'replica.sqlite3') + '?mode=ro',
+#                           'OPTIONS': {'uri': True}}
+#   REPLACEMENT_READ_REPLICAS = ['replica']
+DATABASE_ROUTERS = ['project.replicas.ReplicaRouter']
+REPLACEMENT_READ_REPLICAS = []
+# Jak dlouho (v sekundach) po zapisu cte uzivatel jen z primarni databaze
+REPLACEMENT_REPLICA_PIN_SECONDS = 10
+
+# Pragmy kazdeho SQLite spojeni, viz project/database.py
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    # Zaporna hodnota je velikost v KiB
+    'cache_size': -64000,
+    'temp_store': 'MEMORY',
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# LocMemCache is per process; with several workers a shared backend saves building the same
+# pages in every worker, e.g. 'django.core.cache.backends.filebased.FileBasedCache' with
+# 'LOCATION': BASE_DIR / 'cache'. The brand versions the listings are keyed by are kept in the
+# database (Brand.cache_version), so changes from any process invalidate them with any backend.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'replacement',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
+# Jak dlouho (v sekundach) zustava stranka vypisu brandu v cache
+REPLACEMENT_LISTING_CACHE_TIMEOUT = 60 * 60
+
+# Memo vypoctu replacementu: velikost LRU v procesu a volitelna sdilena cache (alias z CACHES)
+REPLACEMENT_SCORE_MEMO_SIZE = 4096
+REPLACEMENT_SCORE_SHARED_CACHE = None
+REPLACEMENT_SCORE_SHARED_CACHE_TIMEOUT = 24 * 60 * 60
+
+# JSON API: maximalni velikost tela pozadavku (v bajtech) a pocet polozek v jednom pozadavku
+REPLACEMENT_API_MAX_BODY_SIZE = 1024 * 1024
+REPLACEMENT_API_MAX_ITEMS = 1000
+
+# Export: pocet radku nactenych z databaze a odeslanych najednou
+REPLACEMENT_EXPORT_CHUNK_SIZE = 2000
+
+# Tabulka prahu opravy: pro kazdy stroj a stari 0 az N mesicu
+REPLACEMENT_THRESHOLD_MAX_AGE_MONTHS = 120
+
+# Historie vypoctu: zapis po davkach (pocet rozhodnuti nebo nejdele po N sekundach), limit bufferu pri vypadku databaze
+REPLACEMENT_DECISIONS_BATCH_SIZE = 100
+REPLACEMENT_DECISIONS_FLUSH_INTERVAL = 2.0
+REPLACEMENT_DECISIONS_MAX_PENDING = 10000
+
+# Fronta uloh na pozadi (run_workers): adresar souboru uloh, delka zamku a prodlouzeni pri kazdem postupu,
+# prodleva prvniho opakovani (dal se zdvojnasobuje), pocet pokusu, interval dotazu do prazdne fronty
+# a po kolika dnech se dokoncene ulohy mazou
+REPLACEMENT_JOBS_DIR = BASE_DIR / 'jobs'
+REPLACEMENT_JOBS_LEASE_SECONDS = 60
+REPLACEMENT_JOBS_RETRY_DELAY = 30
+REPLACEMENT_JOBS_MAX_ATTEMPTS = 3
+REPLACEMENT_JOBS_POLL_INTERVAL = 1.0
+REPLACEMENT_JOBS_KEEP_DAYS = 7
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
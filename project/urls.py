@@ -19,12 +19,13 @@ from django.contrib import admin
 from django.urls import path, include
 
 from project.views import AccountLogoutConfirmationView, AccountLoginView, AccountLoginConfirmationView, \
-    AccountLogoutView, AccountLogoutYesNoView, HomePageRedirectView
+    AccountLogoutView, AccountLogoutYesNoView, HomePageRedirectView, MetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', HomePageRedirectView.as_view(), name='home'),
     path('replacement/', include('replacement.urls')),
+    path('metrics', MetricsView.as_view(), name='metrics'),
     # Login/logout
     path('login/', AccountLoginView.as_view(), name='login'),
     path('login-confirmation/', AccountLoginConfirmationView.as_view(), name='login-confirmation'),
@@ -1,10 +1,13 @@
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import AuthenticationForm
+from django.contrib.auth.mixins import UserPassesTestMixin
 from django.contrib.auth.models import User
-from django.http import HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect
 from django.urls import reverse_lazy
-from django.views.generic import TemplateView, FormView, RedirectView
+from django.views.generic import TemplateView, FormView, RedirectView, View
 
+from project.metrics import registry
+from replacement.memo import get_score_memo
 from replacement.utils import is_member_of_group
 
 
@@ -20,6 +23,38 @@ class HomePageRedirectView(RedirectView):
         """
         return reverse_lazy(self.pattern_name)
 
+class MetricsView(UserPassesTestMixin, View):
+    """Staff-only view exposing the request metrics in the Prometheus text format."""
+    raise_exception = True
+
+    def test_func(self):
+        """
+        Allows only staff users to read the metrics.
+
+        :return: True if the user is a staff member.
+        """
+        return self.request.user.is_staff
+
+    def get(self, request, *args, **kwargs):
+        """
+        Renders the collected metrics together with the replacement memo counters.
+
+        :param request: The HTTP request object.
+        :return: Metrics as plain text.
+        """
+        memo_stats = get_score_memo().stats()
+        memo_lines = [
+            "# HELP replacement_score_memo_total Replacement calculation memo lookups by result.",
+            "# TYPE replacement_score_memo_total counter",
+            f'replacement_score_memo_total{{result="hit"}} {memo_stats["hits"]}',
+            f'replacement_score_memo_total{{result="shared_hit"}} {memo_stats["shared_hits"]}',
+            f'replacement_score_memo_total{{result="miss"}} {memo_stats["misses"]}',
+            "# HELP replacement_score_memo_size Entries in the replacement calculation memo.",
+            "# TYPE replacement_score_memo_size gauge",
+            f'replacement_score_memo_size {memo_stats["size"]}',
+        ]
+        return HttpResponse(registry.render(memo_lines), content_type="text/plain; version=0.0.4; charset=utf-8")
+
 # ***********************************
 # Login/Logout process
 # ***********************************
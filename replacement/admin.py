@@ -1,12 +1,144 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.db.models import Q
+from django.template.response import TemplateResponse
+from django.urls import reverse
+from django.utils.html import format_html
 
-from replacement.models import Hardware
+from replacement import repricing, search
+from replacement.forms import RepricingForm
+from replacement.models import ApiToken, Asset, Hardware, Job, ReplacementDecision
 
 
 # Register your models here.
 @admin.register(Hardware)
 class ContactAdmin(admin.ModelAdmin):
     list_display = ("brand_name", "hw_name", "hw_price", "write_off_length")
+    list_select_related = ("brand_name",)
     # umozni fulltextove vyhledavani v polich
     search_fields = ("brand_name__brand_name","hw_name", "hw_price")
+    actions = ["reprice_selected"]
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Searches the hardware and brand names in the trigram index, every numeric term matches either
+        the names or the price exactly. Falls back to the icontains search of search_fields when the index
+        can't answer the terms.
+
+        :param request: The HTTP request object.
+        :param queryset: Queryset of the change list.
+        :param search_term: Text entered into the admin search box.
+        :return: Tuple (queryset, may_have_duplicates).
+        """
+        terms = search.search_terms(search_term)
+        if not search.uses_index(terms, queryset.db):
+            return super().get_search_results(request, queryset, search_term)
+
+        # Textove terminy hleda index naraz, kazdy ciselny muze misto nazvu odpovidat cene
+        text_terms = [term for term in terms if not term.isdigit()]
+        condition = self.names_condition(text_terms, queryset.db) if text_terms else Q()
+        for term in terms:
+            if term.isdigit():
+                condition &= self.names_condition([term], queryset.db) | Q(hw_price=int(term))
+        return queryset.filter(condition), False
+
+    @staticmethod
+    def names_condition(terms, using):
+        """
+        Builds the condition requiring all terms in the hardware or brand name.
+
+        :param terms: Search terms.
+        :param using: Database alias.
+        :return: Q object, using the trigram index when it can answer the terms.
+        """
+        if search.uses_index(terms, using):
+            return Q(pk__in=search.matching_ids(terms))
+        return search.icontains_filter(terms)
+
+    @admin.action(description="Přecenit vybraná zařízení", permissions=["change"])
+    def reprice_selected(self, request, queryset):
+        """
+        Shows the preview of the re-pricing of the selected hardware and applies it after confirmation.
+
+        :param request: The HTTP request object.
+        :param queryset: Selected hardware.
+        :return: Page with the form and the preview, None (back to the change list) once applied.
+        """
+        form = RepricingForm(request.POST if "preview" in request.POST or "apply" in request.POST else None)
+        rows = totals = None
+        if form.is_valid():
+            change = {"percent": form.cleaned_data["percent"], "amount": form.cleaned_data["amount"]}
+            if "apply" in request.POST:
+                # Prahy a skore prepocita uloha na pozadi, pozadavek by na ne cekal minuty
+                updated = repricing.reprice(queryset, background=True, **change)
+                self.message_user(request, format_html(
+                    'Přeceněno {} zařízení. Hranice opravy a skóre zařízení se přepočítají na pozadí, '
+                    'průběh je v <a href="{}">seznamu úloh</a>.', updated, reverse("replacement:job-list"),
+                ), messages.SUCCESS)
+                return None
+            rows, totals = repricing.preview(queryset, **change)
+
+        context = {
+            **self.admin_site.each_context(request),
+            "title": "Přecenění zařízení",
+            "opts": self.model._meta,
+            "form": form,
+            "rows": rows,
+            "totals": totals,
+            "selected_count": queryset.count(),
+            "select_across": request.POST.get("select_across", "0"),
+            "selected": request.POST.getlist(ACTION_CHECKBOX_NAME),
+            "action_checkbox_name": ACTION_CHECKBOX_NAME,
+        }
+        return TemplateResponse(request, "admin/replacement/hardware/reprice.html", context)
+
+
+@admin.register(Asset)
+class AssetAdmin(admin.ModelAdmin):
+    list_display = ("serial_number", "store", "hardware", "production_date")
+    list_select_related = ("hardware",)
+    search_fields = ("serial_number", "store")
+    # stroju jsou desitky tisic, vyber podle ID misto rozbalovaciho seznamu
+    raw_id_fields = ("hardware",)
+
+
+@admin.register(ApiToken)
+class ApiTokenAdmin(admin.ModelAdmin):
+    list_display = ("name", "is_active", "created")
+    list_filter = ("is_active",)
+    # klic se generuje prikazem create_api_token, v adminu jde token jen deaktivovat
+    readonly_fields = ("name", "created")
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(ReplacementDecision)
+class ReplacementDecisionAdmin(admin.ModelAdmin):
+    list_display = ("created", "hardware", "user", "api_token", "age_months", "repair_offer", "service_cost",
+                    "replacement_calculation", "verdict")
+    list_filter = ("verdict", "created")
+    list_select_related = ("hardware", "user", "api_token")
+    date_hierarchy = "created"
+
+    # historie je jen pro cteni
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("pk", "kind", "status", "user", "attempts", "progress_done", "progress_total", "created",
+                    "finished")
+    list_filter = ("status", "kind")
+    list_select_related = ("user",)
+    date_hierarchy = "created"
+    # ulohy zaklada aplikace, v adminu jde upravit jen stav a cas dalsiho pokusu
+    readonly_fields = ("kind", "payload", "user", "locked_by", "locked_until", "progress_done", "progress_total",
+                       "progress_message", "result", "error", "created", "started", "finished")
+
+    def has_add_permission(self, request):
+        return False
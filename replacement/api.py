@@ -0,0 +1,266 @@
+"""
+JSON API
+
+Machine access to the replacement calculation for the ticketing and procurement
+systems. Clients authenticate with an ApiToken sent as 'Authorization: Token <key>'
+and post a JSON array of items; all referenced hardware is loaded in one query and
+the whole request is scored in one batch.
+"""
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from replacement import calculation
+from replacement.decisions import record_decision
+from replacement.models import ApiToken, Hardware
+from replacement.thresholds import thresholds_for
+
+
+# Nejvetsi cele cislo SQLite, vetsi ID by v dotazu preteklo
+MAX_ID = 2 ** 63 - 1
+
+# Pole polozky pozadavku, stejna pravidla jako ReplacementForm
+ITEM_FIELDS = {
+    "hardware_id": forms.IntegerField(min_value=1, max_value=MAX_ID),
+    "production_date": forms.DateField(),
+    "repair_offer": forms.DecimalField(max_digits=10, decimal_places=2),
+    "service_cost": forms.DecimalField(max_digits=10, decimal_places=2),
+}
+
+# Typy JSON hodnot, ktere pole prijimaji (cisla s desetinnou carkou jsou Decimal, viz parse_float)
+ITEM_TYPES = {
+    "hardware_id": (int, str),
+    "production_date": (str,),
+    "repair_offer": (int, Decimal, str),
+    "service_cost": (int, Decimal, str),
+}
+
+
+def clean_item(item, today):
+    """
+    Validates one item of the scoring request with the fields of ITEM_FIELDS, values of
+    other JSON types than ITEM_TYPES are rejected before reaching the fields.
+
+    The fields are used directly instead of a Form per item, which would deep-copy
+    its fields on every instantiation and dominate the time of a large request.
+
+    :param item: Decoded item of the request.
+    :param today: Date the calculation is made for.
+    :return: Tuple (cleaned data, errors in the format of Form.errors.get_json_data()).
+    """
+    if not isinstance(item, dict):
+        return None, {"__all__": [{"message": "Položka musí být objekt.", "code": "invalid"}]}
+
+    cleaned_data = {}
+    errors = {}
+    for name, field in ITEM_FIELDS.items():
+        value = item.get(name)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, ITEM_TYPES[name])):
+            errors[name] = [{"message": "Neplatný typ hodnoty.", "code": "invalid_type"}]
+            continue
+        try:
+            cleaned_data[name] = field.clean(value)
+        except ValidationError as error:
+            errors[name] = [
+                {"message": message, "code": detail.code or ""}
+                for detail, message in zip(error.error_list, error.messages)
+            ]
+
+    production_date = cleaned_data.get("production_date")
+    if production_date and production_date > today:
+        errors["production_date"] = [{"message": "Datum výroby musí být v minulosti.", "code": "future"}]
+    return cleaned_data, errors
+
+
+def token_from_request(request):
+    """
+    Reads the API key from the Authorization header and finds its token.
+
+    :param request: The HTTP request object.
+    :return: Active ApiToken, or None.
+    """
+    scheme, _, key = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() not in ("token", "bearer"):
+        return None
+    return ApiToken.authenticate(key.strip())
+
+
+def unauthorized_response():
+    """
+    :return: JSON response rejecting a request without a valid token.
+    """
+    response = error_response(401, "Chybí nebo je neplatný API token.")
+    response["WWW-Authenticate"] = "Token"
+    return response
+
+
+def error_response(status, message):
+    """
+    Builds the JSON response of a rejected request.
+
+    :param status: HTTP status code.
+    :param message: Error message for the client.
+    :return: JSON response with the error.
+    """
+    return JsonResponse({"error": message}, status=status)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class ReplacementScoreApiView(View):
+    """
+    Scores a batch of devices.
+
+    Request body: [{"hardware_id": 1, "production_date": "2020-01-31", "repair_offer": "1500.00", "service_cost": "0"}, ...]
+    Response: {"results": [...]} with one result per item in the same order. A valid item has
+    the age in months, the replacement calculation value, the verdict and the message, an
+    invalid one has "errors" keyed by field.
+    """
+    http_method_names = ["post"]
+
+    def post(self, request, *args, **kwargs):
+        """
+        Authenticates the client, validates the items and scores the valid ones.
+
+        :param request: The HTTP request object.
+        :return: JSON response with the results.
+        """
+        token = token_from_request(request)
+        if token is None:
+            return unauthorized_response()
+
+        max_body_size = settings.REPLACEMENT_API_MAX_BODY_SIZE
+        try:
+            content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            content_length = 0
+        if content_length > max_body_size or len(request.body) > max_body_size:
+            return error_response(413, f"Tělo požadavku je větší než {max_body_size} bajtů.")
+
+        try:
+            items = json.loads(request.body, parse_float=Decimal)
+        except (UnicodeDecodeError, ValueError):
+            return error_response(400, "Tělo požadavku není platný JSON.")
+        if not isinstance(items, list):
+            return error_response(400, "Tělo požadavku musí být pole položek.")
+        if len(items) > settings.REPLACEMENT_API_MAX_ITEMS:
+            return error_response(413, f"Požadavek může obsahovat nejvýše {settings.REPLACEMENT_API_MAX_ITEMS} položek.")
+
+        return JsonResponse({"results": self.score_items(items, token)})
+
+    @staticmethod
+    def score_items(items, token=None):
+        """
+        Validates and scores the items, the valid ones are recorded into the decision history.
+
+        :param items: Decoded items of the request.
+        :param token: ApiToken of the calling system.
+        :return: List of results in the order of the items.
+        """
+        today = datetime.today().date()
+        results = [None] * len(items)
+        cleaned_by_index = {}
+
+        for index, item in enumerate(items):
+            cleaned_data, errors = clean_item(item, today)
+            if errors:
+                results[index] = {"index": index, "errors": errors}
+            else:
+                cleaned_by_index[index] = cleaned_data
+
+        # Vsechny stroje jednim dotazem
+        hardware = Hardware.objects.in_bulk({data["hardware_id"] for data in cleaned_by_index.values()})
+
+        valid = []
+        for index, data in cleaned_by_index.items():
+            device = hardware.get(data["hardware_id"])
+            if device is None:
+                results[index] = {"index": index, "errors": {"hardware_id": [{"message": "Stroj neexistuje.", "code": "not_found"}]}}
+            elif not device.hw_price or not device.write_off_length:
+                results[index] = {"index": index, "errors": {"hardware_id": [
+                    {"message": "Stroj nemá pořizovací cenu nebo délku odpisu.", "code": "not_scorable"}
+                ]}}
+            else:
+                valid.append((index, device, data))
+
+        if valid:
+            scores = calculation.score_batch(
+                [device.hw_price for _, device, _ in valid],
+                [device.write_off_length for _, device, _ in valid],
+                [data["production_date"] for _, _, data in valid],
+                [data["repair_offer"] for _, _, data in valid],
+                [data["service_cost"] for _, _, data in valid],
+                today=today,
+            )
+            for (index, device, data), age, value, verdict in zip(valid, scores.age_months, scores.scores, scores.verdicts):
+                results[index] = {
+                    "index": index,
+                    "hardware_id": device.pk,
+                    "age_months": int(age),
+                    "replacement_calculation": int(value),
+                    "verdict": str(verdict),
+                    "message": calculation.message_for(int(value)),
+                }
+                record_decision(
+                    device, data["production_date"], data["repair_offer"], data["service_cost"], int(value),
+                    age_months=int(age), api_token=token,
+                )
+
+        return results
+
+
+class BreakEvenThresholdApiView(View):
+    """
+    Returns the precomputed break-even repair costs of a device.
+
+    Without the age_months parameter all ages are returned. Response:
+    {"hardware_id": 1, "pending": false, "thresholds": [{"age_months": 0, "individual_from": "...", "repair_band_from": "...",
+    "replacement_from": "..."}, ...]} with the amounts as strings in crowns; pending tells that
+    the thresholds wait for a rebuild after a bulk change of the hardware (see refresh).
+    """
+    http_method_names = ["get"]
+
+    def get(self, request, *args, **kwargs):
+        """
+        Authenticates the client and reads the thresholds of the hardware.
+
+        :param request: The HTTP request object.
+        :return: JSON response with the thresholds.
+        """
+        if token_from_request(request) is None:
+            return unauthorized_response()
+
+        ages = None
+        if "age_months" in request.GET:
+            try:
+                ages = [int(age) for age in request.GET.getlist("age_months")]
+            except ValueError:
+                return error_response(400, "Parametr age_months musí být celé číslo.")
+
+        pending = Hardware.objects.filter(pk=self.kwargs["pk"]).values_list("refresh_pending", flat=True).first()
+        if pending is None:
+            return error_response(404, "Stroj neexistuje.")
+
+        thresholds = thresholds_for(self.kwargs["pk"], ages).values_list(
+            "age_months", "individual_from", "repair_band_from", "replacement_from"
+        )
+        return JsonResponse({
+            "hardware_id": self.kwargs["pk"],
+            "pending": pending,
+            "thresholds": [
+                {
+                    "age_months": age_months,
+                    "individual_from": str(individual_from),
+                    "repair_band_from": str(repair_band_from),
+                    "replacement_from": str(replacement_from),
+                }
+                for age_months, individual_from, repair_band_from, replacement_from in thresholds
+            ],
+        })
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class ReplacementConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'replacement'
+
+    def ready(self):
+        # Registrace signalu
+        from replacement import signals  # noqa: F401
+        # Registrace uloh na pozadi
+        from replacement import tasks  # noqa: F401
+        # Ladeni SQLite spojeni
+        from project import database  # noqa: F401
+        # Mereni dotazu pozadavku
+        from project import metrics  # noqa: F401
@@ -0,0 +1,78 @@
+"""
+Caching of the brand listings
+
+Every brand has a version number stored in the database (Brand.cache_version). Cached
+listing pages and rows are keyed by it, so bumping the version after a change makes all
+pages of the brand unreachable at once, without having to find and delete them.
+
+The version is bumped in the transaction of the change, so every process, including
+the importer, the re-pricing command and the background workers, invalidates the pages
+cached by the web processes, whatever the cache backend.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from replacement.models import Brand
+
+BRAND_LISTING_KEY = "replacement:brand-listing:{}:{}:{}"
+
+
+def bump_brand_versions(brand_ids):
+    """
+    Invalidates the cached listings of the brands.
+
+    Called after the change was written. A page rebuilt in the meantime, still from the
+    old data, is stored under the old version and never shown again; the new version is
+    visible to other processes only together with the committed change.
+
+    :param brand_ids: Primary keys of the changed brands.
+    """
+    brand_ids = {brand_id for brand_id in brand_ids if brand_id is not None}
+    if brand_ids:
+        Brand.objects.filter(pk__in=brand_ids).update(cache_version=F("cache_version") + 1)
+
+
+def brand_listing_key(brand, *parts):
+    """
+    Returns the cache key of a brand listing page at the brand's version.
+
+    :param brand: The Brand, as loaded by the request.
+    :param parts: Values identifying the page, for example the cursor and page size.
+    :return: Cache key.
+    """
+    return BRAND_LISTING_KEY.format(brand.pk, brand.cache_version, ":".join(str(part) for part in parts))
+
+
+def cached_brand_listing(brand, parts, build):
+    """
+    Returns a cached brand listing page, building and storing it on a miss.
+
+    :param brand: The Brand, as loaded by the request.
+    :param parts: Values identifying the page.
+    :param build: Callable returning the page when it is not cached.
+    :return: The page.
+    """
+    key = brand_listing_key(brand, *parts)
+    page = cache.get(key)
+    if page is None:
+        page = build()
+        cache.set(key, page, timeout=settings.REPLACEMENT_LISTING_CACHE_TIMEOUT)
+    return page
+
+
+async def acached_brand_listing(brand, parts, build):
+    """
+    Async version of cached_brand_listing.
+
+    :param brand: The Brand, as loaded by the request.
+    :param parts: Values identifying the page.
+    :param build: Coroutine function returning the page when it is not cached.
+    :return: The page.
+    """
+    key = brand_listing_key(brand, *parts)
+    page = await cache.aget(key)
+    if page is None:
+        page = await build()
+        await cache.aset(key, page, timeout=settings.REPLACEMENT_LISTING_CACHE_TIMEOUT)
+    return page
@@ -0,0 +1,351 @@
+"""
+Replacement calculation
+
+The replacement equation without any Django dependency. The scalar API scores a
+single device, the batch API scores many devices at once with NumPy arrays and
+gives identical results row by row.
+"""
+from calendar import monthrange
+from collections import namedtuple
+from datetime import date, datetime
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - the batch API is unavailable without NumPy
+    np = None
+
+# Hranice rovnice - nad touto hodnotou se stroj meni
+REPLACEMENT_THRESHOLD = 10
+
+VERDICT_REPLACE = "replace"
+VERDICT_INDIVIDUAL = "individual"
+VERDICT_REPAIR = "repair"
+
+MESSAGES = {
+    VERDICT_REPLACE: "Replacement proběhne, oprava je nákladná. Výsledek rovnice je {}.",
+    VERDICT_INDIVIDUAL: "Je to na individuálním posouzení, výsledek rovnice je {}.",
+    VERDICT_REPAIR: "Replacement neproběhne, zařízení je buďto nové nebo je oprava výhodná. Výsledek rovnice je {}.",
+}
+
+UNIX_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+BatchScores = namedtuple("BatchScores", ["age_months", "scores", "verdicts"])
+
+# Nejnizsi vysledek rovnice individualniho posouzeni, pasma opravy nad hranici (10) a replacementu
+LEVEL_INDIVIDUAL = -REPLACEMENT_THRESHOLD + 1
+LEVEL_REPAIR_BAND = REPLACEMENT_THRESHOLD
+LEVEL_REPLACE = REPLACEMENT_THRESHOLD + 1
+
+BreakEvenCosts = namedtuple("BreakEvenCosts", ["individual_from", "repair_band_from", "replacement_from"])
+
+
+# ***********************************
+# Scalar API
+# ***********************************
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def age_in_months(production_date, today=None):
+    """
+    Calculates the age of the hardware in whole months, the same way as
+    relativedelta(today, production_date).years * 12 + .months.
+
+    :param production_date: Production date of the device.
+    :param today: Date the age is calculated for, defaults to today.
+    :raises ValueError: If the production date is in the future.
+    :return: Age in months.
+    """
+    production_date = _as_date(production_date)
+    today = _as_date(today or datetime.today().date())
+    if production_date > today:
+        raise ValueError("Datum výroby musí být v minulosti.")
+
+    months = (today.year - production_date.year) * 12 + today.month - production_date.month
+
+    # relativedelta clamps the day to the end of a shorter month, so on the last
+    # day of the month every month started so far counts as a whole month.
+    if production_date.day > today.day and today.day != monthrange(today.year, today.month)[1]:
+        months -= 1
+    return months
+
+
+def score(hw_price, write_off_length, hardware_age, repair_offer, service_cost):
+    """
+    Performs the replacement calculation for a single device.
+
+    :param hw_price: Acquisition price of the hardware.
+    :param write_off_length: Write-off length of the hardware in years.
+    :param hardware_age: Age of the hardware in whole months.
+    :param repair_offer: Repair price offer.
+    :param service_cost: Cost of the previous repairs.
+    :return: Replacement calculation value.
+    """
+    # Calculate the residual value of the hardware
+    remaining_months = max(0, write_off_length * 12 - hardware_age)
+    residual_value = float((remaining_months / (write_off_length * 12)) * hw_price)
+
+    # Perform the replacement equation
+    ers = float(repair_offer) + float(service_cost)
+    kpc = hw_price * 0.2
+    tbo = 0 if hardware_age < 60 else (hardware_age - 60) / 3
+    ezh = ((residual_value + 1) / hw_price) * 100
+    return int(((ers - kpc) / 1000) + tbo - ezh)
+
+
+def residual_value_hellers(hw_price, write_off_length, hardware_age):
+    """
+    Calculates the residual value of the hardware in whole hellers (0.01 CZK), rounded half up.
+
+    The value is computed in integers, so the database computes exactly the same value
+    (see valuation.residual_value_expression) without any float rounding.
+
+    :param hw_price: Acquisition price of the hardware.
+    :param write_off_length: Write-off length of the hardware in years (non-zero).
+    :param hardware_age: Age of the hardware in whole months.
+    :return: Residual value in hellers.
+    """
+    write_off_months = write_off_length * 12
+    remaining_months = max(0, write_off_months - hardware_age)
+    return (remaining_months * hw_price * 200 + write_off_months) // (2 * write_off_months)
+
+
+def verdict_for(replacement_calculation):
+    """
+    Maps a replacement calculation value to a verdict.
+
+    A value of exactly the threshold falls through to a repair, as it always did.
+
+    :param replacement_calculation: Replacement calculation value.
+    :return: One of VERDICT_REPLACE, VERDICT_INDIVIDUAL or VERDICT_REPAIR.
+    """
+    if replacement_calculation > REPLACEMENT_THRESHOLD:
+        return VERDICT_REPLACE
+    if -REPLACEMENT_THRESHOLD < replacement_calculation < REPLACEMENT_THRESHOLD:
+        return VERDICT_INDIVIDUAL
+    return VERDICT_REPAIR
+
+
+def message_for(replacement_calculation):
+    """
+    Returns the message for the user based on the replacement calculation value.
+
+    :param replacement_calculation: Replacement calculation value.
+    :return: Message with the verdict and the value.
+    """
+    return MESSAGES[verdict_for(replacement_calculation)].format(replacement_calculation)
+
+
+# ***********************************
+# Batch API
+# ***********************************
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("The batch replacement calculation requires NumPy.")
+
+
+def _as_day_array(values):
+    """
+    Converts dates, datetimes or a datetime64 array to a datetime64[D] array.
+
+    :param values: Iterable of dates or a NumPy datetime64 array.
+    :return: NumPy array of days.
+    """
+    if isinstance(values, np.ndarray) and np.issubdtype(values.dtype, np.datetime64):
+        return values.astype("datetime64[D]")
+    # Converting ordinals is much faster than letting NumPy parse date objects
+    ordinals = np.fromiter(map(date.toordinal, values), dtype=np.int64)
+    return (ordinals - UNIX_EPOCH_ORDINAL).astype("datetime64[D]")
+
+
+def _as_float_array(values):
+    """
+    Converts numbers (including Decimals) to a float64 array.
+
+    :param values: Iterable of numbers or a NumPy array.
+    :return: NumPy float64 array.
+    """
+    if isinstance(values, np.ndarray):
+        return values.astype(np.float64)
+    return np.fromiter(map(float, values), dtype=np.float64)
+
+
+def hardware_age_months(production_dates, today=None):
+    """
+    Calculates the age of many devices in whole months, see age_in_months.
+
+    :param production_dates: Iterable of production dates.
+    :param today: Date the age is calculated for, defaults to today.
+    :raises ValueError: If any production date is in the future.
+    :return: NumPy int64 array with the age in months.
+    """
+    _require_numpy()
+    today = _as_date(today or datetime.today().date())
+
+    days = _as_day_array(production_dates)
+    if np.any(days > np.datetime64(today, "D")):
+        raise ValueError("Datum výroby musí být v minulosti.")
+
+    months = days.astype("datetime64[M]")
+    day_of_month = (days - months).astype(np.int64) + 1
+    today_month = np.datetime64(today, "M")
+    age = (today_month - months).astype(np.int64)
+
+    if today.day != monthrange(today.year, today.month)[1]:
+        age -= day_of_month > today.day
+
+    return age
+
+
+def score_batch(hw_prices, write_off_lengths, production_dates, repair_offers, service_costs, today=None):
+    """
+    Performs the replacement calculation for many devices at once.
+
+    All arguments are sequences of the same length, one item per device.
+
+    :param hw_prices: Acquisition prices of the hardware.
+    :param write_off_lengths: Write-off lengths of the hardware in years.
+    :param production_dates: Production dates of the devices.
+    :param repair_offers: Repair price offers.
+    :param service_costs: Costs of the previous repairs.
+    :param today: Date the calculation is made for, defaults to today.
+    :raises ValueError: If the inputs differ in length, a production date is in the future
+        or a price or write-off length is zero.
+    :return: BatchScores with the age in months, the replacement calculation values and verdicts.
+    """
+    _require_numpy()
+    age = hardware_age_months(production_dates, today)
+    return score_ages_batch(hw_prices, write_off_lengths, age, repair_offers, service_costs)
+
+
+def score_ages_batch(hw_prices, write_off_lengths, ages, repair_offers, service_costs):
+    """
+    Performs the replacement calculation for many devices with a known age in months.
+
+    :param hw_prices: Acquisition prices of the hardware.
+    :param write_off_lengths: Write-off lengths of the hardware in years.
+    :param ages: Ages of the devices in whole months.
+    :param repair_offers: Repair price offers.
+    :param service_costs: Costs of the previous repairs.
+    :raises ValueError: If the inputs differ in length or a price or write-off length is zero.
+    :return: BatchScores with the age in months, the replacement calculation values and verdicts.
+    """
+    _require_numpy()
+    hw_prices = np.asarray(hw_prices, dtype=np.int64)
+    write_off_months = np.asarray(write_off_lengths, dtype=np.int64) * 12
+    age = np.asarray(ages, dtype=np.int64)
+    repair_offers = _as_float_array(repair_offers)
+    service_costs = _as_float_array(service_costs)
+
+    sizes = {len(hw_prices), len(write_off_months), len(age), len(repair_offers), len(service_costs)}
+    if len(sizes) > 1:
+        raise ValueError("All inputs must have the same length.")
+    if np.any(hw_prices == 0) or np.any(write_off_months == 0):
+        raise ValueError("Pořizovací cena a délka odpisu nesmí být nulové.")
+
+    # Calculate the residual value of the hardware
+    remaining_months = np.maximum(0, write_off_months - age)
+    residual_value = (remaining_months / write_off_months) * hw_prices
+
+    # Perform the replacement equation, in the same order as score() does
+    ers = repair_offers + service_costs
+    kpc = hw_prices * 0.2
+    tbo = np.where(age < 60, 0.0, (age - 60) / 3)
+    ezh = ((residual_value + 1) / hw_prices) * 100
+    scores = np.trunc(((ers - kpc) / 1000) + tbo - ezh).astype(np.int64)
+
+    return BatchScores(age, scores, verdicts_for(scores))
+
+
+def score_hardware_batch(rows, today=None):
+    """
+    Performs the replacement calculation for (hardware, production date, repair offer, service cost) rows.
+
+    :param rows: Iterable of tuples with an object with hw_price and write_off_length
+        (usually Hardware), production date, repair offer and service cost.
+    :param today: Date the calculation is made for, defaults to today.
+    :return: BatchScores in the order of the rows.
+    """
+    rows = list(rows)
+    return score_batch(
+        [hardware.hw_price for hardware, _, _, _ in rows],
+        [hardware.write_off_length for hardware, _, _, _ in rows],
+        [production_date for _, production_date, _, _ in rows],
+        [repair_offer for _, _, repair_offer, _ in rows],
+        [service_cost for _, _, _, service_cost in rows],
+        today=today,
+    )
+
+
+def verdicts_for(scores):
+    """
+    Maps replacement calculation values to verdicts, see verdict_for.
+
+    :param scores: Array of replacement calculation values.
+    :return: NumPy array of verdicts.
+    """
+    _require_numpy()
+    scores = np.asarray(scores)
+    return np.select(
+        [scores > REPLACEMENT_THRESHOLD, (scores > -REPLACEMENT_THRESHOLD) & (scores < REPLACEMENT_THRESHOLD)],
+        [VERDICT_REPLACE, VERDICT_INDIVIDUAL],
+        default=VERDICT_REPAIR,
+    )
+
+
+def break_even_batch(hw_prices, write_off_lengths, ages):
+    """
+    Calculates the repair costs (repair offer + service cost) at which the verdict changes.
+
+    The equation is linear in the repair cost, so the break-even costs have a closed form.
+    They are rounded to whole hellers (0.01 CZK) and then corrected against score_ages_batch,
+    so they are exact for the equation as it is evaluated, including the int truncation:
+
+    - below individual_from the verdict is a repair,
+    - from individual_from to repair_band_from an individual assessment,
+    - from repair_band_from to replacement_from a repair again (the result is exactly the threshold),
+    - from replacement_from a replacement.
+
+    :param hw_prices: Acquisition prices of the hardware (non-zero).
+    :param write_off_lengths: Write-off lengths of the hardware in years (non-zero).
+    :param ages: Ages of the devices in whole months.
+    :return: BreakEvenCosts of NumPy int64 arrays with the costs in hellers, may be negative.
+    """
+    _require_numpy()
+    hw_prices = np.asarray(hw_prices, dtype=np.int64)
+    write_off_lengths = np.asarray(write_off_lengths, dtype=np.int64)
+    age = np.asarray(ages, dtype=np.int64)
+
+    write_off_months = write_off_lengths * 12
+    remaining_months = np.maximum(0, write_off_months - age)
+    residual_value = (remaining_months / write_off_months) * hw_prices
+    kpc = hw_prices * 0.2
+    tbo = np.where(age < 60, 0.0, (age - 60) / 3)
+    ezh = ((residual_value + 1) / hw_prices) * 100
+
+    def reaches(cents, level):
+        zeros = np.zeros(len(cents))
+        return score_ages_batch(hw_prices, write_off_lengths, age, cents / 100, zeros).scores >= level
+
+    costs = []
+    for level in (LEVEL_INDIVIDUAL, LEVEL_REPAIR_BAND, LEVEL_REPLACE):
+        # Result >= level for positive levels means x >= level, for negative x > level - 1
+        boundary = level if level > 0 else level - 1
+        cents = np.round(((boundary - tbo + ezh) * 1000 + kpc) * 100).astype(np.int64)
+
+        # The rounding error is far below a heller, the loops end after a step or two
+        while True:
+            below = ~reaches(cents, level)
+            if not below.any():
+                break
+            cents = cents + below
+        while True:
+            lower = reaches(cents - 1, level)
+            if not lower.any():
+                break
+            cents = cents - lower
+        costs.append(cents)
+
+    return BreakEvenCosts(*costs)
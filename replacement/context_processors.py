@@ -0,0 +1,28 @@
+"""
+Context processors
+
+"""
+from replacement.models import Brand
+
+
+def brands(request):
+    """
+    Adds all brands to the context for the navigation menu.
+
+    :param request: The HTTP request object.
+    :return: Context with the brands ordered by name.
+    """
+    return {"nav_brands": Brand.objects.order_by("brand_name")}
+
+
+async def abrands(request):
+    """
+    Loads the brands for the navigation menu with the async ORM.
+
+    Async views render in the event loop, where the lazy queryset of brands can't be
+    evaluated, so they put this list into their context instead.
+
+    :param request: The HTTP request object.
+    :return: Context with the brands ordered by name.
+    """
+    return {"nav_brands": [brand async for brand in Brand.objects.order_by("brand_name")]}
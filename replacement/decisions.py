@@ -0,0 +1,253 @@
+"""
+Decision history
+
+Every replacement calculation is stored as a ReplacementDecision. The scoring path
+must not wait for an INSERT, so the decisions are only put into an in-process buffer
+and a writer thread stores them with bulk_create once the batch is full or the flush
+interval has passed. On a normal shutdown (atexit) the rest of the buffer is flushed.
+
+A failed flush keeps the batch for the next attempt; a process that is killed loses
+at most the decisions still in the buffer.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.utils import timezone
+
+from replacement import calculation
+from replacement.models import ReplacementDecision
+from replacement.signals import decisions_recorded
+
+logger = logging.getLogger(__name__)
+
+
+class DecisionRecorder:
+    """Buffers decisions and writes them in batches from a background thread."""
+
+    def __init__(self, batch_size=100, flush_interval=2.0, max_pending=10000, model=ReplacementDecision):
+        """
+        :param batch_size: Number of decisions that triggers a flush and the size of one bulk_create.
+        :param flush_interval: Longest time in seconds a decision waits in the buffer.
+        :param max_pending: Buffer limit while the database is failing, the oldest decisions are dropped over it.
+        :param model: Model of the decisions.
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.model = model
+        self.pending = []
+        self.condition = threading.Condition()
+        # Flush muze bezet jen jeden, at se davka nezapise dvakrat
+        self.flush_lock = threading.Lock()
+        self.thread = None
+        self.stopped = False
+        self.written = 0
+        self.dropped = 0
+        self.failures = 0
+
+    @classmethod
+    def from_settings(cls):
+        """
+        Creates the recorder configured by the REPLACEMENT_DECISIONS_* settings.
+
+        :return: DecisionRecorder instance.
+        """
+        return cls(
+            batch_size=settings.REPLACEMENT_DECISIONS_BATCH_SIZE,
+            flush_interval=settings.REPLACEMENT_DECISIONS_FLUSH_INTERVAL,
+            max_pending=settings.REPLACEMENT_DECISIONS_MAX_PENDING,
+        )
+
+    def start(self):
+        """Starts the writer thread."""
+        with self.condition:
+            if self.thread is None:
+                self.stopped = False
+                self.thread = threading.Thread(target=self.run, name="decision-recorder", daemon=True)
+                self.thread.start()
+
+    def record(self, decision):
+        """
+        Adds an unsaved decision to the buffer, the database is only touched after stop(),
+        when there is no writer thread and the decision is written right away.
+
+        :param decision: ReplacementDecision instance.
+        """
+        with self.condition:
+            stopped = self.stopped
+            self.pending.append(decision)
+            if len(self.pending) > self.max_pending:
+                overflow = len(self.pending) - self.max_pending
+                del self.pending[:overflow]
+                self.dropped += overflow
+                logger.error("Decision buffer is full, %d oldest decisions were dropped.", overflow)
+            if len(self.pending) >= self.batch_size:
+                self.condition.notify()
+        if stopped:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the whole buffer in batches of batch_size.
+
+        A batch that fails to be written is put back to the front of the buffer and the flush stops.
+        A batch violating a constraint (e.g. the hardware was deleted meanwhile) is written row by
+        row and the violating rows are dropped, so they can't block the buffer.
+
+        :return: Number of decisions written.
+        """
+        written = 0
+        with self.flush_lock:
+            while True:
+                with self.condition:
+                    batch = self.pending[:self.batch_size]
+                    del self.pending[:self.batch_size]
+                if not batch:
+                    return written
+                try:
+                    with transaction.atomic():
+                        self.model.objects.bulk_create(batch)
+                        decisions_recorded.send(sender=self.model, decisions=batch)
+                except IntegrityError:
+                    batch = self.write_rows(batch)
+                except DatabaseError:
+                    logger.exception("Writing %d decisions failed, they are kept for the next flush.", len(batch))
+                    with self.condition:
+                        self.pending[:0] = batch
+                        self.failures += 1
+                    return written
+                written += len(batch)
+                with self.condition:
+                    self.written += len(batch)
+
+    def write_rows(self, batch):
+        """
+        Writes the decisions one by one, dropping those violating a constraint.
+
+        :param batch: ReplacementDecision instances.
+        :return: The written decisions.
+        """
+        written = []
+        for decision in batch:
+            try:
+                with transaction.atomic():
+                    decision.save(force_insert=True)
+                    decisions_recorded.send(sender=self.model, decisions=[decision])
+            except IntegrityError:
+                logger.exception("Decision of hardware %s violates a constraint and was dropped.", decision.hardware_id)
+                with self.condition:
+                    self.dropped += 1
+            else:
+                written.append(decision)
+        return written
+
+    def run(self):
+        """Loop of the writer thread: waits for a full batch or the flush interval and flushes."""
+        try:
+            while True:
+                deadline = time.monotonic() + self.flush_interval
+                with self.condition:
+                    while not self.stopped and len(self.pending) < self.batch_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self.condition.wait(remaining)
+                    stopped = self.stopped
+                if stopped:
+                    return
+                self.flush()
+        finally:
+            # Vlakno ma vlastni spojeni do databaze
+            connection.close()
+
+    def stop(self, timeout=10.0):
+        """
+        Stops the writer thread and flushes the rest of the buffer in the calling thread.
+
+        :param timeout: Longest time in seconds to wait for the writer thread.
+        :return: Number of decisions that could not be written.
+        """
+        with self.condition:
+            self.stopped = True
+            thread, self.thread = self.thread, None
+            self.condition.notify()
+        if thread is not None:
+            thread.join(timeout)
+        self.flush()
+        with self.condition:
+            return len(self.pending)
+
+    def stats(self):
+        """
+        Returns the counters of the recorder.
+
+        :return: Dictionary with the numbers of pending, written and dropped decisions and failed flushes.
+        """
+        with self.condition:
+            return {
+                "pending": len(self.pending),
+                "written": self.written,
+                "dropped": self.dropped,
+                "failures": self.failures,
+            }
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_decision_recorder():
+    """
+    Returns the recorder of the process, created and started from the settings on first use.
+
+    :return: DecisionRecorder instance.
+    """
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                recorder = DecisionRecorder.from_settings()
+                recorder.start()
+                atexit.register(recorder.stop)
+                _recorder = recorder
+    return _recorder
+
+
+def record_decision(hardware, production_date, repair_offer, service_cost, replacement_calculation,
+                    age_months=None, user=None, api_token=None):
+    """
+    Records the result of a replacement calculation.
+
+    :param hardware: Calculated Hardware.
+    :param production_date: Production date of the device.
+    :param repair_offer: Repair price offer.
+    :param service_cost: Cost of the previous repairs.
+    :param replacement_calculation: Replacement calculation value.
+    :param age_months: Age of the device in months, computed from the production date if not given.
+    :param user: User who made the calculation, None for the API.
+    :param api_token: ApiToken of the calling system, None for the pages.
+    """
+    if age_months is None:
+        age_months = calculation.age_in_months(production_date)
+    if user is not None and not user.is_authenticated:
+        user = None
+
+    get_decision_recorder().record(ReplacementDecision(
+        user=user,
+        api_token=api_token,
+        hardware=hardware,
+        brand_id=hardware.brand_name_id,
+        hw_price=hardware.hw_price,
+        write_off_length=hardware.write_off_length,
+        production_date=production_date,
+        age_months=age_months,
+        repair_offer=repair_offer,
+        service_cost=service_cost,
+        replacement_calculation=replacement_calculation,
+        verdict=calculation.verdict_for(replacement_calculation),
+        created=timezone.now(),
+    ))
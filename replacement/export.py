@@ -0,0 +1,293 @@
+"""
+Export of the hardware and replacement results
+
+Exports stream: the hardware is read with .iterator() in chunks and every chunk is
+encoded and sent before the next one is read, so the memory use is the same for a
+hundred rows as for half a million and the download starts immediately.
+
+CSV is written with the csv module, XLSX with a minimal writer producing a single
+worksheet with inline strings, zipped on the fly into an unseekable stream. Texts that
+a spreadsheet would evaluate as a formula are escaped in the CSV; inline strings of
+the XLSX are never evaluated.
+"""
+import csv
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from replacement import calculation
+from replacement.models import Brand, Hardware
+
+HEADER = ["ID", "Brand", "Stroj", "Pořizovací cena", "Délka odpisu"]
+SCENARIO_HEADER = ["Stáří (měsíce)", "Výsledek rovnice", "Verdikt"]
+
+VERDICT_LABELS = {
+    calculation.VERDICT_REPLACE: "Replacement proběhne",
+    calculation.VERDICT_INDIVIDUAL: "Individuální posouzení",
+    calculation.VERDICT_REPAIR: "Replacement neproběhne",
+}
+
+# Znaky, kterymi tabulkovy procesor zacina vzorec (CSV injection)
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+# Znaky, ktere XML 1.0 nepovoluje
+INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def export_queryset(brand=None):
+    """
+    Returns the hardware of the export in its order and the name used in the file name.
+
+    :param brand: Brand to export, None exports all brands.
+    :return: Tuple (queryset, name).
+    """
+    if brand is not None:
+        # Poradi podle indexu (brand_name_id, hw_name), databaze nemusi tridit
+        return Hardware.objects.filter(brand_name=brand).order_by("hw_name"), brand.slug
+    return Hardware.objects.order_by("brand_name_id", "hw_name"), "vse"
+
+
+def export_filename(name, file_format, day):
+    """
+    :param name: Name from export_queryset.
+    :param file_format: "csv" or "xlsx".
+    :param day: Date of the export.
+    :return: File name offered for the download.
+    """
+    return f"replacement-{name}-{day:%Y-%m-%d}.{file_format}"
+
+
+def detached_rows(rows, chunk_size):
+    """
+    Reads the rows chunk by chunk with a separate query per chunk.
+
+    .iterator() keeps one read open for the whole export. A SQLite connection with an open
+    read can't write once another connection has committed, so a background job, which
+    reports its progress between chunks, reads the rows this way.
+
+    :param rows: values_list queryset starting with the primary key, in the order of the export.
+    :param chunk_size: Number of rows read at once.
+    :return: Generator of the row tuples.
+    """
+    pks = list(rows.values_list("pk", flat=True))
+    for start in range(0, len(pks), chunk_size):
+        chunk_pks = pks[start:start + chunk_size]
+        chunk = {row[0]: row for row in rows.filter(pk__in=chunk_pks).order_by()}
+        # Zaznam smazany mezi dotazy chybi
+        yield from (chunk[pk] for pk in chunk_pks if pk in chunk)
+
+
+def export_chunks(queryset, scenario=None, chunk_size=2000, detached=False):
+    """
+    Reads the hardware in chunks and optionally scores every chunk for the scenario.
+
+    :param queryset: Hardware queryset, in the order of the export.
+    :param scenario: Optional dictionary with production_date, repair_offer and service_cost,
+        the same inputs for every device.
+    :param chunk_size: Number of rows read from the database at once.
+    :param detached: Read every chunk with its own query, see detached_rows.
+    :return: Generator of lists of rows, a row is a list of cell values.
+    """
+    brand_names = dict(Brand.objects.values_list("pk", "brand_name"))
+    age = calculation.age_in_months(scenario["production_date"]) if scenario else None
+
+    rows = queryset.values_list("pk", "brand_name_id", "hw_name", "hw_price", "write_off_length")
+    rows = detached_rows(rows, chunk_size) if detached else rows.iterator(chunk_size=chunk_size)
+    chunk = []
+    for pk, brand_id, hw_name, hw_price, write_off_length in rows:
+        chunk.append([pk, brand_names.get(brand_id, ""), hw_name, hw_price, write_off_length])
+        if len(chunk) == chunk_size:
+            yield score_chunk(chunk, age, scenario)
+            chunk = []
+    if chunk:
+        yield score_chunk(chunk, age, scenario)
+
+
+def score_chunk(chunk, age, scenario):
+    """
+    Appends the age, the replacement calculation value and the verdict to the rows.
+
+    Hardware without a price or write-off length can't be scored and gets empty cells.
+
+    :param chunk: Rows from export_chunks.
+    :param age: Age of the devices in months, None without a scenario.
+    :param scenario: Scenario of the export, see export_chunks.
+    :return: The rows.
+    """
+    if scenario is None:
+        return chunk
+
+    scorable = [row for row in chunk if row[3] and row[4]]
+    if scorable:
+        scores = calculation.score_ages_batch(
+            [row[3] for row in scorable],
+            [row[4] for row in scorable],
+            [age] * len(scorable),
+            [scenario["repair_offer"]] * len(scorable),
+            [scenario["service_cost"]] * len(scorable),
+        )
+        for row, value, verdict in zip(scorable, scores.scores.tolist(), scores.verdicts.tolist()):
+            row.extend([age, value, VERDICT_LABELS[verdict]])
+    for row in chunk:
+        if len(row) == len(HEADER):
+            row.extend(["", "", ""])
+    return chunk
+
+
+def header_for(scenario):
+    """
+    :param scenario: Scenario of the export, see export_chunks.
+    :return: Column names of the export.
+    """
+    return HEADER + SCENARIO_HEADER if scenario else HEADER
+
+
+def csv_cell(value):
+    """
+    Escapes a text cell starting like a formula with an apostrophe, so the spreadsheet
+    shows it as text instead of evaluating it. Numbers are kept as they are.
+
+    :param value: Cell value.
+    :return: Value written to the CSV.
+    """
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(chunks, header):
+    """
+    Encodes the rows as CSV, one piece of output per chunk.
+
+    :param chunks: Generator from export_chunks.
+    :param header: Column names.
+    :return: Generator of strings.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(header)
+    # BOM, aby Excel poznal UTF-8
+    yield "\ufeff" + buffer.getvalue()
+
+    for chunk in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([csv_cell(value) for value in row] for row in chunk)
+        yield buffer.getvalue()
+
+
+class StreamBuffer:
+    """Unseekable file object collecting what zipfile writes, emptied after every chunk."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        """
+        Returns and forgets everything written so far.
+
+        :return: Bytes.
+        """
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+XLSX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+XLSX_SHEET_END = '</sheetData></worksheet>'
+
+
+def xlsx_cell(value):
+    """
+    Encodes one cell, numbers as numbers and everything else as an inline string.
+
+    :param value: Cell value.
+    :return: XML of the cell.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"<c><v>{value}</v></c>"
+    if value in ("", None):
+        return "<c/>"
+    text = escape(INVALID_XML_CHARS.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def xlsx_row(row):
+    """
+    :param row: List of cell values.
+    :return: XML of the worksheet row.
+    """
+    return "<row>" + "".join(xlsx_cell(value) for value in row) + "</row>"
+
+
+def stream_xlsx(chunks, header, sheet_name="Replacement"):
+    """
+    Encodes the rows as an XLSX workbook with one worksheet.
+
+    :param chunks: Generator from export_chunks.
+    :param header: Column names.
+    :param sheet_name: Name of the worksheet.
+    :return: Generator of bytes.
+    """
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as workbook:
+        workbook.writestr("[Content_Types].xml", XLSX_CONTENT_TYPES)
+        workbook.writestr("_rels/.rels", XLSX_RELS)
+        workbook.writestr("xl/workbook.xml", XLSX_WORKBOOK.format(escape(sheet_name[:31], {'"': "&quot;"})))
+        workbook.writestr("xl/_rels/workbook.xml.rels", XLSX_WORKBOOK_RELS)
+
+        # Bez zip64, starsi Excel s nim ma potize; list do 4 GB staci
+        with workbook.open("xl/worksheets/sheet1.xml", "w") as sheet:
+            sheet.write((XLSX_SHEET_START + xlsx_row(header)).encode())
+            yield buffer.pop()
+            for chunk in chunks:
+                sheet.write("".join(xlsx_row(row) for row in chunk).encode())
+                yield buffer.pop()
+            sheet.write(XLSX_SHEET_END.encode())
+    yield buffer.pop()
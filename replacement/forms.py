@@ -1,10 +1,12 @@
 from django import forms
 from django.core.exceptions import ValidationError
 
-import replacement
+from replacement import calculation
+from replacement.decisions import record_decision
+from replacement.memo import get_score_memo
 from replacement.models import Hardware
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
+from decimal import Decimal
 
 
 class ReplacementForm(forms.ModelForm):
@@ -52,46 +54,36 @@ class ReplacementForm(forms.ModelForm):
         :return: Tuple containing the replacement calculation value and the corresponding message.
         """
         # Calculate the age of the hardware in months
-        today = datetime.today().date()
-        hw_production_date = self.cleaned_data['hw_production_date']
-
-        if isinstance(hw_production_date, datetime):
-            hw_production_date = hw_production_date.date()
-
-        hardware_age = relativedelta(today, hw_production_date).years * 12 + relativedelta(today,
-                                                                                           hw_production_date).months
-
-        # Calculate the residual value of the hardware
-        write_off_length = hardware.write_off_length
-        remaining_months = max(0, write_off_length * 12 - hardware_age)
-        residual_value = float((remaining_months / (write_off_length * 12)) * hardware.hw_price)
+        hardware_age = calculation.age_in_months(self.cleaned_data['hw_production_date'])
 
-        # Gather other necessary values
-        repair_offer = float(self.cleaned_data['repair_offer'])
-        service_cost = float(self.cleaned_data['service_cost'])
+        # Perform the replacement equation, repeated inputs are answered from the memo
+        replacement_calculation = get_score_memo().score(
+            hardware.hw_price,
+            hardware.write_off_length,
+            hardware_age,
+            self.cleaned_data['repair_offer'],
+            self.cleaned_data['service_cost'],
+        )
 
-        # Perform the replacement equation
-        ers = repair_offer + service_cost
-        kpc = hardware.hw_price * 0.2
-        tbo = 0 if hardware_age < 60 else (hardware_age - 60) / 3
-        ezh = ((residual_value + 1) / hardware.hw_price) * 100
-        replacement_calculation = int(((ers - kpc) / 1000) + tbo - ezh)
+        # Return the replacement calculation and the final message for the user
+        return replacement_calculation, calculation.message_for(replacement_calculation)
 
+    def record_decision(self, hardware, replacement_calculation, user=None):
+        """
+        Records the calculation into the decision history, see decisions.record_decision.
 
-        rounded_replacement_calculation = round(replacement_calculation, 2)
-
-        print(rounded_replacement_calculation)
-
-        # Final message for the user based on the replacement calculation
-        if rounded_replacement_calculation > 10:
-            message = f"Replacement proběhne, oprava je nákladná. Výsledek rovnice je {rounded_replacement_calculation}."
-        elif -10 < rounded_replacement_calculation < 10:
-            message = f"Je to na individuálním posouzení, výsledek rovnice je {rounded_replacement_calculation}."
-        else:
-            message = f"Replacement neproběhne, zařízení je buďto nové nebo je oprava výhodná. Výsledek rovnice je {rounded_replacement_calculation}."
-
-        # Return the replacement calculation and message
-        return replacement_calculation, message
+        :param hardware: Hardware instance used for the calculation.
+        :param replacement_calculation: Value returned by calculate.
+        :param user: User who made the calculation.
+        """
+        record_decision(
+            hardware,
+            self.cleaned_data['hw_production_date'],
+            self.cleaned_data['repair_offer'],
+            self.cleaned_data['service_cost'],
+            replacement_calculation,
+            user=user,
+        )
 
 class HardwareForm(forms.ModelForm):
     """
@@ -131,3 +123,85 @@ class HardwareForm(forms.ModelForm):
 
         return write_off_length
 
+
+
+class HardwareImportForm(forms.Form):
+    """
+    Form for uploading a CSV file with hardware, imported in the background.
+    """
+    csv_file = forms.FileField(label='Soubor CSV', help_text="Sloupce brand_name, hw_name, hw_price a write_off_length")
+    delete_missing = forms.BooleanField(label='Smazat zařízení, která v souboru nejsou', required=False)
+
+    def clean_csv_file(self):
+        """
+        Validates that the uploaded file is a CSV file.
+
+        :raises ValidationError: If the file name doesn't end with .csv.
+        :return: Uploaded file.
+        """
+        csv_file = self.cleaned_data['csv_file']
+        if not csv_file.name.lower().endswith('.csv'):
+            raise ValidationError("Nahrajte soubor ve formátu CSV.")
+        return csv_file
+
+
+class RepricingForm(forms.Form):
+    """
+    Form for re-pricing the selected hardware by a percentage or by an amount.
+    """
+    percent = forms.DecimalField(label='Změna v %', max_digits=6, decimal_places=2, min_value=Decimal('-99.99'),
+                                 required=False, help_text="Např. 7,5 pro zdražení o 7,5 %")
+    amount = forms.IntegerField(label='Změna v Kč', required=False, help_text="Např. -500 pro zlevnění o 500 Kč")
+
+    def clean(self):
+        """
+        Validates that exactly one of the percentage and the amount is given.
+
+        :raises ValidationError: If none or both are given.
+        :return: Cleaned data.
+        """
+        cleaned_data = super().clean()
+        if (cleaned_data.get('percent') is None) == (cleaned_data.get('amount') is None):
+            raise ValidationError("Zadejte buď změnu v procentech, nebo v Kč.")
+        return cleaned_data
+
+
+class ExportScenarioForm(forms.Form):
+    """
+    Optional scenario of the export: when the production date and the repair offer are given,
+    every exported device is scored as if it had these inputs.
+    """
+    production_date = forms.DateField(required=False)
+    repair_offer = forms.DecimalField(required=False, max_digits=10, decimal_places=2)
+    service_cost = forms.DecimalField(required=False, max_digits=10, decimal_places=2)
+
+    def clean(self):
+        """
+        Validates that the scenario is either complete or not given at all.
+
+        :raises ValidationError: If only part of the scenario is given or the production date is in the future.
+        :return: Cleaned data.
+        """
+        cleaned_data = super().clean()
+        production_date = cleaned_data.get('production_date')
+        repair_offer = cleaned_data.get('repair_offer')
+
+        if (production_date is None) != (repair_offer is None):
+            raise ValidationError("Pro výpočet zadejte výrobní datum i cenovou nabídku.")
+        if production_date and production_date > datetime.today().date():
+            raise ValidationError("Datum výroby musí být v minulosti.")
+        return cleaned_data
+
+    def scenario(self):
+        """
+        Returns the scenario for the export.
+
+        :return: Dictionary with production_date, repair_offer and service_cost, or None.
+        """
+        if self.cleaned_data.get('production_date') is None:
+            return None
+        return {
+            'production_date': self.cleaned_data['production_date'],
+            'repair_offer': self.cleaned_data['repair_offer'],
+            'service_cost': self.cleaned_data.get('service_cost') or 0,
+        }
@@ -0,0 +1,289 @@
+"""
+Hardware import
+
+Streams hardware rows from a CSV file into the database in batches.
+Rows are matched to the existing hardware on (brand_name, hw_name), so
+re-importing the same catalog only writes what changed.
+"""
+import csv
+import time
+
+from django.db import transaction
+
+from replacement.models import Brand, Hardware
+from replacement.signals import hardware_bulk_changed
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def clean_price(value):
+    """
+    Converts a price from the CSV to an integer.
+
+    Strips whitespace and non-breaking spaces used as thousands separators.
+
+    :param value: Price as a string, for example "585 000".
+    :return: Price as an integer.
+    """
+    return int((value or "0").replace('\xa0', '').replace(' ', ''))
+
+
+def read_hardware_rows(csvfile, delimiter=","):
+    """
+    Reads hardware rows from an open CSV file one by one.
+
+    :param csvfile: Open text file with a header row.
+    :param delimiter: Column delimiter of the CSV file.
+    :return: Generator of (line number, row dictionary) tuples.
+    """
+    reader = csv.DictReader(csvfile, delimiter=delimiter)
+    for row in reader:
+        yield reader.line_num, row
+
+
+class ImportStats:
+    """Counters of a single import run."""
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.missing = []
+        self.deleted = 0
+        self.protected = []
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        """
+        Returns the duration of the import in seconds.
+
+        :return: Seconds since the import started, or its total duration once finished.
+        """
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rows_per_second(self):
+        """
+        Returns the import throughput.
+
+        :return: Number of processed rows per second.
+        """
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed else 0.0
+
+
+class HardwareImporter:
+    """
+    Imports hardware from CSV rows with bulk inserts and updates.
+
+    Brands are resolved from an in-memory map, so each brand costs at most one query
+    per import. Existing hardware is loaded once as a map of (brand, hw_name) to its
+    primary key and imported values: unchanged rows are skipped, changed rows are written
+    with bulk_update and new rows with bulk_create, one transaction per batch, so the
+    SQLite write lock is only held while a batch is being written. Hardware that is
+    not in the import is reported and, optionally, deleted.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, delete_missing=False, on_warning=None, on_progress=None):
+        """
+        :param batch_size: Number of rows written in one transaction.
+        :param delete_missing: Delete hardware that is not in the imported rows.
+        :param on_warning: Optional callable receiving a message about a skipped row.
+        :param on_progress: Optional callable receiving ImportStats after every batch.
+        """
+        self.batch_size = batch_size
+        self.delete_missing = delete_missing
+        self.on_warning = on_warning
+        self.on_progress = on_progress
+        self.brands = None
+        self.existing = None
+        self.duplicates = None
+        self.seen = None
+
+    def warn(self, message):
+        """
+        Reports a problem with a row.
+
+        :param message: Text of the warning.
+        """
+        if self.on_warning:
+            self.on_warning(message)
+
+    def load_brands(self):
+        """Loads all brands to the in-memory map."""
+        self.brands = dict(Brand.objects.values_list("brand_name", "pk"))
+
+    def load_existing(self):
+        """
+        Loads the natural keys and imported values of all hardware.
+
+        Hardware sharing a natural key with an older row (left over from appending
+        imports) is collected as a duplicate.
+        """
+        self.existing = {}
+        self.duplicates = []
+        rows = Hardware.objects.order_by("pk").values_list(
+            "pk", "brand_name_id", "hw_name", "hw_price", "write_off_length"
+        )
+        for pk, brand_id, hw_name, hw_price, write_off_length in rows.iterator(chunk_size=self.batch_size):
+            key = (brand_id, hw_name)
+            if key in self.existing:
+                self.duplicates.append(pk)
+            else:
+                self.existing[key] = (pk, hw_price, write_off_length)
+
+    def create_brands(self, batch):
+        """
+        Creates the brands of the batch that do not exist yet.
+
+        Called before the transaction of the batch, so a batch that is rolled back
+        can't leave IDs of brands that no longer exist in the in-memory map.
+
+        :param batch: List of parsed rows.
+        """
+        for brand_name in dict.fromkeys(brand_name for brand_name, *_ in batch):
+            if brand_name not in self.brands:
+                self.brands[brand_name] = Brand.objects.create(brand_name=brand_name).pk
+
+    def parse_row(self, line_num, row):
+        """
+        Validates a CSV row and converts it to field values.
+
+        :param line_num: Line number of the row, used in warnings.
+        :param row: Row dictionary from the CSV reader.
+        :return: Tuple (brand_name, hw_name, hw_price, write_off_length), or None if the row is skipped.
+        """
+        brand_name = (row.get('brand_name') or '').strip()
+        hw_name = (row.get('hw_name') or '').strip()
+
+        if not brand_name:
+            self.warn(f"Line {line_num}: missing brand_name, row skipped.")
+            return None
+
+        try:
+            hw_price = clean_price(row.get('hw_price'))
+            write_off_length = int(row.get('write_off_length') or 0)  # Default to 0 if missing
+        except ValueError:
+            self.warn(f"Line {line_num}: invalid hw_price or write_off_length, row skipped.")
+            return None
+
+        return brand_name, hw_name, hw_price, write_off_length
+
+    def write_batch(self, batch, stats):
+        """
+        Writes one batch of parsed rows in a single transaction.
+
+        :param batch: List of parsed rows.
+        :param stats: ImportStats updated with the created, updated and unchanged rows.
+        """
+        to_create = []
+        to_update = []
+        changes = []
+
+        self.create_brands(batch)
+        with transaction.atomic():
+            for brand_name, hw_name, hw_price, write_off_length in batch:
+                key = (self.brands[brand_name], hw_name)
+                if key in self.seen:
+                    self.warn(f"Duplicate row for {brand_name} / {hw_name}, row skipped.")
+                    stats.skipped += 1
+                    continue
+                self.seen.add(key)
+
+                hardware = Hardware(
+                    brand_name_id=key[0],
+                    hw_name=hw_name,
+                    hw_price=hw_price,
+                    write_off_length=write_off_length,
+                )
+                new = (key[0], hw_price, write_off_length)
+                if key not in self.existing:
+                    to_create.append(hardware)
+                    changes.append((None, new))
+                elif self.existing[key][1:] != (hw_price, write_off_length):
+                    hardware.pk = self.existing[key][0]
+                    to_update.append(hardware)
+                    changes.append(((key[0], *self.existing[key][1:]), new))
+                else:
+                    stats.unchanged += 1
+
+            Hardware.objects.bulk_create(to_create, batch_size=self.batch_size)
+            Hardware.objects.bulk_update(to_update, ["hw_price", "write_off_length"], batch_size=self.batch_size)
+            # Prahy a skore se prepocitaji az po commitu davky, viz refresh
+            self.send_changed(to_create + to_update, changes)
+
+        stats.created += len(to_create)
+        stats.updated += len(to_update)
+
+    def send_changed(self, hardware, changes):
+        """
+        Notifies the receivers (listing cache, summaries, thresholds and scores) about bulk written hardware.
+
+        :param hardware: List of created or updated Hardware instances.
+        :param changes: The (old, new) values of the rows, see summaries.apply_hardware_changes.
+        """
+        brand_ids = {item.brand_name_id for item in hardware}
+        if brand_ids:
+            hardware_bulk_changed.send(
+                sender=Hardware, brand_ids=brand_ids, hardware_ids={item.pk for item in hardware}, changes=changes
+            )
+
+    def remove_missing(self, stats):
+        """
+        Collects hardware that was not in the import and deletes it if requested.
+
+        Hardware with devices in stores (Asset) is protected from deletion, it is kept
+        and reported in stats.protected.
+
+        :param stats: ImportStats updated with the missing, deleted and protected rows.
+        """
+        stats.missing = [pk for key, (pk, *_) in self.existing.items() if key not in self.seen]
+        stats.missing += self.duplicates
+
+        if not self.delete_missing:
+            return
+
+        for start in range(0, len(stats.missing), self.batch_size):
+            with transaction.atomic():
+                chunk = Hardware.objects.filter(pk__in=stats.missing[start:start + self.batch_size])
+                stats.protected += chunk.filter(assets__isnull=False).distinct().values_list("pk", flat=True)
+                deleted = chunk.exclude(assets__isnull=False).delete()[1]
+                stats.deleted += deleted.get(Hardware._meta.label, 0)
+
+    def run(self, rows):
+        """
+        Imports the rows.
+
+        :param rows: Iterable of (line number, row dictionary) tuples, see read_hardware_rows.
+        :return: ImportStats of the run.
+        """
+        stats = ImportStats()
+        self.load_brands()
+        self.load_existing()
+        self.seen = set()
+
+        batch = []
+        for line_num, row in rows:
+            stats.rows += 1
+            parsed = self.parse_row(line_num, row)
+            if parsed is None:
+                stats.skipped += 1
+                continue
+
+            batch.append(parsed)
+            if len(batch) >= self.batch_size:
+                self.write_batch(batch, stats)
+                batch = []
+                if self.on_progress:
+                    self.on_progress(stats)
+
+        if batch:
+            self.write_batch(batch, stats)
+        self.remove_missing(stats)
+
+        stats.finished = time.perf_counter()
+        return stats
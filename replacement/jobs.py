@@ -0,0 +1,300 @@
+"""
+Background jobs
+
+A queue of Jobs in the project's own database, processed by the run_workers command,
+so long imports and exports don't run inside a request.
+
+- enqueue() stores a job of a kind registered with @job_handler (see tasks).
+- A worker claims the oldest due job with a conditional UPDATE, which works as a
+  compare-and-set on every database: of two workers updating the same queued row only
+  one changes it. The claim is a lease of REPLACEMENT_JOBS_LEASE_SECONDS.
+- The handler reports its progress through the Progress it gets, which also renews the
+  lease. A job of a worker that died is claimed again once its lease expires.
+- A failed job is retried with an exponential delay until max_attempts.
+
+Pages poll the progress of a job from JobStatusView.
+"""
+import logging
+import os
+import signal
+import socket
+import threading
+import traceback
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from replacement.models import Job
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+
+
+class LeaseLost(Exception):
+    """The job was claimed by another worker after the lease of this one expired."""
+
+
+def job_handler(kind):
+    """
+    Registers the decorated function as the handler of the jobs of the kind.
+
+    The handler is called with the Job and a Progress and returns the JSON result of the job.
+
+    :param kind: Name of the kind of jobs.
+    :return: Decorator.
+    """
+    def register(function):
+        HANDLERS[kind] = function
+        return function
+    return register
+
+
+def enqueue(kind, payload=None, user=None, max_attempts=None):
+    """
+    Stores a new job for the workers.
+
+    :param kind: Kind of the job, registered with job_handler.
+    :param payload: JSON-serializable arguments of the handler.
+    :param user: User who started the job.
+    :param max_attempts: Number of attempts before the job fails, REPLACEMENT_JOBS_MAX_ATTEMPTS by default.
+    :raises ValueError: If there is no handler of the kind.
+    :return: The Job.
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind {kind!r}.")
+    if user is not None and not user.is_authenticated:
+        user = None
+    return Job.objects.create(
+        kind=kind,
+        payload=payload or {},
+        user=user,
+        max_attempts=max_attempts or settings.REPLACEMENT_JOBS_MAX_ATTEMPTS,
+    )
+
+
+def jobs_dir():
+    """
+    :return: Path of the directory with the uploaded and produced files of the jobs, created if needed.
+    """
+    path = Path(settings.REPLACEMENT_JOBS_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def job_file(name):
+    """
+    :param name: Name of a file of a job, without a directory.
+    :raises ValueError: If the name contains a directory.
+    :return: Path of the file in jobs_dir.
+    """
+    if not name or Path(name).name != name:
+        raise ValueError(f"Invalid job file name {name!r}.")
+    return jobs_dir() / name
+
+
+def store_job_file(chunks, suffix=""):
+    """
+    Writes an input of a job (an uploaded file) to jobs_dir under a new unique name.
+
+    :param chunks: Iterable of bytes.
+    :param suffix: Suffix of the file name, e.g. ".csv".
+    :return: Name of the file for the payload of the job.
+    """
+    name = f"{uuid.uuid4().hex}{suffix}"
+    with open(job_file(name), "wb") as file:
+        for chunk in chunks:
+            file.write(chunk)
+    return name
+
+
+def job_files(job):
+    """
+    :param job: The Job.
+    :return: Names of the files of the job (the uploaded input and the produced result).
+    """
+    names = [job.payload.get("file") if isinstance(job.payload, dict) else None]
+    names.append(job.result.get("file") if isinstance(job.result, dict) else None)
+    return [name for name in names if name]
+
+
+def purge_finished_jobs(days):
+    """
+    Deletes the jobs finished more than the given number of days ago, with their files.
+
+    :param days: Age in days.
+    :return: Number of deleted jobs.
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = Job.objects.filter(
+        status__in=[Job.STATUS_DONE, Job.STATUS_FAILED], finished__lt=cutoff
+    ).delete()
+    return deleted
+
+
+class Progress:
+    """Progress reporting of a running job, renews the lease of the worker."""
+
+    def __init__(self, job, worker_id, lease_seconds):
+        """
+        :param job: The claimed Job.
+        :param worker_id: ID of the worker holding the lease.
+        :param lease_seconds: Length of the renewed lease.
+        """
+        self.job = job
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+
+    def __call__(self, done, total=None, message=None):
+        """
+        Stores the progress of the job.
+
+        :param done: Number of processed items.
+        :param total: Number of all items, if known.
+        :param message: Short description of the current step.
+        :raises LeaseLost: If another worker took the job over.
+        """
+        changes = {"progress_done": done, "locked_until": timezone.now() + timedelta(seconds=self.lease_seconds)}
+        if total is not None:
+            changes["progress_total"] = total
+        if message is not None:
+            changes["progress_message"] = message[:200]
+        owned = Job.objects.filter(pk=self.job.pk, status=Job.STATUS_RUNNING, locked_by=self.worker_id)
+        if not owned.update(**changes):
+            raise LeaseLost(f"Job {self.job.pk} was taken over by another worker.")
+
+
+class Worker:
+    """Claims and runs the jobs one at a time."""
+
+    def __init__(self, worker_id=None, lease_seconds=None, poll_interval=None, retry_delay=None):
+        """
+        :param worker_id: Unique ID of the worker, host and process ID by default.
+        :param lease_seconds: Length of a lease, REPLACEMENT_JOBS_LEASE_SECONDS by default.
+        :param poll_interval: Seconds between looks into an empty queue, REPLACEMENT_JOBS_POLL_INTERVAL by default.
+        :param retry_delay: Delay of the first retry in seconds, doubled with every further attempt,
+            REPLACEMENT_JOBS_RETRY_DELAY by default.
+        """
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = lease_seconds or settings.REPLACEMENT_JOBS_LEASE_SECONDS
+        self.poll_interval = poll_interval if poll_interval is not None else settings.REPLACEMENT_JOBS_POLL_INTERVAL
+        self.retry_delay = retry_delay if retry_delay is not None else settings.REPLACEMENT_JOBS_RETRY_DELAY
+        self.stopping = threading.Event()
+
+    def claim(self):
+        """
+        Claims the oldest due job, or a running job whose lease expired.
+
+        :return: The claimed Job, None when there is nothing to do.
+        """
+        now = timezone.now()
+        claimable = (
+            Q(status=Job.STATUS_QUEUED, run_after__lte=now)
+            | Q(status=Job.STATUS_RUNNING, locked_until__lt=now)
+        )
+        candidates = list(
+            Job.objects.filter(claimable).order_by("run_after", "pk").values_list("pk", flat=True)[:10]
+        )
+        for pk in candidates:
+            # Podminka se vyhodnoti znovu pri zapisu, radek dostane jen jeden worker
+            claimed = Job.objects.filter(claimable, pk=pk).update(
+                status=Job.STATUS_RUNNING,
+                locked_by=self.worker_id,
+                locked_until=now + timedelta(seconds=self.lease_seconds),
+                attempts=F("attempts") + 1,
+                started=now,
+            )
+            if claimed:
+                return Job.objects.get(pk=pk)
+        return None
+
+    def finish(self, job, **changes):
+        """
+        Stores the outcome of the job unless another worker took it over.
+
+        :param job: The Job.
+        :param changes: Field values to store.
+        :return: Whether the job still belonged to the worker.
+        """
+        owned = Job.objects.filter(pk=job.pk, status=Job.STATUS_RUNNING, locked_by=self.worker_id)
+        return bool(owned.update(locked_by="", locked_until=None, **changes))
+
+    def run_job(self, job):
+        """
+        Runs the handler of the claimed job and stores its result, schedules a retry or marks the job failed.
+
+        :param job: The claimed Job.
+        """
+        handler = HANDLERS.get(job.kind)
+        if job.attempts > job.max_attempts:
+            # Worker s poslednim pokusem spadl behem zpracovani
+            self.finish(job, status=Job.STATUS_FAILED, finished=timezone.now(),
+                        error=job.error or "Zpracování bylo přerušeno.")
+            return
+        if handler is None:
+            self.finish(job, status=Job.STATUS_FAILED, finished=timezone.now(), error=f"Neznámý typ úlohy {job.kind}.")
+            return
+
+        error = None
+        try:
+            result = handler(job, Progress(job, self.worker_id, self.lease_seconds))
+        except LeaseLost:
+            logger.warning("Job %s was taken over by another worker.", job.pk)
+            return
+        except Exception:
+            logger.exception("Job %s (%s) failed, attempt %s of %s.", job.pk, job.kind, job.attempts, job.max_attempts)
+            error = traceback.format_exc()
+
+        # Zapis az mimo except, traceback uz nedrzi otevrene kurzory handleru
+        if error is None:
+            self.finish(job, status=Job.STATUS_DONE, result=result, error="", finished=timezone.now())
+        elif job.attempts < job.max_attempts:
+            delay = self.retry_delay * 2 ** (job.attempts - 1)
+            self.finish(job, status=Job.STATUS_QUEUED, error=error, run_after=timezone.now() + timedelta(seconds=delay))
+        else:
+            self.finish(job, status=Job.STATUS_FAILED, error=error, finished=timezone.now())
+
+    def run(self, burst=False):
+        """
+        Processes the jobs until stopped.
+
+        :param burst: Stop when the queue is empty instead of waiting for new jobs.
+        :return: Number of processed jobs.
+        """
+        processed = 0
+        while not self.stopping.is_set():
+            job = self.claim()
+            if job is None:
+                if burst:
+                    break
+                self.stopping.wait(self.poll_interval)
+                continue
+            self.run_job(job)
+            processed += 1
+        return processed
+
+    def stop(self, *args):
+        """Lets the current job finish and stops the worker, usable as a signal handler."""
+        self.stopping.set()
+
+
+def work(burst=False, poll_interval=None):
+    """
+    Runs a worker in the current process until SIGTERM or SIGINT, used by run_workers.
+
+    :param burst: Stop when the queue is empty.
+    :param poll_interval: Seconds between looks into an empty queue, see Worker.
+    :return: Number of processed jobs.
+    """
+    worker = Worker(poll_interval=poll_interval)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    try:
+        return worker.run(burst=burst)
+    finally:
+        connection.close()
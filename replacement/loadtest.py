@@ -0,0 +1,296 @@
+"""
+Load test
+
+Simulated users drive a running instance of the app over HTTP, each in its own thread
+with its own keep-alive connection and session cookies, like a browser would. Every
+user logs in and then repeats flows picked at random by their weights:
+
+- browse: brand listing and hardware detail,
+- calculate: replacement calculation form and its POST,
+- edit: creating hardware, finding it in the search, updating and deleting it.
+
+Every request is timed under the URL name of its view, the report gives the throughput
+and the latency percentiles per URL name. Only the standard library is used, so the
+test runs offline against a local server.
+"""
+import http.client
+import random
+import re
+import threading
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.urls import reverse
+
+FLOW_WEIGHTS = {"browse": 6, "calculate": 3, "edit": 1}
+DETAIL_LINK = re.compile(r'/hw-detail/(\d+)/')
+
+
+class UnexpectedResponse(Exception):
+    """The server answered with a status the flow didn't expect, the rest of the flow is skipped."""
+
+
+def percentile(latencies, fraction):
+    """
+    :param latencies: Sorted latencies.
+    :param fraction: Percentile as a fraction, e.g. 0.95.
+    :return: Latency at the percentile (nearest rank), 0 without latencies.
+    """
+    if not latencies:
+        return 0.0
+    return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+
+class LoadStats:
+    """Latencies and errors per URL name, shared by the threads of the simulated users."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, name, latency, ok):
+        """
+        :param name: URL name and method of the request, e.g. "replacement:brand-list GET".
+        :param latency: Duration of the request in seconds.
+        :param ok: Whether the response had the expected status.
+        """
+        with self.lock:
+            self.latencies.setdefault(name, []).append(latency)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, elapsed):
+        """
+        :param elapsed: Duration of the test in seconds.
+        :return: List of dictionaries with name, requests, errors, rate and p50/p95/p99 in milliseconds,
+            ordered by name, and a total row at the end.
+        """
+        rows = []
+        everything = []
+        for name in sorted(self.latencies):
+            latencies = sorted(self.latencies[name])
+            everything.extend(latencies)
+            rows.append(self.summary_row(name, latencies, self.errors.get(name, 0), elapsed))
+        rows.append(self.summary_row("total", sorted(everything), sum(self.errors.values()), elapsed))
+        return rows
+
+    @staticmethod
+    def summary_row(name, latencies, errors, elapsed):
+        return {
+            "name": name,
+            "requests": len(latencies),
+            "errors": errors,
+            "rate": len(latencies) / elapsed if elapsed else 0.0,
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p95": percentile(latencies, 0.95) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+        }
+
+
+class SimulatedUser:
+    """One logged-in user with its own connection and cookies."""
+
+    def __init__(self, base_url, username, password, stats, rng, slugs, hardware, think_time=0.0):
+        """
+        :param base_url: URL of the server, e.g. "http://127.0.0.1:8000".
+        :param username: Username to log in with.
+        :param password: Password of the user.
+        :param stats: Shared LoadStats.
+        :param rng: Random number generator of the user.
+        :param slugs: Brand slugs to browse.
+        :param hardware: List of (pk, brand pk) tuples of hardware to open and calculate.
+        :param think_time: Mean pause between flows in seconds, exponentially distributed.
+        """
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.username = username
+        self.password = password
+        self.stats = stats
+        self.rng = rng
+        self.slugs = slugs
+        self.hardware = hardware
+        self.think_time = think_time
+        self.cookies = {}
+        self.connection = None
+        self.created = 0
+
+    def request(self, name, method, url, data=None, expected=200):
+        """
+        Sends a request over the keep-alive connection and records its latency.
+
+        :param name: URL name of the view.
+        :param method: "GET" or "POST".
+        :param url: Path with the query string.
+        :param data: Form data of a POST, the CSRF token is added.
+        :param expected: Expected status; redirects are not followed.
+        :raises UnexpectedResponse: If the status differs.
+        :return: Tuple (status, body as text).
+        """
+        headers = {"Host": f"{self.host}:{self.port}"}
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{key}={value}" for key, value in self.cookies.items())
+        body = None
+        if method == "POST":
+            body = urlencode({**(data or {}), "csrfmiddlewaretoken": self.cookies.get("csrftoken", "")})
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+        started = time.perf_counter()
+        try:
+            status, response_headers, content = self.send(method, url, body, headers)
+        except (OSError, http.client.HTTPException):
+            self.stats.record(f"{name} {method}", time.perf_counter() - started, False)
+            raise UnexpectedResponse(f"{method} {url} failed")
+        self.stats.record(f"{name} {method}", time.perf_counter() - started, status == expected)
+
+        for header in response_headers:
+            for morsel in SimpleCookie(header).values():
+                self.cookies[morsel.key] = morsel.value
+        if status != expected:
+            raise UnexpectedResponse(f"{method} {url} returned {status}, expected {expected}")
+        return status, content.decode("utf-8", "replace")
+
+    def send(self, method, url, body, headers):
+        """
+        Sends the request, reconnects once when the server closed the keep-alive connection.
+
+        :return: Tuple (status, Set-Cookie headers, body).
+        """
+        for attempt in (1, 2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.connection.request(method, url, body=body, headers=headers)
+                response = self.connection.getresponse()
+                content = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self.connection.close()
+                self.connection = None
+                if attempt == 2:
+                    raise
+                continue
+            if response.getheader("Connection", "").lower() == "close":
+                self.connection.close()
+                self.connection = None
+            return response.status, response.headers.get_all("Set-Cookie") or [], content
+
+    def login(self):
+        """Logs the user in through the login form."""
+        url = reverse("login")
+        self.request("login", "GET", url)
+        self.request("login", "POST", url, {"username": self.username, "password": self.password}, expected=302)
+
+    def browse(self):
+        """Opens a page of a brand listing and the detail of hardware."""
+        self.request("replacement:brand-list", "GET", reverse("replacement:brand-list", args=[self.rng.choice(self.slugs)]))
+        pk, _ = self.rng.choice(self.hardware)
+        self.request("replacement:hw-detail", "GET", reverse("replacement:hw-detail", args=[pk]))
+
+    def calculate(self):
+        """Opens the calculation form of hardware and submits it."""
+        pk, _ = self.rng.choice(self.hardware)
+        url = reverse("replacement:replacement-calculation", args=[pk])
+        self.request("replacement:replacement-calculation", "GET", url)
+        self.request("replacement:replacement-calculation", "POST", url, {
+            "repair_offer": str(self.rng.randrange(0, 200000)),
+            "service_cost": str(self.rng.randrange(0, 50000)),
+            "hw_production_date": f"{self.rng.randrange(2012, 2024)}-{self.rng.randrange(1, 13):02d}-"
+                                  f"{self.rng.randrange(1, 29):02d}",
+        })
+
+    def edit(self):
+        """Creates hardware, finds it in the search, changes its price and deletes it."""
+        _, brand_id = self.rng.choice(self.hardware)
+        self.created += 1
+        hw_name = f"Loadtest {self.username} {self.created} {self.rng.randrange(10 ** 9)}"
+        values = {"brand_name": str(brand_id), "hw_name": hw_name, "hw_price": str(self.rng.randrange(5000, 500000)),
+                  "write_off_length": str(self.rng.choice([3, 5, 7]))}
+
+        url = reverse("replacement:hw-create")
+        self.request("replacement:hw-create", "GET", url)
+        self.request("replacement:hw-create", "POST", url, values, expected=302)
+
+        _, content = self.request("replacement:hw-search", "GET",
+                                  f'{reverse("replacement:hw-search")}?{urlencode({"q": hw_name})}')
+        match = DETAIL_LINK.search(content)
+        if match is None:
+            raise UnexpectedResponse(f"Created hardware {hw_name} not found by the search")
+        pk = int(match.group(1))
+
+        url = reverse("replacement:hw-update", args=[pk])
+        self.request("replacement:hw-update", "GET", url)
+        self.request("replacement:hw-update", "POST", url, {**values, "hw_price": str(int(values["hw_price"]) + 100)},
+                     expected=302)
+        url = reverse("replacement:hw-delete", args=[pk])
+        self.request("replacement:hw-delete", "GET", url)
+        self.request("replacement:hw-delete", "POST", url, expected=302)
+
+    def run(self, deadline, stopping):
+        """
+        Logs in and repeats random flows until the deadline.
+
+        :param deadline: time.monotonic() value when the user stops.
+        :param stopping: threading.Event stopping the user early.
+        :return: Number of flows that failed.
+        """
+        failed = 0
+        flows = list(FLOW_WEIGHTS)
+        weights = list(FLOW_WEIGHTS.values())
+        try:
+            self.login()
+        except UnexpectedResponse:
+            return 1
+        while time.monotonic() < deadline and not stopping.is_set():
+            flow = self.rng.choices(flows, weights)[0]
+            try:
+                getattr(self, flow)()
+            except UnexpectedResponse:
+                failed += 1
+            if self.think_time:
+                stopping.wait(min(self.rng.expovariate(1 / self.think_time), max(0.0, deadline - time.monotonic())))
+        if self.connection is not None:
+            self.connection.close()
+        return failed
+
+
+def run_load(base_url, usernames, password, duration, slugs, hardware, seed=42, think_time=0.0):
+    """
+    Runs the simulated users concurrently, one thread each.
+
+    :param base_url: URL of the server.
+    :param usernames: Usernames of the simulated users, one user per name.
+    :param password: Password of the users.
+    :param duration: Duration of the test in seconds.
+    :param slugs: Brand slugs to browse.
+    :param hardware: List of (pk, brand pk) tuples.
+    :param seed: Seed of the random flows.
+    :param think_time: Mean pause between flows in seconds.
+    :return: Tuple (LoadStats, number of failed flows, duration in seconds).
+    """
+    stats = LoadStats()
+    stopping = threading.Event()
+    failed = []
+    deadline = time.monotonic() + duration
+    users = [
+        SimulatedUser(base_url, username, password, stats, random.Random(f"{seed}-{number}"), slugs, hardware,
+                      think_time)
+        for number, username in enumerate(usernames)
+    ]
+
+    def run_user(user):
+        failed.append(user.run(deadline, stopping))
+
+    threads = [threading.Thread(target=run_user, args=[user], daemon=True) for user in users]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        stopping.set()
+        for thread in threads:
+            thread.join()
+    return stats, sum(failed), time.perf_counter() - started
@@ -0,0 +1,90 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from replacement import calculation
+from replacement.memo import ScoreMemo
+
+
+class Command(BaseCommand):
+    help = 'Measures the throughput of the single and batch replacement calculation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 100, 1000, 10000, 100000],
+                            help='Batch sizes to measure')
+        parser.add_argument('--duration', type=float, default=1.0,
+                            help='Minimum duration of each measurement in seconds')
+        parser.add_argument('--seed', type=int, default=42, help='Seed of the generated inputs')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        today = date.today()
+        rows = [self.random_row(rng, today) for _ in range(max(options['sizes']))]
+        duration = options['duration']
+
+        self.stdout.write(f'{"benchmark":<32}{"calls/s":>14}{"rows/s":>14}')
+
+        single = rows[:1000]
+        self.report('score (age known)', 1, self.measure(duration, lambda: [
+            calculation.score(price, write_off, age, offer, cost) for price, write_off, _, age, offer, cost in single
+        ], len(single)))
+        self.report('age_in_months + score', 1, self.measure(duration, lambda: [
+            calculation.score(price, write_off, calculation.age_in_months(produced, today), offer, cost)
+            for price, write_off, produced, _, offer, cost in single
+        ], len(single)))
+
+        memo = ScoreMemo(maxsize=len(single))
+        self.report('memo hit', 1, self.measure(duration, lambda: [
+            memo.score(price, write_off, age, offer, cost) for price, write_off, _, age, offer, cost in single
+        ], len(single)))
+
+        for size in options['sizes']:
+            batch = list(zip(*rows[:size]))
+            prices, write_offs, produced, _, offers, costs = batch
+            self.report(f'score_batch[{size}]', size, self.measure(duration, lambda: calculation.score_batch(
+                prices, write_offs, produced, offers, costs, today=today
+            )))
+
+    @staticmethod
+    def random_row(rng, today):
+        """
+        Generates the inputs of one realistic calculation.
+
+        :param rng: Random number generator.
+        :param today: Date of the calculation.
+        :return: Tuple (hw_price, write_off_length, production date, age, repair_offer, service_cost).
+        """
+        produced = today - timedelta(days=rng.randrange(0, 12 * 365))
+        return (
+            rng.randrange(10000, 600000, 1000),
+            rng.choice([3, 5, 7]),
+            produced,
+            calculation.age_in_months(produced, today),
+            Decimal(rng.randrange(0, 20000000)) / 100,
+            Decimal(rng.randrange(0, 5000000)) / 100,
+        )
+
+    @staticmethod
+    def measure(duration, func, calls_per_run=1):
+        """
+        Runs the function repeatedly for at least the given duration.
+
+        :param duration: Minimum duration in seconds.
+        :param func: Function to measure.
+        :param calls_per_run: Number of calls made by one run of the function.
+        :return: Calls per second.
+        """
+        runs = 0
+        started = time.perf_counter()
+        while True:
+            func()
+            runs += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= duration:
+                return runs * calls_per_run / elapsed
+
+    def report(self, name, rows_per_call, calls_per_second):
+        self.stdout.write(f'{name:<32}{calls_per_second:>14,.0f}{calls_per_second * rows_per_call:>14,.0f}')
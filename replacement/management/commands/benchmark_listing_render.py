@@ -0,0 +1,73 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.urls import reverse
+
+from replacement.models import Brand, Hardware
+from replacement.views import BrandListingView
+
+
+class Command(BaseCommand):
+    help = ('Renders every page of the brand listing of a generated brand without the row cache, '
+            'with an empty row cache and with a filled one')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--devices', type=int, default=5000, help='Number of devices of the brand')
+        parser.add_argument('--repeat', type=int, default=3, help='Renders of the whole listing per run')
+
+    def handle(self, *args, **options):
+        # Nic se neuklada, zarizeni existuji jen v pameti
+        brand = Brand(pk=0, brand_name='Benchmark', slug='benchmark')
+        hardware = [
+            Hardware(pk=pk, brand_name=brand, hw_name=f'Zarizeni {pk:05d}', hw_price=1000 + pk, write_off_length=3 + pk % 5)
+            for pk in range(1, options['devices'] + 1)
+        ]
+        per_page = BrandListingView.paginate_by
+        pages = [hardware[start:start + per_page] for start in range(0, len(hardware), per_page)]
+
+        request = RequestFactory().get(reverse('replacement:brand-list', args=[brand.slug]))
+        request.user = AnonymousUser()
+
+        self.stdout.write(f'{len(hardware)} devices, {len(pages)} pages of {per_page}')
+        self.stdout.write(f'{"run":<12}{"ms/page":>10}{"pages/s":>10}')
+        version = time.time_ns()
+        # Timeout 0 nic neulozi, kazdy radek se vykresli znovu
+        self.report('no cache', self.render(request, brand, pages, version, 0, options['repeat']))
+        version += 1
+        self.report('cold cache', self.render(request, brand, pages, version, 3600, 1))
+        self.report('warm cache', self.render(request, brand, pages, version, 3600, options['repeat']))
+
+    @staticmethod
+    def render(request, brand, pages, version, timeout, repeat):
+        """
+        Renders all pages of the listing repeat times.
+
+        :param request: Request of the listing.
+        :param brand: The brand.
+        :param pages: Lists of the hardware of each page.
+        :param version: Cache version of the rows.
+        :param timeout: Timeout of the row cache, 0 disables it.
+        :param repeat: Number of renders of all pages.
+        :return: List of render times of the pages in seconds.
+        """
+        times = []
+        for _ in range(repeat):
+            for page in pages:
+                context = {
+                    'brand': brand,
+                    'hardware': page,
+                    'is_paginated': False,
+                    'listing_version': version,
+                    'listing_cache_timeout': timeout,
+                }
+                started = time.perf_counter()
+                render_to_string(BrandListingView.template_name, context, request)
+                times.append(time.perf_counter() - started)
+        return times
+
+    def report(self, name, times):
+        average = sum(times) / len(times)
+        self.stdout.write(f'{name:<12}{average * 1000:>10.2f}{1 / average:>10.0f}')
@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from project.metrics import RequestMetricsMiddleware, install_query_timer, time_query
+
+
+class Command(BaseCommand):
+    help = ('Measures the time the metrics middleware adds to a request, without and with database queries, '
+            'and fails when it exceeds the budget')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000, help='Requests per measurement')
+        parser.add_argument('--queries', type=int, default=5, help='Queries of the request with database access')
+        parser.add_argument('--repeat', type=int, default=5, help='Measurements, the fastest one is reported')
+        parser.add_argument('--budget', type=float, default=50.0, help='Allowed overhead per request in µs')
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get('/')
+        request.resolver_match = None
+        response = HttpResponse(b'ok')
+        queries = options['queries']
+
+        def plain_view(request):
+            return response
+
+        def database_view(request):
+            with connection.cursor() as cursor:
+                for _ in range(queries):
+                    cursor.execute('SELECT 1')
+            return response
+
+        connection.ensure_connection()
+        self.stdout.write(f'{"request":<24}{"plain µs":>12}{"metrics µs":>12}{"overhead µs":>14}')
+        over_budget = []
+        for name, view in (('no queries', plain_view), (f'{queries} queries', database_view)):
+            # Bez wrapperu na spojeni, jako by metriky nebyly nainstalovane
+            connection.execute_wrappers[:] = [wrapper for wrapper in connection.execute_wrappers
+                                              if wrapper is not time_query]
+            plain = self.measure(view, request, options['requests'], options['repeat'])
+            install_query_timer(connection)
+            measured = self.measure(RequestMetricsMiddleware(view), request, options['requests'], options['repeat'])
+
+            overhead = (measured - plain) * 1e6
+            self.stdout.write(f'{name:<24}{plain * 1e6:>12.2f}{measured * 1e6:>12.2f}{overhead:>14.2f}')
+            if overhead > options['budget']:
+                over_budget.append(name)
+
+        if over_budget:
+            raise CommandError(f'Metrics overhead above {options["budget"]} µs per request: {", ".join(over_budget)}.')
+        self.stdout.write(self.style.SUCCESS(f'Metrics overhead within {options["budget"]} µs per request.'))
+
+    @staticmethod
+    def measure(handler, request, requests, repeat):
+        """
+        Calls the handler repeatedly and returns the fastest time per request.
+
+        :param handler: View or middleware called with the request.
+        :param request: The request.
+        :param requests: Calls per measurement.
+        :param repeat: Number of measurements.
+        :return: Seconds per request.
+        """
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for _ in range(requests):
+                handler(request)
+            elapsed = (time.perf_counter() - started) / requests
+            best = elapsed if best is None else min(best, elapsed)
+        return best
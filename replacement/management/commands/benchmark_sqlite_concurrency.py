@@ -0,0 +1,185 @@
+import multiprocessing
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from project.database import apply_pragmas
+
+# Puvodni nastaveni: rollback journal, plny fsync a vychozi timeout modulu sqlite3
+STOCK_PROFILE = {'pragmas': {'journal_mode': 'DELETE', 'synchronous': 'FULL'}, 'timeout': 5.0}
+
+READ_SQL = (
+    'SELECT id, hw_name, hw_price, write_off_length FROM bench_hardware '
+    'WHERE brand_name_id = ? AND hw_name > ? ORDER BY hw_name, id LIMIT 50'
+)
+WRITE_SQL = 'UPDATE bench_hardware SET hw_price = hw_price + 1 WHERE id = ?'
+
+
+def connect(path, profile):
+    """
+    Opens a connection of the benchmark with the pragmas of the profile.
+
+    :param path: Path of the database.
+    :param profile: Dictionary with the pragmas and the busy timeout in seconds.
+    :return: sqlite3.Connection in autocommit mode.
+    """
+    sqlite_connection = sqlite3.connect(path, timeout=profile['timeout'], isolation_level=None)
+    apply_pragmas(sqlite_connection, profile['pragmas'])
+    return sqlite_connection
+
+
+def read_load(kind, path, profile, keys, duration, batch_size, seed, results):
+    """Reads pages of a brand listing from random positions, runs in its own process."""
+    rng = random.Random(seed)
+    sqlite_connection = connect(path, profile)
+    latencies = []
+    locked = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        _, brand_id, hw_name = rng.choice(keys)
+        started = time.perf_counter()
+        try:
+            sqlite_connection.execute(READ_SQL, (brand_id, hw_name)).fetchall()
+        except sqlite3.OperationalError:
+            locked += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    sqlite_connection.close()
+    results.put((kind, latencies, locked))
+
+
+def write_load(kind, path, profile, keys, duration, batch_size, seed, results):
+    """Updates random hardware in transactions of batch_size rows, runs in its own process."""
+    rng = random.Random(seed)
+    sqlite_connection = connect(path, profile)
+    latencies = []
+    locked = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        ids = [(rng.choice(keys)[0],) for _ in range(batch_size)]
+        started = time.perf_counter()
+        try:
+            sqlite_connection.execute('BEGIN')
+            sqlite_connection.executemany(WRITE_SQL, ids)
+            sqlite_connection.execute('COMMIT')
+        except sqlite3.OperationalError:
+            if sqlite_connection.in_transaction:
+                sqlite_connection.execute('ROLLBACK')
+            locked += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    sqlite_connection.close()
+    results.put((kind, latencies, locked))
+
+
+class Command(BaseCommand):
+    help = ('Measures the read and write throughput of concurrent connections to a copy of the hardware '
+            'table, with the stock SQLite settings and with the SQLITE_PRAGMAS profile')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4, help='Number of reading threads')
+        parser.add_argument('--writers', type=int, default=2, help='Number of writing threads')
+        parser.add_argument('--duration', type=float, default=5.0, help='Duration of each run in seconds')
+        parser.add_argument('--batch-size', type=int, default=20, help='Rows updated in one write transaction')
+        parser.add_argument('--seed', type=int, default=42, help='Seed of the generated load')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The benchmark needs the default database to be SQLite.')
+
+        profiles = {
+            'stock': STOCK_PROFILE,
+            'tuned': {
+                'pragmas': settings.SQLITE_PRAGMAS,
+                'timeout': settings.DATABASES['default'].get('OPTIONS', {}).get('timeout', 5.0),
+            },
+        }
+
+        self.stdout.write(f'{"profile":<8}{"reads/s":>10}{"writes/s":>10}{"read p95 ms":>13}'
+                          f'{"write p95 ms":>14}{"locked":>8}')
+        with tempfile.TemporaryDirectory() as directory:
+            for name, profile in profiles.items():
+                # Kazdy profil dostane vlastni kopii, journal_mode se v souboru pamatuje
+                path = Path(directory) / f'{name}.sqlite3'
+                keys = self.copy_hardware(path)
+                if not keys:
+                    raise CommandError('The database has no hardware to benchmark.')
+                result = self.run_profile(str(path), profile, keys, options)
+                self.report(name, result, options['duration'])
+
+    @staticmethod
+    def copy_hardware(path):
+        """
+        Copies the hardware table of the default database into a new database file.
+
+        :param path: Path of the new database.
+        :return: List of (id, brand_name_id, hw_name) of the copied rows.
+        """
+        source = settings.DATABASES['default']['NAME']
+        copy = sqlite3.connect(path, uri=True)
+        copy.execute('ATTACH DATABASE ? AS source', (f'file:{source}?mode=ro',))
+        copy.execute(
+            'CREATE TABLE bench_hardware AS '
+            'SELECT id, brand_name_id, hw_name, hw_price, write_off_length FROM source.replacement_hardware'
+        )
+        copy.execute('CREATE UNIQUE INDEX bench_hardware_id ON bench_hardware (id)')
+        copy.execute('CREATE INDEX bench_hardware_listing ON bench_hardware (brand_name_id, hw_name)')
+        copy.commit()
+        copy.execute('DETACH DATABASE source')
+        keys = copy.execute('SELECT id, brand_name_id, hw_name FROM bench_hardware').fetchall()
+        copy.close()
+        return keys
+
+    @staticmethod
+    def run_profile(path, profile, keys, options):
+        """
+        Runs the reading and writing processes against the database for the duration.
+
+        Processes, not threads, like the workers of the application server; threads would
+        mostly measure the GIL.
+
+        :param path: Path of the database.
+        :param profile: Dictionary with the pragmas and the busy timeout in seconds.
+        :param keys: Rows from copy_hardware.
+        :param options: Options of the command.
+        :return: Dictionary with the read and write latencies and the number of lock errors.
+        """
+        rng = random.Random(options['seed'])
+        results = multiprocessing.Queue()
+        workers = [('reads', read_load)] * options['readers'] + [('writes', write_load)] * options['writers']
+        processes = [
+            multiprocessing.Process(target=load, args=(
+                kind, path, profile, keys, options['duration'], options['batch_size'], rng.random(), results
+            ))
+            for kind, load in workers
+        ]
+        for process in processes:
+            process.start()
+
+        result = {'reads': [], 'writes': [], 'locked': 0}
+        for _ in processes:
+            kind, latencies, locked = results.get()
+            result[kind] += latencies
+            result['locked'] += locked
+        for process in processes:
+            process.join()
+        return result
+
+    def report(self, name, result, duration):
+        def percentile(latencies, fraction):
+            if not latencies:
+                return float('nan')
+            latencies = sorted(latencies)
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000
+
+        self.stdout.write(
+            f'{name:<8}{len(result["reads"]) / duration:>10.0f}{len(result["writes"]) / duration:>10.1f}'
+            f'{percentile(result["reads"], 0.95):>13.2f}{percentile(result["writes"], 0.95):>14.2f}'
+            f'{result["locked"]:>8}'
+        )
@@ -0,0 +1,128 @@
+import asyncio
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, override_settings
+from django.urls import reverse
+
+from replacement.models import Brand, Hardware
+
+# URL jmena stejnych stranek v sync a async verzi
+STACKS = {
+    'sync': {
+        'listing': 'replacement:brand-list',
+        'detail': 'replacement:hw-detail',
+        'calculation': 'replacement:replacement-calculation',
+    },
+    'async': {
+        'listing': 'replacement:async-brand-list',
+        'detail': 'replacement:async-hw-detail',
+        'calculation': 'replacement:async-replacement-calculation',
+    },
+}
+
+
+class Command(BaseCommand):
+    help = ('Compares the throughput and tail latency of the sync and async views under the same '
+            'concurrent load, both served through the ASGI handler')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help='Username the requests are made as')
+        parser.add_argument('--requests', type=int, default=600, help='Number of requests per stack')
+        parser.add_argument('--concurrency', type=int, default=20, help='Number of requests in flight')
+        parser.add_argument('--warmup', type=int, default=30, help='Requests per stack before measuring')
+        parser.add_argument('--seed', type=int, default=42, help='Seed of the generated load')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'User "{options["user"]}" does not exist.')
+
+        rng = random.Random(options['seed'])
+        slugs = list(Brand.objects.values_list('slug', flat=True))
+        hardware_ids = list(Hardware.objects.filter(hw_price__gt=0, write_off_length__gt=0).values_list('pk', flat=True)[:5000])
+        if not slugs or not hardware_ids:
+            raise CommandError('The database has no brands or hardware to request.')
+
+        # Stejna zatez pro obe verze: druh stranky a jeji parametr
+        load = [self.random_request(rng, slugs, hardware_ids) for _ in range(options['requests'])]
+        warmup = load[:options['warmup']]
+
+        client = AsyncClient()
+        client.force_login(user)
+
+        self.stdout.write(f'{"stack":<8}{"requests":>10}{"errors":>8}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+        # Testovaci klient posila Host: testserver
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for stack, url_names in STACKS.items():
+                asyncio.run(self.run_load(client, url_names, warmup, options['concurrency']))
+                latencies, errors, elapsed = asyncio.run(self.run_load(client, url_names, load, options['concurrency']))
+                self.report(stack, latencies, errors, elapsed)
+
+    @staticmethod
+    def random_request(rng, slugs, hardware_ids):
+        """
+        Generates one request of the mixed load: listings, details and calculations.
+
+        :param rng: Random number generator.
+        :param slugs: Brand slugs.
+        :param hardware_ids: Hardware primary keys.
+        :return: Tuple (kind, URL argument, POST data or None).
+        """
+        kind = rng.choice(['listing', 'detail', 'calculation'])
+        if kind == 'listing':
+            return kind, rng.choice(slugs), None
+        if kind == 'detail':
+            return kind, rng.choice(hardware_ids), None
+        return kind, rng.choice(hardware_ids), {
+            'repair_offer': str(rng.randrange(0, 200000)),
+            'service_cost': str(rng.randrange(0, 50000)),
+            'hw_production_date': f'{rng.randrange(2012, 2024)}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}',
+        }
+
+    @staticmethod
+    async def run_load(client, url_names, load, concurrency):
+        """
+        Sends the requests with the given number in flight.
+
+        :param client: Logged in AsyncClient.
+        :param url_names: URL names of the stack by kind of request.
+        :param load: Requests from random_request.
+        :param concurrency: Number of requests in flight.
+        :return: Tuple (latencies in seconds, number of errors, total time in seconds).
+        """
+        requests = iter(load)
+        latencies = []
+        errors = 0
+
+        async def worker():
+            nonlocal errors
+            for kind, argument, data in requests:
+                url = reverse(url_names[kind], args=[argument])
+                started = time.perf_counter()
+                if data is None:
+                    response = await client.get(url)
+                else:
+                    response = await client.post(url, data)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies, errors, time.perf_counter() - started
+
+    def report(self, stack, latencies, errors, elapsed):
+        latencies = sorted(latencies)
+
+        def percentile(fraction):
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000
+
+        self.stdout.write(
+            f'{stack:<8}{len(latencies):>10}{errors:>8}{len(latencies) / elapsed:>10.1f}'
+            f'{percentile(0.50):>10.1f}{percentile(0.95):>10.1f}{percentile(0.99):>10.1f}'
+        )
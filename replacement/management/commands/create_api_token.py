@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from replacement.models import ApiToken
+
+
+class Command(BaseCommand):
+    help = 'Creates a token for the JSON API and prints its key'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help='Name of the system using the token')
+
+    def handle(self, *args, **options):
+        if ApiToken.objects.filter(name=options['name']).exists():
+            raise CommandError(f'Token "{options["name"]}" already exists.')
+
+        token, key = ApiToken.generate(options['name'])
+        self.stdout.write(self.style.SUCCESS(f'Token "{token.name}" created. The key is shown only once:'))
+        self.stdout.write(key)
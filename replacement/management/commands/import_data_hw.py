@@ -1,46 +1,101 @@
-import csv
-from datetime import datetime
-from django.core.management.base import BaseCommand
-from replacement.models import Brand, Hardware  # Replace 'myapp' with your actual app name
+import io
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from replacement.importer import DEFAULT_BATCH_SIZE, HardwareImporter, read_hardware_rows
+from replacement.jobs import enqueue, store_job_file
 
 
 class Command(BaseCommand):
-    help = 'Imports hardware data from a CSV file'
+    help = ('Imports hardware data from a CSV file (or stdin when the path is "-"). '
+            'Rows are matched on brand_name and hw_name, only new and changed rows are written.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', nargs='?', default='-',
+                            help='Path to the CSV file, "-" reads from stdin')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Number of rows written in one transaction')
+        parser.add_argument('--encoding', default='utf-8-sig', help='Encoding of the CSV file')
+        parser.add_argument('--delimiter', default=',', help='Column delimiter of the CSV file')
+        parser.add_argument('--delete-missing', action='store_true',
+                            help='Delete hardware that is not in the CSV file')
+        parser.add_argument('--background', action='store_true',
+                            help='Only queue the import as a background job processed by run_workers')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be a positive number.')
+
+        if options['background']:
+            return self.enqueue_import(options)
 
-    def handle(self, *args, **kwargs):
-        # Specify the path to your CSV file
-        file_path = '/Users/terezahrabalova/Desktop/Brands_data.xlsx - List1.csv'
+        importer = HardwareImporter(
+            batch_size=options['batch_size'],
+            delete_missing=options['delete_missing'],
+            on_warning=lambda message: self.stderr.write(self.style.WARNING(message)),
+            on_progress=self.report_progress if options['verbosity'] > 1 else None,
+        )
 
-        # Open the CSV file
-        with open(file_path, newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
+        if options['csv_file'] == '-':
+            csvfile = io.TextIOWrapper(sys.stdin.buffer, encoding=options['encoding'], newline='')
+        else:
+            try:
+                csvfile = open(options['csv_file'], newline='', encoding=options['encoding'])
+            except OSError as exc:
+                raise CommandError(f"Cannot open {options['csv_file']}: {exc}")
 
-            for row in reader:
-                # Clean the hw_price field by replacing non-breaking spaces and other unwanted characters
-                brand_name = row.get('brand_name')
-                hw_name = row.get('hw_name')
+        with csvfile:
+            stats = importer.run(read_hardware_rows(csvfile, delimiter=options['delimiter']))
 
-                # Strip any whitespace or non-breaking spaces in hw_price and convert it to an integer
-                hw_price = row.get('hw_price', '0').replace('\xa0', '').replace(' ', '')
-                hw_price = int(hw_price)  # Convert the cleaned string to integer
+        self.stdout.write(self.style.SUCCESS(
+            f'Data imported successfully! {stats.created} created, {stats.updated} updated, '
+            f'{stats.unchanged} unchanged, {stats.skipped} skipped '
+            f'of {stats.rows} rows in {stats.elapsed:.2f} s ({stats.rows_per_second:.0f} rows/s).'
+        ))
+        if stats.deleted:
+            self.stdout.write(f'{stats.deleted} hardware rows not in the file were deleted.')
+        if stats.protected:
+            self.stdout.write(self.style.WARNING(
+                f'{len(stats.protected)} hardware rows not in the file were kept, '
+                f'they have devices in stores: ' + ', '.join(str(pk) for pk in stats.protected)
+            ))
+        if not options['delete_missing'] and stats.missing:
+            self.stdout.write(self.style.WARNING(
+                f'{len(stats.missing)} hardware rows are not in the file, '
+                f'use --delete-missing to delete them.'
+            ))
+            if options['verbosity'] > 1:
+                self.stdout.write('IDs: ' + ', '.join(str(pk) for pk in stats.missing))
 
-                write_off_length = int(row.get('write_off_length', 0))  # Default to 0 if missing
-                hw_production_date = datetime.now()  # Assuming current date for production
+    def enqueue_import(self, options):
+        """
+        Copies the CSV file to the job files and queues its import.
 
-                if not brand_name:
-                    print("Missing brand_name in row:", row)
-                    continue
+        :param options: Options of the command.
+        """
+        if options['csv_file'] == '-':
+            source = sys.stdin.buffer
+        else:
+            try:
+                source = open(options['csv_file'], 'rb')
+            except OSError as exc:
+                raise CommandError(f"Cannot open {options['csv_file']}: {exc}")
 
-                # Get or create the brand instance
-                brand, created = Brand.objects.get_or_create(brand_name=brand_name)
+        with source:
+            name = store_job_file(iter(lambda: source.read(64 * 1024), b''), suffix='.csv')
+        job = enqueue('import_hardware', {
+            'file': name,
+            'delete_missing': options['delete_missing'],
+            'encoding': options['encoding'],
+            'delimiter': options['delimiter'],
+        })
+        self.stdout.write(self.style.SUCCESS(f'Import queued as job {job.pk}, run_workers will process it.'))
 
-                # Create the hardware entry
-                Hardware.objects.create(
-                    brand_name=brand,
-                    hw_name=hw_name,
-                    hw_price=hw_price,
-                    write_off_length=write_off_length,
-                    hw_production_date=hw_production_date
-                )
+    def report_progress(self, stats):
+        """
+        Prints the progress of the import after each batch.
 
-            self.stdout.write(self.style.SUCCESS('Data imported successfully!'))
\ No newline at end of file
+        :param stats: ImportStats of the running import.
+        """
+        self.stdout.write(f'{stats.rows} rows processed ({stats.rows_per_second:.0f} rows/s)')
@@ -0,0 +1,131 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from replacement.loadtest import run_load
+from replacement.models import Brand, Hardware
+
+
+def free_port():
+    """
+    :return: Number of a free TCP port on the loopback interface.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = ('Simulates concurrent logged-in users (login, brand listing, detail, calculation, '
+            'create/update/delete) against a local server and reports the throughput and the '
+            'p50/p95/p99 latency per URL name. Starts runserver on a free port unless --url is given. '
+            'Seed the database and the users with seed_data first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Number of concurrent simulated users')
+        parser.add_argument('--duration', type=float, default=30.0, help='Duration of the test in seconds')
+        parser.add_argument('--think-time', type=float, default=0.0,
+                            help='Mean pause of a user between flows in seconds, 0 for the maximal load')
+        parser.add_argument('--url', help='URL of an already running server, e.g. http://127.0.0.1:8000')
+        parser.add_argument('--user-prefix', default='loadtest-', help='Prefix of the usernames from seed_data')
+        parser.add_argument('--password', default='loadtest', help='Password of the users')
+        parser.add_argument('--seed', type=int, default=42, help='Seed of the random flows')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['duration'] <= 0:
+            raise CommandError('--users and --duration must be positive numbers.')
+
+        usernames = list(
+            User.objects.filter(username__startswith=options['user_prefix'], is_active=True)
+            .order_by('pk').values_list('username', flat=True)
+        )
+        if not usernames:
+            raise CommandError(f'There are no users "{options["user_prefix"]}*", run seed_data --users N first.')
+        slugs = list(Brand.objects.values_list('slug', flat=True))
+        hardware = list(
+            Hardware.objects.filter(hw_price__gt=0, write_off_length__gt=0)
+            .values_list('pk', 'brand_name_id')[:10000]
+        )
+        if not slugs or not hardware:
+            raise CommandError('The database has no brands or hardware, run seed_data first.')
+        # Vice simulovanych uzivatelu muze sdilet ucet
+        accounts = [usernames[number % len(usernames)] for number in range(options['users'])]
+
+        server = None
+        base_url = options['url']
+        if base_url is None:
+            server, base_url = self.start_server()
+        try:
+            self.wait_for(base_url)
+            self.stdout.write(f'{options["users"]} users against {base_url} for {options["duration"]:.0f} s...')
+            stats, failed, elapsed = run_load(
+                base_url.rstrip('/'), accounts, options['password'], options['duration'], slugs, hardware,
+                seed=options['seed'], think_time=options['think_time'],
+            )
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=10)
+
+        self.report(stats.summary(elapsed))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} flows were interrupted by an unexpected response.'))
+
+    def start_server(self):
+        """
+        Starts runserver with the settings of this command on a free port.
+
+        :return: Tuple (process, URL of the server).
+        """
+        port = free_port()
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'runserver', f'127.0.0.1:{port}',
+             '--noreload', '--skip-checks'],
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE},
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        return process, f'http://127.0.0.1:{port}'
+
+    @staticmethod
+    def wait_for(base_url, timeout=30.0):
+        """
+        Waits until the server answers the login page.
+
+        :param base_url: URL of the server.
+        :param timeout: Seconds to wait.
+        :raises CommandError: If the server doesn't answer in time.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                with urllib.request.urlopen(base_url.rstrip('/') + reverse('login'), timeout=5):
+                    return
+            except (urllib.error.URLError, ConnectionError):
+                if time.monotonic() > deadline:
+                    raise CommandError(f'The server at {base_url} does not answer.')
+                time.sleep(0.2)
+
+    def report(self, rows):
+        """
+        Prints the throughput and latency table.
+
+        :param rows: Rows from LoadStats.summary.
+        """
+        width = max(len(row['name']) for row in rows) + 2
+        self.stdout.write(f'{"URL name":<{width}}{"requests":>10}{"errors":>8}{"req/s":>10}'
+                          f'{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+        for row in rows:
+            self.stdout.write(
+                f'{row["name"]:<{width}}{row["requests"]:>10}{row["errors"]:>8}{row["rate"]:>10.1f}'
+                f'{row["p50"]:>10.1f}{row["p95"]:>10.1f}{row["p99"]:>10.1f}'
+            )
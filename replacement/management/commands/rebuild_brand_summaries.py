@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from replacement.summaries import compare_summaries, rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = ('Recomputes the brand summaries of the dashboard from scratch, or with --check only compares '
+            'the incrementally maintained summaries with recomputed ones')
+
+    def add_arguments(self, parser):
+        parser.add_argument('brand_ids', nargs='*', type=int, help='IDs of the brands, all by default')
+        parser.add_argument('--check', action='store_true',
+                            help='Only report the differences, fail if there are any')
+
+    def handle(self, *args, **options):
+        brand_ids = options['brand_ids'] or None
+        started = time.perf_counter()
+
+        if options['check']:
+            differences = compare_summaries(brand_ids)
+            for brand_id, field, stored, computed in differences:
+                self.stdout.write(f'Brand {brand_id}: {field} is {stored}, recomputed {computed}')
+            if differences:
+                raise CommandError(f'{len(differences)} differences found, run rebuild_brand_summaries to fix them.')
+            self.stdout.write(self.style.SUCCESS(
+                f'Brand summaries are consistent (checked in {time.perf_counter() - started:.1f} s).'
+            ))
+            return
+
+        rebuilt = rebuild_summaries(brand_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Summaries of {rebuilt} brands rebuilt in {time.perf_counter() - started:.1f} s.'
+        ))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from replacement import search
+
+
+class Command(BaseCommand):
+    help = ('Refills the hardware search index from the hardware and brand tables and rebuilds it, '
+            'fails when the triggers keeping it in sync are missing')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if not search.index_available(using):
+            raise CommandError(f'The database {using} has no search index, the search uses icontains.')
+
+        started = time.perf_counter()
+        indexed = search.rebuild_index(using)
+        self.stdout.write(self.style.SUCCESS(
+            f'{indexed} hardware indexed in {time.perf_counter() - started:.1f} s.'
+        ))
+
+        missing = search.missing_triggers(using)
+        if missing:
+            raise CommandError(f'Missing triggers {", ".join(missing)}, the index won\'t follow further changes. '
+                               'Recreate them with the CREATE TRIGGER statements of migration 0005.')
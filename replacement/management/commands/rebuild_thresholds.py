@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from replacement.models import Hardware
+from replacement.thresholds import DEFAULT_CHUNK_SIZE, refresh_thresholds
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the table of break-even repair costs of all hardware (or of the given IDs)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('hardware_ids', nargs='*', type=int, help='IDs of the hardware to rebuild, all by default')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Number of hardware rebuilt in one transaction')
+
+    def handle(self, *args, **options):
+        hardware_ids = options['hardware_ids'] or list(Hardware.objects.order_by('pk').values_list('pk', flat=True))
+        chunk_size = options['chunk_size']
+
+        started = time.perf_counter()
+        written = 0
+        for start in range(0, len(hardware_ids), chunk_size):
+            written += refresh_thresholds(hardware_ids[start:start + chunk_size], chunk_size=chunk_size)
+            if options['verbosity'] >= 2:
+                self.stdout.write(f'{min(start + chunk_size, len(hardware_ids))}/{len(hardware_ids)} hardware')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{written} thresholds of {len(hardware_ids)} hardware written in {elapsed:.1f} s.'
+        ))
@@ -0,0 +1,67 @@
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from replacement import repricing
+from replacement.models import Brand
+
+
+def decimal(value):
+    """Argument type for Decimal, argparse reports only ValueError and TypeError as invalid values."""
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValueError(value)
+
+
+class Command(BaseCommand):
+    help = ('Changes the prices of the filtered hardware by a percentage or an amount with a single UPDATE. '
+            'The listing cache, break-even thresholds, brand summaries and fleet scores are refreshed in bulk.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--brand', help='Slug of the brand')
+        parser.add_argument('--name', help='Name of the hardware, * matches any text, without * a part of the name')
+        parser.add_argument('--write-off-length', type=int, help='Write-off length in years')
+        parser.add_argument('--all', action='store_true', help='Re-price all hardware when no filter is given')
+        change = parser.add_mutually_exclusive_group(required=True)
+        change.add_argument('--percent', type=decimal, help='Change in percent, e.g. 7.5 or -10')
+        change.add_argument('--amount', type=int, help='Change in CZK, e.g. 1500 or -500')
+        parser.add_argument('--dry-run', action='store_true', help='Only show the affected hardware and the new prices')
+        parser.add_argument('--preview-rows', type=int, default=repricing.PREVIEW_ROWS,
+                            help='Number of hardware shown in the preview')
+
+    def handle(self, *args, **options):
+        if not (options['brand'] or options['name'] or options['write_off_length'] is not None or options['all']):
+            raise CommandError('Give --brand, --name or --write-off-length, or --all to re-price all hardware.')
+
+        brand = None
+        if options['brand']:
+            try:
+                brand = Brand.objects.get(slug=options['brand'])
+            except Brand.DoesNotExist:
+                raise CommandError(f"Brand {options['brand']} does not exist.")
+        queryset = repricing.filter_hardware(
+            brand=brand, name_pattern=options['name'], write_off_length=options['write_off_length']
+        )
+        change = {'percent': options['percent'], 'amount': options['amount']}
+
+        try:
+            rows, totals = repricing.preview(queryset, limit=options['preview_rows'], **change)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        for pk, brand_name, hw_name, hw_price, new_price in rows:
+            self.stdout.write(f'{pk:>8}  {brand_name} / {hw_name}: {hw_price} -> {new_price}')
+        if totals['count'] > len(rows):
+            self.stdout.write(f'... {totals["count"] - len(rows)} more')
+        self.stdout.write(
+            f'{totals["count"]} hardware, total price {totals["hw_price_total"] or 0} -> {totals["new_price_total"] or 0}.'
+        )
+        if options['dry_run'] or not totals['count']:
+            return
+
+        started = time.perf_counter()
+        updated = repricing.reprice(queryset, **change)
+        self.stdout.write(self.style.SUCCESS(
+            f'{updated} hardware re-priced in {time.perf_counter() - started:.1f} s.'
+        ))
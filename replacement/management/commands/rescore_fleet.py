@@ -0,0 +1,87 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from replacement.rescoring import DEFAULT_CHUNK_SIZE, chunk_ranges, init_worker, rescore_range
+
+
+class Command(BaseCommand):
+    help = ('Re-scores all devices in stores (age, residual value and break-even repair costs) as of a date, '
+            'in chunks by primary-key range scored in parallel processes. '
+            'A repeated run for the same date only scores the chunks that are not done yet.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of worker processes, 1 scores in this process')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Number of primary keys in one chunk')
+        parser.add_argument('--as-of', type=date.fromisoformat, default=None,
+                            help='Date of the scoring (YYYY-MM-DD), today by default')
+        parser.add_argument('--force', action='store_true',
+                            help='Score all chunks again, also those already scored for the date')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--workers and --chunk-size must be positive numbers.')
+        scored_on = options['as_of'] or date.today()
+        self.verbosity = options['verbosity']
+
+        ranges = chunk_ranges(options['chunk_size'], None if options['force'] else scored_on)
+        if not ranges:
+            self.stdout.write(self.style.SUCCESS(f'All devices are already scored as of {scored_on}.'))
+            return
+        self.stdout.write(f'Scoring {len(ranges)} chunks as of {scored_on} with {options["workers"]} workers.')
+
+        self.started = time.perf_counter()
+        self.scored = 0
+        self.done = 0
+        failed = []
+        if options['workers'] == 1:
+            for first_pk, last_pk in ranges:
+                self.report(len(ranges), first_pk, last_pk, rescore_range(first_pk, last_pk, scored_on))
+        else:
+            # Procesy nesmi sdilet spojeni rodice
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=init_worker) as pool:
+                futures = {
+                    pool.submit(rescore_range, first_pk, last_pk, scored_on): (first_pk, last_pk)
+                    for first_pk, last_pk in ranges
+                }
+                for future in as_completed(futures):
+                    first_pk, last_pk = futures[future]
+                    try:
+                        scored = future.result()
+                    except Exception as exc:
+                        failed.append((first_pk, last_pk))
+                        self.stderr.write(self.style.ERROR(f'Chunk {first_pk}-{last_pk} failed: {exc}'))
+                        continue
+                    self.report(len(ranges), first_pk, last_pk, scored)
+
+        elapsed = time.perf_counter() - self.started
+        if failed:
+            raise CommandError(
+                f'{len(failed)} of {len(ranges)} chunks failed, run the command again to score the rest.'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'{self.scored} devices scored as of {scored_on} in {elapsed:.1f} s.'
+        ))
+
+    def report(self, total, first_pk, last_pk, scored):
+        """
+        Prints the progress after a completed chunk.
+
+        :param total: Number of chunks of the run.
+        :param first_pk: First primary key of the chunk.
+        :param last_pk: Last primary key of the chunk.
+        :param scored: Number of devices scored in the chunk.
+        """
+        self.done += 1
+        self.scored += scored
+        if self.verbosity >= 1:
+            rate = self.scored / max(time.perf_counter() - self.started, 1e-9)
+            self.stdout.write(f'{self.done}/{total} chunks (IDs {first_pk}-{last_pk}), '
+                              f'{self.scored} devices ({rate:.0f}/s)')
@@ -0,0 +1,68 @@
+import multiprocessing
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from replacement.jobs import Worker, purge_finished_jobs, work
+
+
+class Command(BaseCommand):
+    help = ('Runs the background job workers (imports and exports started from the web). '
+            'Every worker claims one job at a time with a lease; the jobs of a worker that died '
+            'are taken over when the lease expires. SIGTERM or Ctrl+C lets the running jobs finish.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of worker processes, 1 runs the worker in this process')
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help='Seconds between looks into an empty queue, '
+                                 'REPLACEMENT_JOBS_POLL_INTERVAL by default')
+        parser.add_argument('--burst', action='store_true',
+                            help='Stop when the queue is empty instead of waiting for new jobs')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be a positive number.')
+
+        purged = purge_finished_jobs(settings.REPLACEMENT_JOBS_KEEP_DAYS)
+        if purged:
+            self.stdout.write(f'{purged} old finished jobs deleted.')
+
+        if options['workers'] == 1:
+            worker = Worker(poll_interval=options['poll_interval'])
+            signal.signal(signal.SIGTERM, worker.stop)
+            signal.signal(signal.SIGINT, worker.stop)
+            self.stdout.write(f'Worker {worker.worker_id} started.')
+            processed = worker.run(burst=options['burst'])
+            self.stdout.write(self.style.SUCCESS(f'Worker stopped, {processed} jobs processed.'))
+            return
+
+        # Procesy nesmi sdilet spojeni rodice
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(
+                target=work,
+                kwargs={'burst': options['burst'], 'poll_interval': options['poll_interval']},
+                name=f'worker-{number}',
+            )
+            for number in range(options['workers'])
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f'{len(processes)} workers started.')
+
+        def stop(signum, frame):
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        for process in processes:
+            process.join()
+        failed = [process.name for process in processes if process.exitcode]
+        if failed:
+            raise CommandError(f'Workers {", ".join(failed)} ended with an error.')
+        self.stdout.write(self.style.SUCCESS('Workers stopped.'))
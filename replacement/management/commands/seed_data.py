@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from replacement import seeding
+
+
+class Command(BaseCommand):
+    help = ('Generates brands, hardware, devices in stores and users for load tests and local development. '
+            'The data is the same for the same --seed and a repeated run only adds what is missing.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--brands', type=int, default=10, help='Number of brands')
+        parser.add_argument('--hardware', type=int, default=1000, help='Number of hardware of every brand')
+        parser.add_argument('--assets', type=int, default=0, help='Number of devices in stores of every hardware')
+        parser.add_argument('--stores', type=int, default=50, help='Number of stores the devices are spread over')
+        parser.add_argument('--users', type=int, default=20, help='Number of users in the editor group')
+        parser.add_argument('--user-prefix', default='loadtest-', help='Prefix of the usernames')
+        parser.add_argument('--password', default='loadtest', help='Password of the new users')
+        parser.add_argument('--seed', type=int, default=42, help='Seed of the generated values')
+
+    def handle(self, *args, **options):
+        if min(options['brands'], options['hardware'], options['assets'], options['users']) < 0 \
+                or options['stores'] < 1:
+            raise CommandError('The numbers must not be negative and --stores must be positive.')
+        started = time.perf_counter()
+
+        if options['brands'] and options['hardware']:
+            stats = seeding.seed_hardware(
+                options['brands'], options['hardware'], seed=options['seed'],
+                on_progress=self.report_progress if options['verbosity'] > 1 else None,
+            )
+            self.stdout.write(f'Hardware: {stats.created} created, {stats.updated} updated, '
+                              f'{stats.unchanged} unchanged in {stats.elapsed:.1f} s.')
+        if options['assets']:
+            created = seeding.seed_assets(options['assets'], options['brands'], seed=options['seed'],
+                                          stores=options['stores'])
+            self.stdout.write(f'Devices in stores: {created} created.')
+        if options['users']:
+            usernames = seeding.seed_users(options['users'], options['password'], prefix=options['user_prefix'])
+            self.stdout.write(f'Users: {usernames[0]} to {usernames[-1]}, new ones with the password '
+                              f'"{options["password"]}".')
+
+        self.stdout.write(self.style.SUCCESS(f'Data seeded in {time.perf_counter() - started:.1f} s.'))
+
+    def report_progress(self, stats):
+        """
+        Prints the progress of the hardware import after each batch.
+
+        :param stats: ImportStats of the running import.
+        """
+        self.stdout.write(f'{stats.rows} hardware rows processed ({stats.rows_per_second:.0f} rows/s)')
@@ -0,0 +1,64 @@
+import sqlite3
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from project.replicas import replica_aliases
+
+
+def replica_path(name):
+    """
+    :param name: NAME of the replica database, a path or a "file:" URI.
+    :return: Path of the replica file.
+    """
+    if name.startswith('file:'):
+        return urlsplit(name).path
+    return name
+
+
+def copy_database(source, target):
+    """
+    Copies the source SQLite database into the target file with the backup API.
+
+    The copy is consistent even while the source is being written to. The replica keeps
+    the rollback journal, it is never written to except by this copy.
+
+    :param source: Path of the primary database.
+    :param target: Path of the replica database.
+    """
+    source_connection = sqlite3.connect(f'file:{source}?mode=ro', uri=True)
+    target_connection = sqlite3.connect(target)
+    try:
+        source_connection.backup(target_connection)
+        target_connection.execute('PRAGMA journal_mode = DELETE')
+    finally:
+        target_connection.close()
+        source_connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Copies the default SQLite database into the SQLite read replicas of REPLACEMENT_READ_REPLICAS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Repeat the copy every INTERVAL seconds until interrupted')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Only SQLite databases can be copied, use the replication of the database server.')
+        aliases = [alias for alias in replica_aliases() if settings.DATABASES[alias]['ENGINE'].endswith('sqlite3')]
+        if not aliases:
+            raise CommandError('No SQLite replica is configured in REPLACEMENT_READ_REPLICAS.')
+
+        source = settings.DATABASES['default']['NAME']
+        while True:
+            started = time.monotonic()
+            for alias in aliases:
+                copy_database(source, replica_path(str(settings.DATABASES[alias]['NAME'])))
+            self.stdout.write(f'Copied to {", ".join(aliases)} in {time.monotonic() - started:.2f} s')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,133 @@
+"""
+Memo of replacement calculations
+
+Technicians resubmit the calculation with the same inputs while tweaking quotes.
+The result depends only on the hardware's price and write-off length, its age in
+months (given by the production date and the current date) and the repair offer
+and service cost, so it is memoized under exactly these values. The offer and the cost
+are keyed as the floats the calculation uses, so 29900, "29900" and Decimal("29900.00")
+share one entry, also in the shared cache. A changed price
+or write-off length produces a different key, so an outdated result can never be
+returned; old entries simply fall out of the LRU.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from replacement import calculation
+
+SHARED_KEY = "replacement:score:{}:{}:{}:{}:{}"
+
+
+class ScoreMemo:
+    """
+    Bounded LRU memo of replacement calculation values.
+
+    The local LRU lives in the process. Optionally, a Django cache (for example a
+    file-based or memcached one) is used as a second level shared across workers.
+    """
+
+    def __init__(self, maxsize=4096, shared_cache=None, timeout=None):
+        """
+        :param maxsize: Maximum number of results kept in the local LRU.
+        :param shared_cache: Optional Django cache shared by the workers.
+        :param timeout: Timeout of the results in the shared cache in seconds.
+        """
+        self.maxsize = maxsize
+        self.shared_cache = shared_cache
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_settings(cls):
+        """
+        Creates the memo configured by REPLACEMENT_SCORE_MEMO_SIZE and REPLACEMENT_SCORE_SHARED_CACHE.
+
+        :return: ScoreMemo instance.
+        """
+        alias = settings.REPLACEMENT_SCORE_SHARED_CACHE
+        return cls(
+            maxsize=settings.REPLACEMENT_SCORE_MEMO_SIZE,
+            shared_cache=caches[alias] if alias else None,
+            timeout=settings.REPLACEMENT_SCORE_SHARED_CACHE_TIMEOUT,
+        )
+
+    def score(self, hw_price, write_off_length, hardware_age, repair_offer, service_cost):
+        """
+        Returns the replacement calculation value, calculating it only on a miss.
+
+        :param hw_price: Acquisition price of the hardware.
+        :param write_off_length: Write-off length of the hardware in years.
+        :param hardware_age: Age of the hardware in whole months.
+        :param repair_offer: Repair price offer.
+        :param service_cost: Cost of the previous repairs.
+        :return: Replacement calculation value.
+        """
+        key = (hw_price, write_off_length, hardware_age, float(repair_offer), float(service_cost))
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+
+        result = None
+        if self.shared_cache is not None:
+            shared_key = SHARED_KEY.format(*key)
+            result = self.shared_cache.get(shared_key)
+            if result is not None:
+                self.shared_hits += 1
+
+        if result is None:
+            result = calculation.score(*key)
+            self.misses += 1
+            if self.shared_cache is not None:
+                self.shared_cache.set(shared_key, result, timeout=self.timeout)
+
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return result
+
+    def stats(self):
+        """
+        Returns the hit and miss counters.
+
+        :return: Dictionary with the counters and the current size of the LRU.
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+            }
+
+    def clear(self):
+        """Empties the local LRU and resets the counters."""
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.shared_hits = self.misses = 0
+
+
+_score_memo = None
+
+
+def get_score_memo():
+    """
+    Returns the memo of the process, created from the settings on first use.
+
+    :return: ScoreMemo instance.
+    """
+    global _score_memo
+    if _score_memo is None:
+        _score_memo = ScoreMemo.from_settings()
+    return _score_memo
@@ -0,0 +1,37 @@
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def fill_brand_slugs(apps, schema_editor):
+    """Generates unique slugs for the existing brands."""
+    Brand = apps.get_model('replacement', 'Brand')
+    used = set()
+    for brand in Brand.objects.order_by('pk'):
+        slug = slugify(brand.brand_name) or str(brand.pk)
+        if slug in used:
+            slug = f"{slug}-{brand.pk}"
+        used.add(slug)
+        brand.slug = slug
+        brand.save(update_fields=['slug'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('replacement', '0002_remove_hardware_hw_production_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='brand',
+            name='slug',
+            field=models.SlugField(default='', max_length=100),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_brand_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='brand',
+            name='slug',
+            field=models.SlugField(max_length=100, unique=True),
+        ),
+    ]
@@ -0,0 +1,68 @@
+from django.db import migrations, models
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Merges brands with the same name and hardware duplicated within a brand.
+
+    The oldest row (lowest ID) is kept, so links to it stay valid and the importer keeps
+    updating it, but it takes the price and write-off length of the newest duplicate,
+    which holds the most recently imported values. Every removed row is printed together
+    with the row it was merged into, the removal itself can't be reversed.
+    """
+    Brand = apps.get_model('replacement', 'Brand')
+    Hardware = apps.get_model('replacement', 'Hardware')
+    merged = []
+
+    kept_brands = {}
+    for brand in Brand.objects.order_by('pk'):
+        if brand.brand_name in kept_brands:
+            Hardware.objects.filter(brand_name=brand).update(brand_name=kept_brands[brand.brand_name])
+            merged.append(('Brand', brand.pk, kept_brands[brand.brand_name].pk))
+            brand.delete()
+        else:
+            kept_brands[brand.brand_name] = brand
+
+    # (brand, nazev) -> [ID ponechaneho radku, hodnoty nejnovejsiho duplikatu]
+    kept_hardware = {}
+    duplicates = []
+    rows = Hardware.objects.order_by('pk').values_list('pk', 'brand_name_id', 'hw_name', 'hw_price', 'write_off_length')
+    for pk, brand_id, hw_name, hw_price, write_off_length in rows:
+        kept = kept_hardware.get((brand_id, hw_name))
+        if kept is None:
+            kept_hardware[brand_id, hw_name] = [pk, None]
+        else:
+            kept[1] = (hw_price, write_off_length)
+            duplicates.append(pk)
+            merged.append(('Hardware', pk, kept[0]))
+
+    for kept_pk, values in kept_hardware.values():
+        if values is not None:
+            Hardware.objects.filter(pk=kept_pk).update(hw_price=values[0], write_off_length=values[1])
+    for start in range(0, len(duplicates), 500):
+        Hardware.objects.filter(pk__in=duplicates[start:start + 500]).delete()
+
+    if merged:
+        print()
+        for model, removed_pk, kept_pk in merged:
+            print(f'    {model} {removed_pk} merged into {kept_pk}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('replacement', '0003_brand_slug'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='brand',
+            name='brand_name',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+        migrations.AddConstraint(
+            model_name='hardware',
+            constraint=models.UniqueConstraint(fields=('brand_name', 'hw_name'), name='unique_hardware_per_brand'),
+        ),
+    ]
@@ -0,0 +1,90 @@
+from django.db import migrations
+
+# Trigramovy FTS5 index nad nazvem stroje a brandu, rowid = id stroje
+CREATE_SEARCH_TABLE = [
+    """
+    CREATE VIRTUAL TABLE replacement_hardware_search USING fts5(
+        hw_name, brand_name, tokenize = 'trigram'
+    )
+    """,
+    """
+    INSERT INTO replacement_hardware_search (rowid, hw_name, brand_name)
+    SELECT hardware.id, hardware.hw_name, brand.brand_name
+    FROM replacement_hardware AS hardware
+    JOIN replacement_brand AS brand ON brand.id = hardware.brand_name_id
+    """,
+    """
+    CREATE TRIGGER replacement_hardware_search_insert AFTER INSERT ON replacement_hardware BEGIN
+        INSERT INTO replacement_hardware_search (rowid, hw_name, brand_name)
+        SELECT new.id, new.hw_name, brand_name FROM replacement_brand WHERE id = new.brand_name_id;
+    END
+    """,
+    """
+    CREATE TRIGGER replacement_hardware_search_update AFTER UPDATE OF hw_name, brand_name_id ON replacement_hardware BEGIN
+        DELETE FROM replacement_hardware_search WHERE rowid = old.id;
+        INSERT INTO replacement_hardware_search (rowid, hw_name, brand_name)
+        SELECT new.id, new.hw_name, brand_name FROM replacement_brand WHERE id = new.brand_name_id;
+    END
+    """,
+    """
+    CREATE TRIGGER replacement_hardware_search_delete AFTER DELETE ON replacement_hardware BEGIN
+        DELETE FROM replacement_hardware_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER replacement_brand_search_update AFTER UPDATE OF brand_name ON replacement_brand BEGIN
+        UPDATE replacement_hardware_search SET brand_name = new.brand_name
+        WHERE rowid IN (SELECT id FROM replacement_hardware WHERE brand_name_id = new.id);
+    END
+    """,
+]
+
+DROP_SEARCH_TABLE = [
+    "DROP TRIGGER IF EXISTS replacement_brand_search_update",
+    "DROP TRIGGER IF EXISTS replacement_hardware_search_delete",
+    "DROP TRIGGER IF EXISTS replacement_hardware_search_update",
+    "DROP TRIGGER IF EXISTS replacement_hardware_search_insert",
+    "DROP TABLE IF EXISTS replacement_hardware_search",
+]
+
+
+def fts5_trigram_available(connection):
+    """Checks that the SQLite library supports FTS5 with the trigram tokenizer (SQLite 3.34+)."""
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.replacement_fts5_probe USING fts5(x, tokenize = 'trigram')")
+        except Exception:
+            return False
+        cursor.execute("DROP TABLE temp.replacement_fts5_probe")
+    return True
+
+
+def create_search_table(apps, schema_editor):
+    """
+    Creates the search index on SQLite. Other databases (and SQLite builds without FTS5)
+    are left without it and the search falls back to icontains.
+    """
+    if not fts5_trigram_available(schema_editor.connection):
+        return
+    for statement in CREATE_SEARCH_TABLE:
+        schema_editor.execute(statement)
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_SEARCH_TABLE:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('replacement', '0004_brand_name_unique_hardware_per_brand'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
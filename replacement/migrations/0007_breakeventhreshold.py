@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_thresholds(apps, schema_editor):
+    """Computes the thresholds of the existing hardware, see replacement.thresholds."""
+    from replacement.thresholds import DEFAULT_CHUNK_SIZE, insert_threshold_rows, threshold_rows
+
+    Hardware = apps.get_model('replacement', 'Hardware')
+    BreakEvenThreshold = apps.get_model('replacement', 'BreakEvenThreshold')
+    rows = list(Hardware.objects.order_by('pk').values_list('pk', 'hw_price', 'write_off_length'))
+    for start in range(0, len(rows), DEFAULT_CHUNK_SIZE):
+        insert_threshold_rows(
+            threshold_rows(rows[start:start + DEFAULT_CHUNK_SIZE], settings.REPLACEMENT_THRESHOLD_MAX_AGE_MONTHS),
+            model=BreakEvenThreshold,
+            using=schema_editor.connection.alias,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('replacement', '0006_apitoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BreakEvenThreshold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('age_months', models.PositiveSmallIntegerField()),
+                ('individual_from', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('repair_band_from', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('replacement_from', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('hardware', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='thresholds', to='replacement.hardware')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='breakeventhreshold',
+            constraint=models.UniqueConstraint(fields=('hardware', 'age_months'), name='unique_threshold_per_age'),
+        ),
+        migrations.RunPython(fill_thresholds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('replacement', '0007_breakeventhreshold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReplacementDecision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hw_price', models.IntegerField()),
+                ('write_off_length', models.IntegerField()),
+                ('production_date', models.DateField()),
+                ('age_months', models.PositiveSmallIntegerField()),
+                ('repair_offer', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('service_cost', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('replacement_calculation', models.IntegerField()),
+                ('verdict', models.CharField(choices=[('replace', 'Replacement proběhne'), ('individual', 'Individuální posouzení'), ('repair', 'Replacement neproběhne')], max_length=20)),
+                ('created', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('api_token', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='decisions', to='replacement.apitoken')),
+                ('hardware', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='decisions', to='replacement.hardware')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='replacement_decisions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
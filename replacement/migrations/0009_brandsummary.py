@@ -0,0 +1,81 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:52
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+import django.db.models.deletion
+
+
+def fill_summaries(apps, schema_editor):
+    """Sets the brand of the recorded decisions and computes the summaries, see replacement.summaries."""
+    Brand = apps.get_model('replacement', 'Brand')
+    Hardware = apps.get_model('replacement', 'Hardware')
+    ReplacementDecision = apps.get_model('replacement', 'ReplacementDecision')
+    BrandSummary = apps.get_model('replacement', 'BrandSummary')
+    BrandWriteOffSummary = apps.get_model('replacement', 'BrandWriteOffSummary')
+
+    ReplacementDecision.objects.filter(hardware__isnull=False).update(
+        brand=Subquery(Hardware.objects.filter(pk=OuterRef('hardware')).values('brand_name')[:1])
+    )
+
+    summaries = {brand_id: BrandSummary(brand_id=brand_id) for brand_id in Brand.objects.values_list('pk', flat=True)}
+    write_offs = []
+    rows = Hardware.objects.values('brand_name', 'write_off_length').annotate(count=Count('pk'), total=Sum('hw_price'))
+    for row in rows.order_by():
+        summary = summaries[row['brand_name']]
+        summary.hardware_count += row['count']
+        summary.hw_price_total += row['total'] or 0
+        write_offs.append(BrandWriteOffSummary(
+            brand_id=row['brand_name'], write_off_length=row['write_off_length'], hardware_count=row['count']
+        ))
+
+    verdict_fields = {'replace': 'replace_count', 'individual': 'individual_count', 'repair': 'repair_count'}
+    decisions = ReplacementDecision.objects.filter(brand__isnull=False).values_list('brand', 'verdict')
+    for brand_id, verdict, count in decisions.annotate(Count('pk')).order_by():
+        if verdict in verdict_fields:
+            setattr(summaries[brand_id], verdict_fields[verdict], count)
+
+    BrandSummary.objects.bulk_create(summaries.values())
+    BrandWriteOffSummary.objects.bulk_create(write_offs)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('replacement', '0008_replacementdecision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BrandSummary',
+            fields=[
+                ('brand', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='replacement.brand')),
+                ('hardware_count', models.IntegerField(default=0)),
+                ('hw_price_total', models.BigIntegerField(default=0)),
+                ('replace_count', models.IntegerField(default=0)),
+                ('individual_count', models.IntegerField(default=0)),
+                ('repair_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='replacementdecision',
+            name='brand',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='decisions', to='replacement.brand'),
+        ),
+        migrations.CreateModel(
+            name='BrandWriteOffSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('write_off_length', models.IntegerField()),
+                ('hardware_count', models.IntegerField(default=0)),
+                ('brand', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='write_off_summaries', to='replacement.brand')),
+            ],
+            options={
+                'ordering': ['brand', 'write_off_length'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='brandwriteoffsummary',
+            constraint=models.UniqueConstraint(fields=('brand', 'write_off_length'), name='unique_write_off_summary'),
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('replacement', '0009_brandsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Asset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('serial_number', models.CharField(max_length=100, unique=True)),
+                ('store', models.CharField(max_length=100)),
+                ('production_date', models.DateField()),
+                ('hardware', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='assets', to='replacement.hardware')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['store', 'serial_number'], name='asset_store_serial')],
+            },
+        ),
+    ]
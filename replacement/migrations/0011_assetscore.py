@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('replacement', '0010_asset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetScore',
+            fields=[
+                ('asset', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score', serialize=False, to='replacement.asset')),
+                ('scored_on', models.DateField()),
+                ('age_months', models.PositiveSmallIntegerField()),
+                ('residual_value', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('individual_from', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('repair_band_from', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('replacement_from', models.DecimalField(decimal_places=2, max_digits=12)),
+            ],
+        ),
+    ]
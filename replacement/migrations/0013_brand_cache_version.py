@@ -0,0 +1,36 @@
+import time
+
+from django.db import migrations, models
+
+
+def start_versions(apps, schema_editor):
+    """Starts the versions of the existing brands from the current time, see Brand.cache_version."""
+    Brand = apps.get_model('replacement', 'Brand')
+    Brand.objects.update(cache_version=time.time_ns())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('replacement', '0012_job'),
+    ]
+
+    operations = [
+        # ADD COLUMN misto AddField, na SQLite by AddField prestavel tabulku a rozbil FTS triggery z 0005
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'ALTER TABLE replacement_brand ADD COLUMN cache_version bigint NOT NULL DEFAULT 0',
+                    'ALTER TABLE replacement_brand DROP COLUMN cache_version',
+                ),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='brand',
+                    name='cache_version',
+                    field=models.BigIntegerField(default=time.time_ns, editable=False),
+                ),
+            ],
+        ),
+        migrations.RunPython(start_versions, migrations.RunPython.noop),
+    ]
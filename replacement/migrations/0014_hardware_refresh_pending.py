@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('replacement', '0013_brand_cache_version'),
+    ]
+
+    operations = [
+        # ADD COLUMN misto AddField, na SQLite by AddField prestavel tabulku a zahodil FTS triggery z 0005
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'ALTER TABLE replacement_hardware ADD COLUMN refresh_pending bool NOT NULL DEFAULT 0',
+                    'ALTER TABLE replacement_hardware DROP COLUMN refresh_pending',
+                ),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='hardware',
+                    name='refresh_pending',
+                    field=models.BooleanField(default=False, editable=False),
+                ),
+            ],
+        ),
+    ]
@@ -1,7 +1,59 @@
+import hashlib
+import secrets
+import time
+from decimal import Decimal
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+from django.utils.text import slugify
+
+from replacement import calculation
+
 
 class Brand(models.Model):
-    brand_name = models.CharField(max_length=100)
+    brand_name = models.CharField(max_length=100, unique=True)
+    slug = models.SlugField(max_length=100, unique=True)
+    # Verze vypisu v cache (viz replacement.cache), zacina casem v ns, aby byla novejsi nez jakakoli drivejsi
+    cache_version = models.BigIntegerField(default=time.time_ns, editable=False)
+
+    def unique_slug(self):
+        """
+        Generates a URL slug from the brand name not used by another brand.
+
+        Names that slugify the same way get a numeric suffix, e.g. "newbrand" and "newbrand-2".
+
+        :return: The slug.
+        """
+        max_length = self._meta.get_field("slug").max_length
+        base = slugify(self.brand_name) or "brand"
+        # Predpona bez mista na priponu, aby se nasly i zkracene slugy
+        used = set(Brand.objects.exclude(pk=self.pk).filter(slug__startswith=base[:max_length - 10])
+                   .values_list("slug", flat=True))
+        slug = base[:max_length]
+        number = 1
+        while slug in used:
+            number += 1
+            suffix = f"-{number}"
+            slug = base[:max_length - len(suffix)] + suffix
+        return slug
+
+    def save(self, *args, **kwargs):
+        """
+        Generates the URL slug from the brand name when the brand is saved without one.
+
+        A brand loaded from the database is saved without the cache version, which only
+        bump_brand_versions changes, so a stale instance can't move it back.
+        """
+        if not self.slug:
+            self.slug = self.unique_slug()
+        if not self._state.adding and not args and kwargs.get("update_fields") is None \
+                and not kwargs.get("force_insert"):
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "cache_version"
+            ]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.brand_name
@@ -11,8 +63,316 @@ class Hardware(models.Model):
     hw_name = models.CharField(max_length=100)
     hw_price = models.IntegerField()
     write_off_length = models.IntegerField()
+    # Prahy a skore zarizeni cekaji na prepocet po hromadne zmene, viz refresh
+    refresh_pending = models.BooleanField(default=False, editable=False)
+
+    class Meta:
+        constraints = [
+            # Unikatni index (brand_name_id, hw_name) slouzi i pro vypis brandu serazeny podle hw_name
+            models.UniqueConstraint(fields=["brand_name", "hw_name"], name="unique_hardware_per_brand"),
+        ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remembers the values loaded from the database, so signal receivers can tell what changed.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    @property
+    def loaded_values(self):
+        """
+        Returns the field values as they were loaded from the database.
+
+        :return: Dictionary of attribute names and values, empty for new instances.
+        """
+        return getattr(self, "_loaded_values", {})
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Saved values become the new baseline for the next change
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
 
     def __str__(self):
         write_off_text = f"{self.write_off_length} roky" if self.write_off_length == 3 else f"{self.write_off_length} let"
         return f"{self.hw_name} | Pořizovací cena: {self.hw_price} | Délka odpisu: {write_off_text}"
+
+
+class ApiToken(models.Model):
+    """Token of a system calling the JSON API. Only a hash of the key is stored."""
+    name = models.CharField(max_length=100, unique=True)
+    key_hash = models.CharField(max_length=64, unique=True, editable=False)
+    is_active = models.BooleanField(default=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    @staticmethod
+    def hash_key(key):
+        """
+        Hashes the API key for storing and lookup.
+
+        :param key: API key sent by the client.
+        :return: Hex SHA-256 digest of the key.
+        """
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    @classmethod
+    def generate(cls, name):
+        """
+        Creates a token with a new random key.
+
+        :param name: Name of the calling system.
+        :return: Tuple (token, key), the key can't be recovered later.
+        """
+        key = secrets.token_urlsafe(32)
+        token = cls.objects.create(name=name, key_hash=cls.hash_key(key))
+        return token, key
+
+    @classmethod
+    def authenticate(cls, key):
+        """
+        Finds the active token for the key.
+
+        :param key: API key sent by the client.
+        :return: ApiToken, or None if the key is unknown or revoked.
+        """
+        if not key:
+            return None
+        return cls.objects.filter(key_hash=cls.hash_key(key), is_active=True).first()
+
+    def __str__(self):
+        return self.name
+
+
+class BreakEvenThreshold(models.Model):
+    """
+    Repair costs (repair offer + service cost) at which the verdict of the replacement
+    calculation changes, for a hardware model at a device age. See calculation.break_even_batch.
+    """
+    # Bez vlastniho indexu, stroj pokryva unikatni index (hardware, age_months)
+    hardware = models.ForeignKey(Hardware, on_delete=models.CASCADE, related_name="thresholds", db_index=False)
+    age_months = models.PositiveSmallIntegerField()
+    individual_from = models.DecimalField(max_digits=12, decimal_places=2)
+    repair_band_from = models.DecimalField(max_digits=12, decimal_places=2)
+    replacement_from = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            # Unikatni index slouzi i pro vyhledani prahu stroje podle stari
+            models.UniqueConstraint(fields=["hardware", "age_months"], name="unique_threshold_per_age"),
+        ]
+
+    @property
+    def repair_up_to(self):
+        """
+        Returns the highest repair cost at which the repair is worth it, None if it never is.
+
+        :return: Decimal amount or None.
+        """
+        amount = self.individual_from - Decimal("0.01")
+        return amount if amount >= 0 else None
+
+    def __str__(self):
+        return f"{self.hardware_id} | {self.age_months} měsíců | replacement od {self.replacement_from}"
+
+
+class ReplacementDecision(models.Model):
+    """
+    Result of one replacement calculation with its inputs, kept for auditing and reporting.
+
+    Written in batches by decisions.DecisionRecorder, so `created` is set when the calculation
+    is made, not when the row is inserted. The price and write-off length are copied, the
+    hardware may change or be deleted later.
+    """
+    VERDICT_CHOICES = [
+        (calculation.VERDICT_REPLACE, "Replacement proběhne"),
+        (calculation.VERDICT_INDIVIDUAL, "Individuální posouzení"),
+        (calculation.VERDICT_REPAIR, "Replacement neproběhne"),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="replacement_decisions"
+    )
+    api_token = models.ForeignKey(ApiToken, on_delete=models.SET_NULL, null=True, blank=True, related_name="decisions")
+    hardware = models.ForeignKey(Hardware, on_delete=models.SET_NULL, null=True, related_name="decisions")
+    # Brand v dobe vypoctu, souhrny brandu pocitaji rozhodnuti podle nej
+    brand = models.ForeignKey(Brand, on_delete=models.SET_NULL, null=True, related_name="decisions")
+    hw_price = models.IntegerField()
+    write_off_length = models.IntegerField()
+    production_date = models.DateField()
+    age_months = models.PositiveSmallIntegerField()
+    repair_offer = models.DecimalField(max_digits=10, decimal_places=2)
+    service_cost = models.DecimalField(max_digits=10, decimal_places=2)
+    replacement_calculation = models.IntegerField()
+    verdict = models.CharField(max_length=20, choices=VERDICT_CHOICES)
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.hardware_id} | {self.created:%Y-%m-%d %H:%M} | {self.replacement_calculation} ({self.verdict})"
+
+
+class BrandSummary(models.Model):
+    """
+    Aggregates of a brand for the dashboard, maintained incrementally by signals (see summaries).
+
+    The verdict counts are counted from the recorded ReplacementDecisions.
+    """
+    brand = models.OneToOneField(Brand, on_delete=models.CASCADE, primary_key=True, related_name="summary")
+    hardware_count = models.IntegerField(default=0)
+    hw_price_total = models.BigIntegerField(default=0)
+    replace_count = models.IntegerField(default=0)
+    individual_count = models.IntegerField(default=0)
+    repair_count = models.IntegerField(default=0)
+
+    @property
+    def average_hw_price(self):
+        """
+        :return: Average acquisition price of the brand's hardware, None without hardware.
+        """
+        if not self.hardware_count:
+            return None
+        return self.hw_price_total / self.hardware_count
+
+    @property
+    def decision_count(self):
+        return self.replace_count + self.individual_count + self.repair_count
+
+    def __str__(self):
+        return f"{self.brand_id} | {self.hardware_count} strojů | {self.decision_count} rozhodnutí"
+
+
+class BrandWriteOffSummary(models.Model):
+    """Number of a brand's hardware with a write-off length, see BrandSummary."""
+    # Bez vlastniho indexu, brand pokryva unikatni index (brand, write_off_length)
+    brand = models.ForeignKey(Brand, on_delete=models.CASCADE, related_name="write_off_summaries", db_index=False)
+    write_off_length = models.IntegerField()
+    hardware_count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ["brand", "write_off_length"]
+        constraints = [
+            models.UniqueConstraint(fields=["brand", "write_off_length"], name="unique_write_off_summary"),
+        ]
+
+    def __str__(self):
+        return f"{self.brand_id} | {self.write_off_length} let | {self.hardware_count} strojů"
+
+
+class Asset(models.Model):
+    """
+    Physical device of a catalog Hardware model installed in a store.
+
+    The production date belongs to the device, not to the model, so the calculation of
+    a device doesn't need it typed in. For the residual value and the age see valuation.
+    """
+    # Smazat model z katalogu, ktery ma zarizeni v provozu, nejde
+    hardware = models.ForeignKey(Hardware, on_delete=models.PROTECT, related_name="assets")
+    serial_number = models.CharField(max_length=100, unique=True)
+    store = models.CharField(max_length=100)
+    production_date = models.DateField()
+
+    class Meta:
+        indexes = [
+            # Vypis zarizeni prodejny serazeny podle serioveho cisla
+            models.Index(fields=["store", "serial_number"], name="asset_store_serial"),
+        ]
+
+    def __str__(self):
+        return f"{self.serial_number} | {self.store}"
+
+
+class AssetScore(models.Model):
+    """
+    Monthly re-score of an Asset (see rescoring): its age, residual value and the repair
+    costs at which the verdict changes, as of the scored_on date.
+    """
+    asset = models.OneToOneField(Asset, on_delete=models.CASCADE, primary_key=True, related_name="score")
+    scored_on = models.DateField()
+    age_months = models.PositiveSmallIntegerField()
+    residual_value = models.DecimalField(max_digits=12, decimal_places=2)
+    individual_from = models.DecimalField(max_digits=12, decimal_places=2)
+    repair_band_from = models.DecimalField(max_digits=12, decimal_places=2)
+    replacement_from = models.DecimalField(max_digits=12, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.asset_id} | {self.scored_on} | replacement od {self.replacement_from}"
+
+
+class Job(models.Model):
+    """
+    Background job of the queue in jobs, e.g. an import or an export.
+
+    A worker claims the job with a lease (locked_by, locked_until) and renews it with every
+    progress report; a job whose lease expired is claimed again by another worker.
+    """
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Čeká"),
+        (STATUS_RUNNING, "Běží"),
+        (STATUS_DONE, "Hotovo"),
+        (STATUS_FAILED, "Chyba"),
+    ]
+    KIND_LABELS = {
+        "import_hardware": "Import zařízení",
+        "export_hardware": "Export zařízení",
+        "refresh_hardware": "Přepočet prahů a skóre",
+    }
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="jobs"
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    progress_done = models.IntegerField(default=0)
+    progress_total = models.IntegerField(null=True, blank=True)
+    progress_message = models.CharField(max_length=200, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(default=timezone.now)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created"]
+        indexes = [
+            # Vyber dalsi ulohy ke zpracovani
+            models.Index(fields=["status", "run_after"], name="job_queue"),
+        ]
+
+    @property
+    def progress_percent(self):
+        """
+        :return: Progress in percent, None when the total is unknown.
+        """
+        if not self.progress_total:
+            return 100 if self.status == self.STATUS_DONE else None
+        return min(100, round(100 * self.progress_done / self.progress_total))
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+    @property
+    def kind_label(self):
+        return self.KIND_LABELS.get(self.kind, self.kind)
+
+    @property
+    def error_summary(self):
+        """
+        :return: Last line of the error (the exception without the traceback), for the users.
+        """
+        lines = self.error.strip().splitlines()
+        return lines[-1] if lines else ""
+
+    def __str__(self):
+        return f"{self.pk} | {self.kind} | {self.status}"
@@ -0,0 +1,74 @@
+"""
+Refresh of the data derived from hardware prices
+
+The break-even thresholds (thresholds) and the fleet scores (rescoring) of hardware
+depend on its price and write-off length. A single edit rebuilds them right away. A
+bulk write (import batch, re-pricing) only marks the hardware with refresh_pending in
+its own transaction and the rebuild runs after the commit in short transactions of
+CHUNK_SIZE hardware, so the write lock isn't held while millions of rows are computed.
+Writes made in a request (re-pricing in the admin) leave the rebuild to a background
+job instead. Pages show the thresholds and scores of pending hardware as being recomputed.
+"""
+from django.db import transaction
+
+from replacement import rescoring, thresholds
+from replacement.jobs import enqueue
+from replacement.models import Hardware
+
+CHUNK_SIZE = thresholds.DEFAULT_CHUNK_SIZE
+# Pocet ID v jednom UPDATE, SQLite omezuje pocet parametru dotazu
+MARK_CHUNK_SIZE = 900
+
+
+def mark_pending(hardware_ids):
+    """
+    Marks the hardware as waiting for the rebuild of its thresholds and scores.
+
+    :param hardware_ids: Sorted primary keys of the hardware.
+    """
+    for start in range(0, len(hardware_ids), MARK_CHUNK_SIZE):
+        Hardware.objects.filter(pk__in=hardware_ids[start:start + MARK_CHUNK_SIZE]).update(refresh_pending=True)
+
+
+def refresh_hardware(hardware_ids, chunk_size=CHUNK_SIZE, on_progress=None):
+    """
+    Rebuilds the thresholds and the fleet scores of the hardware, one transaction per chunk.
+
+    Every chunk starts with clearing its refresh_pending flags, so its transaction holds the
+    write lock before it reads the prices and a change committed meanwhile can't be missed.
+
+    :param hardware_ids: Primary keys of the hardware.
+    :param chunk_size: Number of hardware rebuilt in one transaction.
+    :param on_progress: Optional callable receiving the number of rebuilt and of all hardware.
+    :return: Tuple (number of threshold rows, number of scored assets).
+    """
+    hardware_ids = sorted(set(hardware_ids))
+    written = scored = 0
+    for start in range(0, len(hardware_ids), chunk_size):
+        chunk = hardware_ids[start:start + chunk_size]
+        with transaction.atomic():
+            Hardware.objects.filter(pk__in=chunk, refresh_pending=True).update(refresh_pending=False)
+            written += thresholds.refresh_thresholds(chunk, chunk_size=chunk_size)
+            scored += rescoring.rescore_hardware(chunk, chunk_size=chunk_size)
+        if on_progress:
+            on_progress(start + len(chunk), len(hardware_ids))
+    return written, scored
+
+
+def schedule_refresh(hardware_ids, background=False):
+    """
+    Marks the hardware as pending and rebuilds it once the current transaction commits.
+
+    :param hardware_ids: Primary keys of the hardware changed by a bulk write.
+    :param background: Queue the rebuild as a refresh_hardware job for run_workers instead;
+        the job is stored in the current transaction, so it exists exactly when the change does.
+    :return: The queued Job with background, otherwise None.
+    """
+    hardware_ids = sorted(set(hardware_ids))
+    if not hardware_ids:
+        return None
+    mark_pending(hardware_ids)
+    if background:
+        return enqueue("refresh_hardware", {"hardware_ids": hardware_ids})
+    transaction.on_commit(lambda: refresh_hardware(hardware_ids))
+    return None
@@ -0,0 +1,143 @@
+"""
+Bulk re-pricing
+
+Applies a percentage or absolute price change to a filtered set of hardware with a
+single UPDATE ... SET hw_price = <expression of hw_price>, in one transaction. The new
+price is computed by the database, no row is loaded or saved one by one.
+
+The listing cache and the brand summaries are refreshed once for the whole set by the
+receivers of hardware_bulk_changed in the same transaction, the break-even thresholds
+and the fleet scores after it (see refresh). The old and new prices for the summaries
+are read together with the selected rows, before the UPDATE.
+"""
+import re
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Greatest
+
+from replacement.models import Hardware
+from replacement.signals import hardware_bulk_changed
+
+PREVIEW_ROWS = 20
+
+
+def name_pattern_regex(pattern):
+    """
+    Converts a name pattern to a regular expression for the iregex lookup.
+
+    :param pattern: Pattern where * matches any text, e.g. "Fritéza*".
+    :return: Regular expression matching the whole name.
+    """
+    return "^" + ".*".join(re.escape(part) for part in pattern.split("*")) + "$"
+
+
+def filter_hardware(queryset=None, brand=None, name_pattern=None, write_off_length=None):
+    """
+    Narrows the hardware to re-price.
+
+    :param queryset: Hardware queryset to narrow, all hardware by default.
+    :param brand: Brand of the hardware.
+    :param name_pattern: Name of the hardware; with * a pattern of the whole name, otherwise a part
+        of the name. Case-insensitive.
+    :param write_off_length: Write-off length of the hardware in years.
+    :return: Queryset of the hardware.
+    """
+    queryset = Hardware.objects.all() if queryset is None else queryset
+    if brand is not None:
+        queryset = queryset.filter(brand_name=brand)
+    if name_pattern:
+        if "*" in name_pattern:
+            queryset = queryset.filter(hw_name__iregex=name_pattern_regex(name_pattern))
+        else:
+            queryset = queryset.filter(hw_name__icontains=name_pattern)
+    if write_off_length is not None:
+        queryset = queryset.filter(write_off_length=write_off_length)
+    return queryset
+
+
+def new_price_expression(percent=None, amount=None):
+    """
+    Expression of the new price, exactly one of percent and amount is given.
+
+    A percentage is computed in whole numbers (basis points) and rounded half up, so the
+    database gives the same result as Decimal arithmetic. A price never gets below zero.
+
+    :param percent: Change in percent with at most two decimal places, e.g. Decimal("7.5"), above -100.
+    :param amount: Change in CZK, e.g. 1500 or -500.
+    :raises ValueError: If the change is invalid.
+    :return: Expression for the update.
+    """
+    if (percent is None) == (amount is None):
+        raise ValueError("Give either a percentage or an amount.")
+    if amount is not None:
+        return Greatest(F("hw_price") + Value(int(amount)), Value(0))
+
+    percent = Decimal(percent)
+    if not percent.is_finite():
+        raise ValueError("The percentage must be a finite number.")
+    basis_points = percent * 100
+    if basis_points != basis_points.to_integral_value() or basis_points <= -10000:
+        raise ValueError("The percentage must be above -100 with at most two decimal places.")
+    # Celociselne deleni, citatel je kladny
+    return (F("hw_price") * Value(10000 + int(basis_points)) + Value(5000)) / Value(10000)
+
+
+def preview(queryset, percent=None, amount=None, limit=PREVIEW_ROWS):
+    """
+    Computes the re-pricing without writing it.
+
+    :param queryset: Hardware to re-price.
+    :param percent: Change in percent, see new_price_expression.
+    :param amount: Change in CZK, see new_price_expression.
+    :param limit: Number of rows returned.
+    :return: Tuple (rows, totals); rows are (pk, brand name, hw_name, hw_price, new price) tuples,
+        totals a dictionary with count, hw_price_total and new_price_total of the whole set.
+    """
+    annotated = queryset.annotate(new_price=new_price_expression(percent, amount))
+    totals = annotated.aggregate(
+        count=Count("pk"), hw_price_total=Sum("hw_price"), new_price_total=Sum("new_price")
+    )
+    rows = list(
+        annotated.order_by("brand_name_id", "hw_name")
+        .values_list("pk", "brand_name__brand_name", "hw_name", "hw_price", "new_price")[:limit]
+    )
+    return rows, totals
+
+
+def reprice(queryset, percent=None, amount=None, background=False):
+    """
+    Changes the prices of the hardware with one UPDATE and refreshes everything derived from them.
+
+    The transaction holds only the UPDATE, the listing versions and the brand summaries;
+    the thresholds and fleet scores are rebuilt after the commit (see refresh).
+
+    :param queryset: Hardware to re-price.
+    :param percent: Change in percent, see new_price_expression.
+    :param amount: Change in CZK, see new_price_expression.
+    :param background: Rebuild the thresholds and scores in a background job instead of
+        right after the commit, for requests.
+    :return: Number of re-priced hardware.
+    """
+    expression = new_price_expression(percent, amount)
+    with transaction.atomic():
+        # Pred zapisem, filtr muze zaviset na cene (hledani podle ceny v adminu)
+        changed = list(
+            queryset.order_by()
+            .annotate(new_price=expression)
+            .values_list("pk", "brand_name_id", "hw_price", "write_off_length", "new_price")
+        )
+        updated = queryset.order_by().update(hw_price=expression)
+        if changed:
+            hardware_bulk_changed.send(
+                sender=Hardware,
+                brand_ids={row[1] for row in changed},
+                hardware_ids={row[0] for row in changed},
+                changes=[
+                    ((brand_id, hw_price, write_off_length), (brand_id, new_price, write_off_length))
+                    for _, brand_id, hw_price, write_off_length, new_price in changed
+                ],
+                background=background,
+            )
+    return updated
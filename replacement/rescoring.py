@@ -0,0 +1,188 @@
+"""
+Fleet re-scoring
+
+The age of a device changes with the calendar, and with it the residual value and the
+repair costs at which the verdict changes. rescore_fleet recomputes them for every
+Asset into AssetScore once a month.
+
+The assets are split into chunks by primary-key range (chunk_ranges). A chunk is
+scored with the batch calculation and written with one upsert, so it can be run in
+any process, in any order and more than once. A run for the same date skips the chunks
+that are already scored, which makes an interrupted run resumable.
+
+When the price or the write-off length of hardware changes, rescore_hardware scores its
+devices again as of the date of their current scores (see refresh).
+"""
+from decimal import Decimal
+
+import django
+from django.apps import apps
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.db.models.constants import OnConflict
+
+from replacement import calculation
+from replacement.models import Asset, AssetScore
+
+DEFAULT_CHUNK_SIZE = 5000
+SCORE_COLUMNS = ["asset_id", "scored_on", "age_months", "residual_value", "individual_from", "repair_band_from",
+                 "replacement_from"]
+
+
+def scorable_assets(scored_on):
+    """
+    :param scored_on: Date of the scoring.
+    :return: Queryset of the assets score_assets can score, see there.
+    """
+    return (
+        Asset.objects.filter(production_date__lte=scored_on)
+        .exclude(hardware__hw_price=0)
+        .exclude(hardware__write_off_length=0)
+    )
+
+
+def chunk_ranges(chunk_size, scored_on=None):
+    """
+    Returns the primary-key ranges of the chunks of assets to score.
+
+    :param chunk_size: Number of primary keys in a chunk.
+    :param scored_on: Date of the run, chunks with all assets already scored for it are
+        skipped; None returns all chunks.
+    :return: List of (first_pk, last_pk) tuples, ascending.
+    """
+    assets = Asset.objects.all()
+    if scored_on is not None:
+        # Zarizeni, ktera ohodnotit nejde, by chunk nechala vzdy nedokonceny
+        assets = scorable_assets(scored_on).exclude(score__scored_on=scored_on)
+    # Cislo chunku spocita databaze, vrati se jen jeden radek na chunk
+    chunks = (
+        assets.annotate(chunk=(F("pk") - 1) / chunk_size)
+        .values_list("chunk", flat=True)
+        .distinct()
+        .order_by("chunk")
+    )
+    return [(chunk * chunk_size + 1, (chunk + 1) * chunk_size) for chunk in chunks]
+
+
+def score_assets(rows, scored_on):
+    """
+    Scores the assets with the batch calculation.
+
+    Assets of hardware without a price or write-off length and assets produced after
+    scored_on can't be scored and are left out.
+
+    :param rows: List of (pk, hw_price, write_off_length, production_date) tuples.
+    :param scored_on: Date the assets are scored for.
+    :return: List of tuples with the values of SCORE_COLUMNS, amounts as Decimals.
+    """
+    rows = [row for row in rows if row[1] and row[2] and row[3] <= scored_on]
+    if not rows:
+        return []
+
+    hw_prices = [hw_price for _, hw_price, _, _ in rows]
+    write_off_lengths = [write_off_length for _, _, write_off_length, _ in rows]
+    ages = calculation.hardware_age_months([production_date for _, _, _, production_date in rows], today=scored_on)
+    costs = calculation.break_even_batch(hw_prices, write_off_lengths, ages)
+
+    # Zustatkova hodnota v halerich, stejne jako v ocenovani databazi
+    residual_values = [
+        calculation.residual_value_hellers(hw_price, write_off_length, age)
+        for hw_price, write_off_length, age in zip(hw_prices, write_off_lengths, ages.tolist())
+    ]
+
+    return [
+        (pk, scored_on, age, Decimal(residual_value).scaleb(-2), Decimal(individual_from).scaleb(-2),
+         Decimal(repair_band_from).scaleb(-2), Decimal(replacement_from).scaleb(-2))
+        for (pk, _, _, _), age, residual_value, individual_from, repair_band_from, replacement_from in zip(
+            rows, ages.tolist(), residual_values, costs.individual_from.tolist(), costs.repair_band_from.tolist(),
+            costs.replacement_from.tolist(),
+        )
+    ]
+
+
+def write_scores(rows, using="default"):
+    """
+    Inserts the scores or replaces the existing ones with a single executemany.
+
+    Like thresholds.insert_threshold_rows, building model instances for bulk_create
+    took most of the time of a chunk.
+
+    :param rows: Tuples from score_assets.
+    :param using: Database alias.
+    """
+    if not rows:
+        return
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    # Upsert v dialektu databaze (ON CONFLICT ... DO UPDATE, ON DUPLICATE KEY UPDATE)
+    fields = [AssetScore._meta.get_field(column.removesuffix("_id")) for column in SCORE_COLUMNS]
+    on_conflict = connection.ops.on_conflict_suffix_sql(fields, OnConflict.UPDATE, SCORE_COLUMNS[1:], SCORE_COLUMNS[:1])
+    sql = "INSERT INTO {} ({}) VALUES ({}) {}".format(
+        quote_name(AssetScore._meta.db_table),
+        ", ".join(quote_name(column) for column in SCORE_COLUMNS),
+        ", ".join(["%s"] * len(SCORE_COLUMNS)),
+        on_conflict,
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def rescore_range(first_pk, last_pk, scored_on):
+    """
+    Scores the assets of a primary-key range and writes the scores with one upsert.
+
+    :param first_pk: First primary key of the range.
+    :param last_pk: Last primary key of the range.
+    :param scored_on: Date the assets are scored for.
+    :return: Number of assets scored.
+    """
+    rows = list(
+        Asset.objects.filter(pk__range=(first_pk, last_pk))
+        .values_list("pk", "hardware__hw_price", "hardware__write_off_length", "production_date")
+    )
+    scores = score_assets(rows, scored_on)
+    with transaction.atomic():
+        write_scores(scores)
+    return len(scores)
+
+
+def rescore_hardware(hardware_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Scores the scored assets of the hardware again, as of the dates of their scores.
+
+    Assets that can't be scored any more (the price or write-off length is now zero)
+    lose their score.
+
+    :param hardware_ids: Primary keys of the changed hardware.
+    :param chunk_size: Number of hardware scored at once.
+    :return: Number of assets scored.
+    """
+    hardware_ids = sorted(set(hardware_ids))
+    scored = 0
+    for start in range(0, len(hardware_ids), chunk_size):
+        chunk = hardware_ids[start:start + chunk_size]
+        assets = Asset.objects.filter(hardware_id__in=chunk, score__isnull=False)
+        with transaction.atomic():
+            for scored_on in assets.values_list("score__scored_on", flat=True).distinct():
+                rows = list(
+                    assets.filter(score__scored_on=scored_on)
+                    .values_list("pk", "hardware__hw_price", "hardware__write_off_length", "production_date")
+                )
+                scores = score_assets(rows, scored_on)
+                write_scores(scores)
+                scored += len(scores)
+            AssetScore.objects.filter(asset__hardware_id__in=chunk).filter(
+                Q(asset__hardware__hw_price=0) | Q(asset__hardware__write_off_length=0)
+            ).delete()
+    return scored
+
+
+def init_worker():
+    """
+    Initializer of the worker processes.
+
+    A forked worker inherits the configured Django and opens its own connection on the
+    first query, a spawned one has to set Django up first.
+    """
+    if not apps.ready:
+        django.setup()
@@ -0,0 +1,242 @@
+"""
+Hardware search
+
+Searches the hardware catalog of all brands through the FTS5 trigram index
+replacement_hardware_search (see migration 0005), which the database keeps in sync
+with replacement_hardware and replacement_brand by triggers.
+
+The trigram index matches any substring of at least three characters, ranked by bm25
+with the hardware name weighted above the brand name. Shorter terms are left out of the
+MATCH and applied as icontains to the rows it found; searches made of short terms only
+and databases without the index fall back to icontains.
+
+`python manage.py rebuild_search_index` refills the index, e.g. when a migration that
+rebuilt one of the tables dropped the triggers.
+"""
+from django.db import connections, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from replacement.models import Hardware
+
+SEARCH_TABLE = "replacement_hardware_search"
+SEARCH_TRIGGERS = (
+    "replacement_hardware_search_insert",
+    "replacement_hardware_search_update",
+    "replacement_hardware_search_delete",
+    "replacement_brand_search_update",
+)
+MIN_TERM_LENGTH = 3
+
+# Vaha sloupcu pro bm25 (hw_name, brand_name)
+RANK_WEIGHTS = (10.0, 1.0)
+
+_index_available = {}
+
+
+def search_terms(text):
+    """
+    Splits the search text into terms.
+
+    :param text: Text entered by the user.
+    :return: List of terms.
+    """
+    return (text or "").split()
+
+
+def match_expression(terms):
+    """
+    Builds an FTS5 MATCH expression requiring all terms, each quoted so that
+    FTS5 operators typed by the user are searched literally.
+
+    :param terms: Search terms.
+    :return: MATCH expression.
+    """
+    return " ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+def like_pattern(term):
+    """
+    Builds a LIKE pattern matching the term anywhere, as the icontains lookup does.
+
+    :param term: Search term.
+    :return: Pattern for LIKE ... ESCAPE '\\'.
+    """
+    return "%{}%".format(term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_"))
+
+
+def index_condition(terms):
+    """
+    Builds the WHERE condition over the search table requiring all terms.
+
+    Terms of at least MIN_TERM_LENGTH characters are searched in the index, shorter
+    ones can't be split into trigrams and filter the matched rows with LIKE.
+
+    :param terms: Search terms, see uses_index.
+    :return: Tuple (SQL condition, parameters).
+    """
+    sql = f"{SEARCH_TABLE} MATCH %s"
+    params = [match_expression(term for term in terms if len(term) >= MIN_TERM_LENGTH)]
+    for term in terms:
+        if len(term) < MIN_TERM_LENGTH:
+            sql += " AND (hw_name LIKE %s ESCAPE '\\' OR brand_name LIKE %s ESCAPE '\\')"
+            params += [like_pattern(term)] * 2
+    return sql, params
+
+
+def index_available(using="default"):
+    """
+    Checks whether the search index exists in the database.
+
+    :param using: Database alias.
+    :return: True if the FTS5 table exists.
+    """
+    connection = connections[using]
+    key = (using, connection.settings_dict["NAME"])
+    if key not in _index_available:
+        _index_available[key] = (
+            connection.vendor == "sqlite" and SEARCH_TABLE in connection.introspection.table_names()
+        )
+    return _index_available[key]
+
+
+def missing_triggers(using="default"):
+    """
+    Lists the triggers keeping the search index in sync that are missing in the database.
+    SQLite drops them whenever a migration rebuilds replacement_hardware or replacement_brand.
+
+    :param using: Database alias.
+    :return: List of the missing trigger names.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        existing = {row[0] for row in cursor.fetchall()}
+    return [name for name in SEARCH_TRIGGERS if name not in existing]
+
+
+def rebuild_index(using="default"):
+    """
+    Refills the search index from the hardware and brand tables and rebuilds its full-text index,
+    which repairs both rows missed while the triggers were missing and a damaged index.
+
+    :param using: Database alias.
+    :return: Number of indexed hardware.
+    """
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, hw_name, brand_name) "
+            "SELECT hardware.id, hardware.hw_name, brand.brand_name "
+            "FROM replacement_hardware AS hardware "
+            "JOIN replacement_brand AS brand ON brand.id = hardware.brand_name_id"
+        )
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES('rebuild')")
+        cursor.execute(f"SELECT count(*) FROM {SEARCH_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def uses_index(terms, using="default"):
+    """
+    Decides whether the terms can be searched in the trigram index, which needs at
+    least one term of MIN_TERM_LENGTH characters.
+
+    :param terms: Search terms.
+    :param using: Database alias.
+    :return: True if the index can answer the search.
+    """
+    return any(len(term) >= MIN_TERM_LENGTH for term in terms) and index_available(using)
+
+
+def matching_ids(terms):
+    """
+    Returns a subquery of the IDs of hardware matching all terms in the index.
+
+    :param terms: Search terms, see uses_index.
+    :return: RawSQL usable in pk__in.
+    """
+    condition, params = index_condition(terms)
+    return RawSQL(f"SELECT rowid FROM {SEARCH_TABLE} WHERE {condition}", params)
+
+
+def icontains_filter(terms):
+    """
+    Builds the fallback filter requiring every term in the hardware or brand name.
+
+    :param terms: Search terms.
+    :return: Q object.
+    """
+    condition = Q()
+    for term in terms:
+        condition &= Q(hw_name__icontains=term) | Q(brand_name__brand_name__icontains=term)
+    return condition
+
+
+class RankedSearchResults:
+    """
+    Hardware matching the search, ordered by rank.
+
+    Supports len() and slicing, so it can be passed to Django's Paginator: every
+    page runs one ranked, LIMITed query against the index and loads its hardware in bulk.
+    """
+    model = Hardware
+
+    def __init__(self, terms, using="default"):
+        self.condition, self.params = index_condition(terms)
+        self.using = using
+        self._count = None
+
+    def count(self):
+        """
+        Returns the number of matching hardware.
+
+        :return: Number of results.
+        """
+        if self._count is None:
+            with connections[self.using].cursor() as cursor:
+                cursor.execute(f"SELECT count(*) FROM {SEARCH_TABLE} WHERE {self.condition}", self.params)
+                self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+
+        start = index.start or 0
+        stop = self.count() if index.stop is None else index.stop
+        if stop <= start:
+            return []
+
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {SEARCH_TABLE} WHERE {self.condition} "
+                f"ORDER BY bm25({SEARCH_TABLE}, %s, %s), rowid LIMIT %s OFFSET %s",
+                [*self.params, *RANK_WEIGHTS, stop - start, start],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+
+        hardware = Hardware.objects.using(self.using).select_related("brand_name").in_bulk(ids)
+        return [hardware[pk] for pk in ids if pk in hardware]
+
+
+def search_hardware(text, using="default"):
+    """
+    Searches the hardware of all brands.
+
+    :param text: Text entered by the user.
+    :param using: Database alias.
+    :return: RankedSearchResults, or a queryset ordered by name for the icontains fallback.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return Hardware.objects.none()
+    if uses_index(terms, using):
+        return RankedSearchResults(terms, using)
+    return (
+        Hardware.objects.using(using)
+        .select_related("brand_name")
+        .filter(icontains_filter(terms))
+        .order_by("hw_name", "pk")
+    )
@@ -0,0 +1,122 @@
+"""
+Test data
+
+Generates brands, hardware, devices in stores and users at a configurable scale for
+load tests and local development. The hardware goes through HardwareImporter, so the
+thresholds, summaries and listing caches are filled the same way as by an import. The
+data is deterministic for a seed and seeding again only adds what is missing.
+"""
+import random
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+
+from replacement.importer import HardwareImporter
+from replacement.models import Asset, Hardware
+
+HARDWARE_KINDS = ["Fritéza", "Grill", "Kávovar", "Lednice", "Mraznice", "Myčka", "Pokladna", "Trouba",
+                  "Výdejník", "Zmrzlinovač"]
+WRITE_OFF_LENGTHS = [3, 5, 7]
+USER_GROUP = "editor"
+ASSET_BATCH_SIZE = 5000
+
+
+def brand_names(count):
+    """
+    :param count: Number of brands.
+    :return: Names of the generated brands.
+    """
+    return [f"Seed brand {number:03d}" for number in range(1, count + 1)]
+
+
+def hardware_rows(count_per_brand, brands, seed):
+    """
+    Generates the hardware in the form of read_hardware_rows.
+
+    :param count_per_brand: Number of hardware of every brand.
+    :param brands: Names of the brands.
+    :param seed: Seed of the random prices and write-off lengths.
+    :return: Generator of (line number, row dictionary) tuples.
+    """
+    rng = random.Random(seed)
+    line_num = 1
+    for brand_name in brands:
+        for number in range(count_per_brand):
+            line_num += 1
+            yield line_num, {
+                "brand_name": brand_name,
+                "hw_name": f"{HARDWARE_KINDS[number % len(HARDWARE_KINDS)]} {number:05d}",
+                "hw_price": str(rng.randrange(5000, 500000, 100)),
+                "write_off_length": str(rng.choice(WRITE_OFF_LENGTHS)),
+            }
+
+
+def seed_hardware(brands, count_per_brand, seed=42, on_progress=None):
+    """
+    Creates the brands and their hardware, or updates the generated hardware to the values of the seed.
+
+    :param brands: Number of brands.
+    :param count_per_brand: Number of hardware of every brand.
+    :param seed: Seed of the generated values.
+    :param on_progress: Optional callable receiving ImportStats after every batch.
+    :return: ImportStats of the import.
+    """
+    importer = HardwareImporter(on_progress=on_progress)
+    return importer.run(hardware_rows(count_per_brand, brand_names(brands), seed))
+
+
+def seed_assets(count_per_hardware, brands, seed=42, stores=50):
+    """
+    Installs devices of the generated hardware in stores; devices that already exist are kept.
+
+    :param count_per_hardware: Number of devices of every hardware.
+    :param brands: Number of brands whose hardware gets devices.
+    :param seed: Seed of the stores and production dates.
+    :param stores: Number of stores.
+    :return: Number of devices created.
+    """
+    rng = random.Random(seed)
+    today = date.today()
+    hardware_ids = list(
+        Hardware.objects.filter(brand_name__brand_name__in=brand_names(brands)).order_by("pk").values_list("pk", flat=True)
+    )
+    existing = Asset.objects.count()
+    batch = []
+    for hardware_id in hardware_ids:
+        for number in range(count_per_hardware):
+            batch.append(Asset(
+                hardware_id=hardware_id,
+                serial_number=f"SEED-{hardware_id}-{number}",
+                store=f"Prodejna {rng.randrange(1, stores + 1):03d}",
+                production_date=today - timedelta(days=rng.randrange(0, 10 * 365)),
+            ))
+        if len(batch) >= ASSET_BATCH_SIZE:
+            Asset.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    Asset.objects.bulk_create(batch, ignore_conflicts=True)
+    return Asset.objects.count() - existing
+
+
+def seed_users(count, password, prefix="loadtest-"):
+    """
+    Creates users in the editor group, users that already exist are kept with their password.
+
+    :param count: Number of users.
+    :param password: Password of the new users.
+    :param prefix: Prefix of the usernames, followed by the number of the user.
+    :return: Usernames of the users.
+    """
+    usernames = [f"{prefix}{number}" for number in range(1, count + 1)]
+    # Hash jednou pro vsechny, PBKDF2 stoji desetiny sekundy
+    hashed = make_password(password)
+    User.objects.bulk_create([User(username=username, password=hashed) for username in usernames],
+                             ignore_conflicts=True)
+    group, _ = Group.objects.get_or_create(name=USER_GROUP)
+    memberships = User.groups.through
+    memberships.objects.bulk_create(
+        [memberships(user_id=pk, group_id=group.pk)
+         for pk in User.objects.filter(username__in=usernames).values_list("pk", flat=True)],
+        ignore_conflicts=True,
+    )
+    return usernames
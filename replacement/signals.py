@@ -0,0 +1,126 @@
+"""
+Signals
+
+Keeps the cached brand listings, the break-even thresholds, the brand summaries and
+the fleet scores in sync with changes of brands, hardware and recorded decisions, and
+removes the files of deleted background jobs.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from replacement.cache import bump_brand_versions
+from replacement import refresh, summaries
+from replacement.jobs import job_file, job_files
+from replacement.models import Brand, Hardware, Job, ReplacementDecision
+
+# Sent after hardware was written in bulk (bulk_create, bulk_update, queryset update),
+# which does not send post_save. Arguments: brand_ids, optionally hardware_ids of the
+# hardware whose price or write-off length changed, changes with the (old, new) values
+# of the written rows for the brand summaries (see summaries.apply_hardware_changes) and
+# background=True to rebuild their thresholds and scores in a background job (see refresh).
+hardware_bulk_changed = Signal()
+
+# Sent by the decision recorder after it wrote a batch with bulk_create, in the same
+# transaction. Arguments: decisions.
+decisions_recorded = Signal()
+
+
+def deleted_with_brand(origin):
+    """
+    Tells whether a deletion cascades from a deleted brand, whose summaries are deleted with it.
+
+    :param origin: The origin argument of post_delete, a model instance or a queryset.
+    :return: True for a brand or a queryset of brands.
+    """
+    return isinstance(origin, Brand) or getattr(origin, "model", None) is Brand
+
+
+@receiver(post_save, sender=Hardware)
+@receiver(post_delete, sender=Hardware)
+def invalidate_hardware_brand(sender, instance, **kwargs):
+    """Invalidates the listing of the hardware's brand, and of its previous brand if it moved."""
+    bump_brand_versions({instance.brand_name_id, instance.loaded_values.get("brand_name_id")})
+
+
+@receiver(post_save, sender=Brand)
+def invalidate_brand(sender, instance, created, **kwargs):
+    """Invalidates the listing of a renamed brand; pages of a deleted brand can't be reached by its slug."""
+    if not created:
+        bump_brand_versions({instance.pk})
+
+
+@receiver(hardware_bulk_changed)
+def invalidate_bulk_changed_brands(sender, brand_ids, **kwargs):
+    """Invalidates the listings of brands changed by a bulk write."""
+    bump_brand_versions(brand_ids)
+
+
+@receiver(post_save, sender=Hardware)
+def refresh_saved_hardware(sender, instance, created, raw=False, **kwargs):
+    """Rebuilds the thresholds and fleet scores of new hardware and of hardware with a changed price or write-off."""
+    if raw:
+        return
+    loaded_values = instance.loaded_values
+    if (
+        created
+        or loaded_values.get("hw_price") != instance.hw_price
+        or loaded_values.get("write_off_length") != instance.write_off_length
+    ):
+        refresh.refresh_hardware([instance.pk])
+
+
+@receiver(hardware_bulk_changed)
+def refresh_bulk_changed_hardware(sender, hardware_ids=(), background=False, **kwargs):
+    """Marks hardware changed by a bulk write as pending, its thresholds and scores are rebuilt after the commit."""
+    refresh.schedule_refresh(hardware_ids, background=background)
+
+
+@receiver(pre_save, sender=Hardware)
+def load_hardware_old_values(sender, instance, raw=False, **kwargs):
+    """Loads the stored values of hardware saved without having been loaded, the receivers compare with them."""
+    if not raw:
+        summaries.load_old_values(instance)
+
+
+@receiver(post_save, sender=Hardware)
+def update_hardware_summaries(sender, instance, created, **kwargs):
+    """Moves the values of saved hardware in the brand summaries."""
+    summaries.hardware_saved(instance, created)
+
+
+@receiver(post_delete, sender=Hardware)
+def remove_hardware_summaries(sender, instance, origin=None, **kwargs):
+    """Removes deleted hardware from the brand summaries."""
+    if not deleted_with_brand(origin):
+        summaries.hardware_deleted(instance)
+
+
+@receiver(hardware_bulk_changed)
+def update_bulk_changed_summaries(sender, changes=(), **kwargs):
+    """Adds the value changes of hardware written in bulk to the brand summaries."""
+    summaries.apply_hardware_changes(changes)
+
+
+@receiver(decisions_recorded)
+def add_recorded_decisions(sender, decisions, **kwargs):
+    """Adds written decisions to the verdict counts of the brand summaries."""
+    summaries.add_decisions(decisions)
+
+
+@receiver(post_delete, sender=ReplacementDecision)
+def remove_decision(sender, instance, **kwargs):
+    """Removes a deleted decision from the verdict counts of the brand summaries."""
+    summaries.add_decisions([instance], sign=-1)
+
+
+@receiver(post_delete, sender=Job)
+def remove_job_files(sender, instance, **kwargs):
+    """Removes the uploaded and produced files of a deleted job once the deletion is committed."""
+    paths = [job_file(name) for name in job_files(instance)]
+
+    def remove():
+        for path in paths:
+            path.unlink(missing_ok=True)
+
+    transaction.on_commit(remove)
@@ -0,0 +1,318 @@
+"""
+Brand summaries
+
+BrandSummary and BrandWriteOffSummary hold the per-brand aggregates of the dashboard:
+the hardware count, the total acquisition price, the distribution of the write-off
+length and the verdict counts of the recorded decisions. Instead of a GROUP BY over
+the whole tables on every dashboard hit they are adjusted by signals:
+
+- a saved or deleted Hardware moves its own values in or out of the brand's totals,
+- hardware written in bulk (importer, re-pricing) sends the old and new values of its
+  rows and their differences are added per brand with one UPDATE each,
+- written and deleted ReplacementDecisions adjust the verdict counts.
+
+No change rescans the hardware of a brand. rebuild_summaries recomputes everything
+from scratch for the rebuild_brand_summaries command and compare_summaries lists where
+the stored values differ from the recomputed ones.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from replacement import calculation
+from replacement.models import Brand, BrandSummary, BrandWriteOffSummary, Hardware, ReplacementDecision
+
+# Sloupec BrandSummary s poctem rozhodnuti podle verdiktu
+VERDICT_FIELDS = {
+    calculation.VERDICT_REPLACE: "replace_count",
+    calculation.VERDICT_INDIVIDUAL: "individual_count",
+    calculation.VERDICT_REPAIR: "repair_count",
+}
+HARDWARE_FIELDS = ["hardware_count", "hw_price_total"]
+SUMMARY_FIELDS = HARDWARE_FIELDS + list(VERDICT_FIELDS.values())
+
+
+# ***********************************
+# Incremental updates
+# ***********************************
+
+
+def adjust_brand(brand_id, **deltas):
+    """
+    Adds the deltas to the brand's summary in the database, creating the summary if needed.
+
+    :param brand_id: Primary key of the brand.
+    :param deltas: Field names of BrandSummary and the values to add.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if brand_id is None or not deltas:
+        return
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    if not BrandSummary.objects.filter(brand_id=brand_id).update(**changes):
+        BrandSummary.objects.get_or_create(brand_id=brand_id)
+        BrandSummary.objects.filter(brand_id=brand_id).update(**changes)
+
+
+def adjust_write_off(brand_id, write_off_length, delta):
+    """
+    Adds the delta to the number of the brand's hardware with the write-off length.
+
+    :param brand_id: Primary key of the brand.
+    :param write_off_length: Write-off length in years.
+    :param delta: Number of hardware to add, negative to remove.
+    """
+    if brand_id is None or not delta:
+        return
+    rows = BrandWriteOffSummary.objects.filter(brand_id=brand_id, write_off_length=write_off_length)
+    if not rows.update(hardware_count=F("hardware_count") + delta):
+        BrandWriteOffSummary.objects.get_or_create(brand_id=brand_id, write_off_length=write_off_length)
+        rows.update(hardware_count=F("hardware_count") + delta)
+
+
+def add_hardware(brand_id, hw_price, write_off_length, sign=1):
+    """
+    Adds one hardware to the brand's summaries, or removes it with sign=-1.
+
+    :param brand_id: Primary key of the brand.
+    :param hw_price: Acquisition price of the hardware.
+    :param write_off_length: Write-off length of the hardware.
+    :param sign: 1 to add, -1 to remove.
+    """
+    adjust_brand(brand_id, hardware_count=sign, hw_price_total=sign * (hw_price or 0))
+    adjust_write_off(brand_id, write_off_length, sign)
+
+
+def apply_hardware_changes(changes):
+    """
+    Adds the value changes of hardware written in bulk to the summaries.
+
+    The changes are summed per brand and per write-off length first, so a batch costs one
+    UPDATE per touched brand and write-off length, whatever the number of its rows.
+
+    :param changes: Iterable of (old, new) tuples, each a (brand_id, hw_price, write_off_length)
+        tuple, old is None for created hardware and new is None for deleted hardware.
+    """
+    brand_deltas = defaultdict(Counter)
+    write_off_deltas = Counter()
+    for old, new in changes:
+        for values, sign in ((old, -1), (new, 1)):
+            if values is None:
+                continue
+            brand_id, hw_price, write_off_length = values
+            brand_deltas[brand_id]["hardware_count"] += sign
+            brand_deltas[brand_id]["hw_price_total"] += sign * (hw_price or 0)
+            write_off_deltas[brand_id, write_off_length] += sign
+
+    for brand_id, deltas in brand_deltas.items():
+        adjust_brand(brand_id, **deltas)
+    for (brand_id, write_off_length), delta in write_off_deltas.items():
+        adjust_write_off(brand_id, write_off_length, delta)
+
+
+def load_old_values(hardware):
+    """
+    Loads the stored values of hardware saved without having been loaded from the database,
+    so its change can be applied to the summaries as a difference.
+
+    :param hardware: Hardware instance about to be saved.
+    """
+    fields = ("brand_name_id", "hw_price", "write_off_length")
+    if hardware.pk is None or all(name in hardware.loaded_values for name in fields):
+        return
+    stored = Hardware.objects.filter(pk=hardware.pk).values(*fields).first()
+    if stored is not None:
+        hardware._loaded_values = {**hardware.loaded_values, **stored}
+
+
+def hardware_saved(hardware, created):
+    """
+    Moves the saved hardware's values in the summaries.
+
+    :param hardware: Saved Hardware instance, with the old values loaded, see load_old_values.
+    :param created: Whether the hardware was created.
+    """
+    old = hardware.loaded_values
+    new = (hardware.brand_name_id, hardware.hw_price, hardware.write_off_length)
+    if created or "brand_name_id" not in old:
+        add_hardware(*new)
+    elif (old["brand_name_id"], old["hw_price"], old["write_off_length"]) != new:
+        add_hardware(old["brand_name_id"], old["hw_price"], old["write_off_length"], sign=-1)
+        add_hardware(*new)
+
+
+def hardware_deleted(hardware):
+    """
+    Removes the deleted hardware's values from the summaries.
+
+    :param hardware: Deleted Hardware instance.
+    """
+    values = {
+        "brand_name_id": hardware.brand_name_id,
+        "hw_price": hardware.hw_price,
+        "write_off_length": hardware.write_off_length,
+        **hardware.loaded_values,
+    }
+    add_hardware(values["brand_name_id"], values["hw_price"], values["write_off_length"], sign=-1)
+
+
+def add_decisions(decisions, sign=1):
+    """
+    Adds the decisions to the verdict counts of their brands, or removes them with sign=-1.
+
+    :param decisions: ReplacementDecision instances.
+    :param sign: 1 to add, -1 to remove.
+    """
+    counts = defaultdict(Counter)
+    for decision in decisions:
+        field = VERDICT_FIELDS.get(decision.verdict)
+        if decision.brand_id is not None and field:
+            counts[decision.brand_id][field] += sign
+    for brand_id, deltas in counts.items():
+        adjust_brand(brand_id, **deltas)
+
+
+# ***********************************
+# Recomputation and check
+# ***********************************
+
+
+def empty_summary():
+    """
+    :return: Summary of a brand without hardware and decisions.
+    """
+    summary = dict.fromkeys(SUMMARY_FIELDS, 0)
+    summary["write_offs"] = {}
+    return summary
+
+
+def computed_hardware_summaries(brand_ids=None):
+    """
+    Aggregates the hardware of the brands with GROUP BY.
+
+    :param brand_ids: Primary keys of the brands, all brands by default.
+    :return: Dictionary brand ID -> summary in the format of computed_summaries, with zero verdict counts.
+    """
+    brands = Brand.objects.all() if brand_ids is None else Brand.objects.filter(pk__in=brand_ids)
+    hardware = Hardware.objects.all() if brand_ids is None else Hardware.objects.filter(brand_name__in=brand_ids)
+
+    summaries = {brand_id: empty_summary() for brand_id in brands.values_list("pk", flat=True)}
+    rows = hardware.values("brand_name", "write_off_length").annotate(count=Count("pk"), total=Sum("hw_price"))
+    for row in rows.order_by():
+        summary = summaries[row["brand_name"]]
+        summary["hardware_count"] += row["count"]
+        summary["hw_price_total"] += row["total"] or 0
+        summary["write_offs"][row["write_off_length"]] = row["count"]
+    return summaries
+
+
+def computed_summaries(brand_ids=None):
+    """
+    Recomputes the summaries of the brands from Hardware and ReplacementDecision.
+
+    :param brand_ids: Primary keys of the brands, all brands by default.
+    :return: Dictionary brand ID -> summary with the fields of SUMMARY_FIELDS and "write_offs".
+    """
+    summaries = computed_hardware_summaries(brand_ids)
+
+    decisions = ReplacementDecision.objects.filter(brand__isnull=False)
+    if brand_ids is not None:
+        decisions = decisions.filter(brand__in=brand_ids)
+    for brand_id, verdict, count in decisions.values_list("brand", "verdict").annotate(Count("pk")).order_by():
+        if verdict in VERDICT_FIELDS:
+            summaries.setdefault(brand_id, empty_summary())[VERDICT_FIELDS[verdict]] += count
+    return summaries
+
+
+def stored_summaries(brand_ids=None):
+    """
+    Reads the incrementally maintained summaries.
+
+    :param brand_ids: Primary keys of the brands, all brands by default.
+    :return: Dictionary in the format of computed_summaries, write-off lengths without hardware are left out.
+    """
+    rows = BrandSummary.objects.all()
+    write_offs = BrandWriteOffSummary.objects.filter(hardware_count__gt=0)
+    if brand_ids is not None:
+        rows = rows.filter(brand__in=brand_ids)
+        write_offs = write_offs.filter(brand__in=brand_ids)
+
+    summaries = {}
+    for row in rows.values("brand", *SUMMARY_FIELDS):
+        brand_id = row.pop("brand")
+        summaries[brand_id] = {**row, "write_offs": {}}
+    for brand_id, write_off_length, count in write_offs.values_list("brand", "write_off_length", "hardware_count"):
+        summaries.setdefault(brand_id, empty_summary())["write_offs"][write_off_length] = count
+    return summaries
+
+
+def write_summaries(summaries, fields):
+    """
+    Stores the given fields of the summaries, replacing the stored values.
+
+    :param summaries: Dictionary in the format of computed_summaries.
+    :param fields: Fields of BrandSummary to store; the write-off distribution is stored
+        together with the hardware fields.
+    """
+    existing = set(BrandSummary.objects.filter(brand__in=summaries).values_list("brand", flat=True))
+    BrandSummary.objects.bulk_create(
+        BrandSummary(brand_id=brand_id, **{field: summary[field] for field in fields})
+        for brand_id, summary in summaries.items() if brand_id not in existing
+    )
+    BrandSummary.objects.bulk_update(
+        [
+            BrandSummary(brand_id=brand_id, **{field: summary[field] for field in fields})
+            for brand_id, summary in summaries.items() if brand_id in existing
+        ],
+        fields,
+        batch_size=500,
+    )
+
+    if "hardware_count" in fields:
+        BrandWriteOffSummary.objects.filter(brand__in=summaries).delete()
+        BrandWriteOffSummary.objects.bulk_create(
+            BrandWriteOffSummary(brand_id=brand_id, write_off_length=write_off_length, hardware_count=count)
+            for brand_id, summary in summaries.items()
+            for write_off_length, count in summary["write_offs"].items()
+        )
+
+
+def rebuild_summaries(brand_ids=None):
+    """
+    Recomputes all summaries from scratch.
+
+    :param brand_ids: Primary keys of the brands, all brands by default.
+    :return: Number of brands rebuilt.
+    """
+    with transaction.atomic():
+        summaries = computed_summaries(brand_ids)
+        write_summaries(summaries, SUMMARY_FIELDS)
+        if brand_ids is None:
+            BrandSummary.objects.exclude(brand__in=summaries).delete()
+    return len(summaries)
+
+
+def compare_summaries(brand_ids=None):
+    """
+    Compares the stored summaries with freshly recomputed ones.
+
+    :param brand_ids: Primary keys of the brands, all brands by default.
+    :return: List of (brand ID, field, stored value, computed value) tuples, empty when consistent.
+        Write-off lengths are reported as fields "write_off_length=<n>".
+    """
+    computed = computed_summaries(brand_ids)
+    stored = stored_summaries(brand_ids)
+
+    differences = []
+    for brand_id in sorted(computed.keys() | stored.keys()):
+        expected = computed.get(brand_id, empty_summary())
+        actual = stored.get(brand_id, empty_summary())
+        for field in SUMMARY_FIELDS:
+            if actual[field] != expected[field]:
+                differences.append((brand_id, field, actual[field], expected[field]))
+        for write_off_length in sorted(expected["write_offs"].keys() | actual["write_offs"].keys()):
+            actual_count = actual["write_offs"].get(write_off_length, 0)
+            expected_count = expected["write_offs"].get(write_off_length, 0)
+            if actual_count != expected_count:
+                differences.append((brand_id, f"write_off_length={write_off_length}", actual_count, expected_count))
+    return differences
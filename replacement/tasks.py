@@ -0,0 +1,161 @@
+"""
+Background tasks
+
+Handlers of the background jobs, see jobs. Registered when the app is ready.
+
+- import_hardware imports an uploaded CSV file with HardwareImporter.
+- export_hardware writes the CSV or XLSX export of a brand or of all brands to a file
+  offered for download on the jobs page.
+- refresh_hardware rebuilds the thresholds and fleet scores of re-priced hardware.
+"""
+import os
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+
+from replacement import export, refresh
+from replacement.forms import ExportScenarioForm
+from replacement.importer import HardwareImporter, read_hardware_rows
+from replacement.jobs import job_file, job_handler
+from replacement.models import Brand
+
+MAX_WARNINGS = 50
+
+
+def count_lines(path, encoding):
+    """
+    :param path: Path of a text file.
+    :param encoding: Encoding of the file.
+    :return: Number of lines of the file.
+    """
+    with open(path, encoding=encoding, newline="") as file:
+        return sum(1 for _ in file)
+
+
+@job_handler("import_hardware")
+def import_hardware(job, progress):
+    """
+    Imports the hardware from the uploaded CSV file.
+
+    Payload: file (name in REPLACEMENT_JOBS_DIR), delete_missing, encoding and delimiter.
+    A repeated attempt imports the same file again, unchanged rows are skipped.
+
+    :param job: The Job.
+    :param progress: Progress of the job.
+    :return: Counters of the import and the first warnings.
+    """
+    payload = job.payload
+    path = job_file(payload["file"])
+    encoding = payload.get("encoding", "utf-8-sig")
+    # Bez hlavicky
+    total = max(count_lines(path, encoding) - 1, 0)
+    progress(0, total, "Import zařízení")
+
+    warnings = []
+
+    def warn(message):
+        if len(warnings) < MAX_WARNINGS:
+            warnings.append(message)
+
+    importer = HardwareImporter(
+        delete_missing=payload.get("delete_missing", False),
+        on_warning=warn,
+        on_progress=lambda stats: progress(stats.rows, message="Import zařízení"),
+    )
+    with open(path, encoding=encoding, newline="") as csvfile:
+        stats = importer.run(read_hardware_rows(csvfile, delimiter=payload.get("delimiter", ",")))
+    progress(stats.rows, stats.rows, "Hotovo")
+
+    return {
+        "rows": stats.rows,
+        "created": stats.created,
+        "updated": stats.updated,
+        "unchanged": stats.unchanged,
+        "skipped": stats.skipped,
+        "missing": len(stats.missing),
+        "deleted": stats.deleted,
+        "protected": stats.protected,
+        "warnings": warnings,
+    }
+
+
+@job_handler("export_hardware")
+def export_hardware(job, progress):
+    """
+    Writes the export of a brand or of all brands to a file.
+
+    Payload: format ("csv" or "xlsx"), brand (slug, None for all brands) and scenario
+    (the query parameters of HardwareExportView). The file is written under a temporary
+    name and renamed when complete, so a failed attempt never leaves a partial download.
+
+    :param job: The Job.
+    :param progress: Progress of the job.
+    :raises ValueError: If the scenario is invalid.
+    :return: Name of the file, the file name for the download and the number of rows.
+    """
+    payload = job.payload
+    file_format = payload["format"]
+    form = ExportScenarioForm(payload.get("scenario") or {})
+    if not form.is_valid():
+        raise ValueError(form.errors.as_text())
+    brand = Brand.objects.get(slug=payload["brand"]) if payload.get("brand") else None
+
+    queryset, name = export.export_queryset(brand)
+    total = queryset.count()
+    progress(0, total, "Export zařízení")
+
+    def reported(chunks):
+        done = 0
+        for chunk in chunks:
+            yield chunk
+            done += len(chunk)
+            progress(done, message="Export zařízení")
+
+    scenario = form.scenario()
+    chunks = reported(
+        export.export_chunks(queryset, scenario, chunk_size=settings.REPLACEMENT_EXPORT_CHUNK_SIZE, detached=True)
+    )
+    header = export.header_for(scenario)
+    if file_format == "csv":
+        content = (part.encode() for part in export.stream_csv(chunks, header))
+    else:
+        content = export.stream_xlsx(chunks, header)
+
+    filename = f"export-{job.pk}-{uuid.uuid4().hex}.{file_format}"
+    path = job_file(filename)
+    partial = path.with_suffix(".part")
+    try:
+        with open(partial, "wb") as file:
+            for part in content:
+                file.write(part)
+        os.replace(partial, path)
+    finally:
+        partial.unlink(missing_ok=True)
+
+    return {
+        "file": filename,
+        "filename": export.export_filename(name, file_format, datetime.today().date()),
+        "format": file_format,
+        "rows": total,
+    }
+
+
+@job_handler("refresh_hardware")
+def refresh_hardware(job, progress):
+    """
+    Rebuilds the thresholds and fleet scores of hardware changed by a bulk write.
+
+    Payload: hardware_ids. Every chunk is committed on its own, a repeated attempt
+    rebuilds all of them again.
+
+    :param job: The Job.
+    :param progress: Progress of the job.
+    :return: Number of hardware, threshold rows and scored devices.
+    """
+    hardware_ids = job.payload["hardware_ids"]
+    progress(0, len(hardware_ids), "Přepočet prahů a skóre")
+    written, scored = refresh.refresh_hardware(
+        hardware_ids, on_progress=lambda done, total: progress(done, message="Přepočet prahů a skóre")
+    )
+    return {"hardware": len(hardware_ids), "thresholds": written, "scores": scored}
@@ -1,3 +1,1624 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import random
+import tempfile
+import time
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+from xml.etree import ElementTree
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, Group, User
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import AsyncClient, LiveServerTestCase, RequestFactory, SimpleTestCase, TestCase, \
+    TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from project import replicas
+from project.metrics import MetricsRegistry, install_query_timer, time_query
+from replacement import calculation, decisions, export, jobs, loadtest, repricing, search, seeding, summaries, \
+    valuation
+from replacement.cache import acached_brand_listing, cached_brand_listing
+from replacement.decisions import DecisionRecorder
+from replacement.forms import ReplacementForm
+from replacement.importer import HardwareImporter, ImportStats, read_hardware_rows
+from replacement.memo import ScoreMemo
+from replacement.models import ApiToken, Asset, AssetScore, Brand, BrandSummary, BreakEvenThreshold, Hardware, Job, \
+    ReplacementDecision
+from replacement.signals import hardware_bulk_changed
+from replacement.thresholds import detail_ages, refresh_thresholds, thresholds_for
+from replacement.utils import KeysetPaginator, get_group_names, is_member_of_group
+
+
+class BrandListingQueryPlanTests(TestCase):
+    """Checks that the brand listing query is served by the (brand, hw_name) index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.brand = Brand.objects.create(brand_name="KFC")
+        other = Brand.objects.create(brand_name="Starbucks")
+        Hardware.objects.bulk_create(
+            Hardware(brand_name=brand, hw_name=f"Stroj {i:04d}", hw_price=10000 + i, write_off_length=5)
+            for brand in (cls.brand, other)
+            for i in range(200)
+        )
+
+    def query_plans(self, **page_kwargs):
+        """
+        Runs EXPLAIN QUERY PLAN for the queries of one listing page.
+
+        :param page_kwargs: Cursor arguments passed to KeysetPaginator.page.
+        :return: List of query plan details, one string per query.
+        """
+        paginator = KeysetPaginator(Hardware.objects.filter(brand_name=self.brand), 50)
+        with CaptureQueriesContext(connection) as queries:
+            paginator.page(**page_kwargs)
+
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                cursor.execute("EXPLAIN QUERY PLAN " + query["sql"])
+                plans.append(" | ".join(row[-1] for row in cursor.fetchall()))
+        return plans
+
+    def assert_uses_index(self, plan):
+        self.assertIn("USING", plan)
+        self.assertIn("INDEX", plan)
+        self.assertNotIn("SCAN replacement_hardware", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_first_page_uses_index(self):
+        for plan in self.query_plans():
+            self.assert_uses_index(plan)
+
+    def test_keyset_pages_seek_the_index(self):
+        first_page = KeysetPaginator(Hardware.objects.filter(brand_name=self.brand), 50).page()
+        for plan in self.query_plans(after=first_page.next_cursor) + self.query_plans(before=first_page.next_cursor):
+            self.assert_uses_index(plan)
+            self.assertIn("hw_name", plan)
+
+    def test_cached_rows_follow_changes(self):
+        self.client.force_login(User.objects.create_user("technik", password="heslo"))
+        url = reverse("replacement:brand-list", args=[self.brand.slug])
+        self.assertContains(self.client.get(url), "Stroj 0001")
+
+        hardware = Hardware.objects.get(brand_name=self.brand, hw_name="Stroj 0001")
+        with self.captureOnCommitCallbacks(execute=True):
+            hardware.hw_name = "Stroj 0001 upraveny"
+            hardware.save()
+        self.assertContains(self.client.get(url), "Stroj 0001 upraveny")
+
+    def test_changes_from_other_processes_invalidate_the_listing(self):
+        self.client.force_login(User.objects.create_user("technik", password="heslo"))
+        url = reverse("replacement:brand-list", args=[self.brand.slug])
+        self.assertContains(self.client.get(url), "<td>10001</td>")
+
+        # Import a precenovani bezi v jinem procesu s vlastni cache
+        with mock.patch("replacement.cache.cache", LocMemCache("other-process", {})):
+            HardwareImporter().run([
+                (2, {"brand_name": "KFC", "hw_name": "Stroj 0001", "hw_price": "9999777", "write_off_length": "5"}),
+            ])
+            repricing.reprice(Hardware.objects.filter(brand_name=self.brand, hw_name="Stroj 0002"), amount=9989776)
+        response = self.client.get(url)
+        self.assertContains(response, "<td>9999777</td>")
+        self.assertContains(response, "<td>9999778</td>")
+
+    def test_stale_brand_instance_keeps_the_version(self):
+        stale = Brand.objects.get(pk=self.brand.pk)
+        hardware_bulk_changed.send(sender=Hardware, brand_ids={self.brand.pk})
+        stale.brand_name = "KFC Česko"
+        stale.save()
+        self.brand.refresh_from_db()
+        self.assertEqual(self.brand.brand_name, "KFC Česko")
+        self.assertGreater(self.brand.cache_version, stale.cache_version)
+
+    def test_hardware_is_unique_per_brand(self):
+        with self.assertRaises(IntegrityError):
+            Hardware.objects.create(brand_name=self.brand, hw_name="Stroj 0000", hw_price=1, write_off_length=3)
+
+    def test_brand_slugs_are_unique(self):
+        Brand.objects.create(brand_name="NewBrand")
+        HardwareImporter().run([(2, {"brand_name": "newbrand!", "hw_name": "Grill", "hw_price": "1", "write_off_length": "3"})])
+        Brand.objects.create(brand_name="New brand")
+        self.assertEqual(
+            list(Brand.objects.filter(brand_name__icontains="new").order_by("pk").values_list("slug", flat=True)),
+            ["newbrand", "newbrand-2", "new-brand"],
+        )
+
+        self.assertEqual(Brand.objects.create(brand_name="x" * 100).slug, "x" * 100)
+        self.assertEqual(Brand.objects.create(brand_name="X" * 100).slug, "x" * 98 + "-2")
+        self.assertEqual(Brand.objects.create(brand_name="!!!").slug, "brand")
+
+    def test_brand_name_is_unique(self):
+        with self.assertRaises(IntegrityError):
+            Brand.objects.create(brand_name="KFC", slug="kfc-2")
+
+
+class MergeDuplicatesMigrationTests(TransactionTestCase):
+    """Checks that migration 0004 merges the duplicates instead of dropping the newer values."""
+
+    def test_duplicates_are_merged_into_the_oldest_row(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate([("replacement", "0003_brand_slug")])
+        old_apps = executor.loader.project_state([("replacement", "0003_brand_slug")]).apps
+        OldBrand = old_apps.get_model("replacement", "Brand")
+        OldHardware = old_apps.get_model("replacement", "Hardware")
+        kfc = OldBrand.objects.create(brand_name="KFC", slug="kfc")
+        kfc_copy = OldBrand.objects.create(brand_name="KFC", slug="kfc-2")
+        kept = OldHardware.objects.create(brand_name=kfc, hw_name="Fritéza", hw_price=100, write_off_length=5)
+        older = OldHardware.objects.create(brand_name=kfc, hw_name="Fritéza", hw_price=200, write_off_length=7)
+        newest = OldHardware.objects.create(brand_name=kfc_copy, hw_name="Fritéza", hw_price=300, write_off_length=3)
+        grill = OldHardware.objects.create(brand_name=kfc, hw_name="Grill", hw_price=50, write_off_length=4)
+
+        executor = MigrationExecutor(connection)
+        with mock.patch("sys.stdout", new_callable=io.StringIO) as output:
+            executor.migrate(executor.loader.graph.leaf_nodes())
+
+        self.assertEqual(list(Brand.objects.values_list("pk", flat=True)), [kfc.pk])
+        self.assertEqual(
+            list(Hardware.objects.order_by("pk").values_list("pk", "hw_price", "write_off_length")),
+            [(kept.pk, 300, 3), (grill.pk, 50, 4)],
+        )
+        self.assertIn(f"Brand {kfc_copy.pk} merged into {kfc.pk}", output.getvalue())
+        self.assertIn(f"Hardware {older.pk} merged into {kept.pk}", output.getvalue())
+        self.assertIn(f"Hardware {newest.pk} merged into {kept.pk}", output.getvalue())
+
+
+class ListingCacheKeyTests(SimpleTestCase):
+    """Checks that the sync and async listing cache helpers share their entries."""
+
+    def setUp(self):
+        patcher = mock.patch("replacement.cache.cache", LocMemCache("listing-keys", {}))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_sync_and_async_helpers_share_the_key(self):
+        brand = Brand(pk=7, brand_name="KFC", cache_version=3)
+
+        async def fail():
+            raise AssertionError("Stránka měla být v cache.")
+
+        await sync_to_async(cached_brand_listing)(brand, (50, "", ""), lambda: "sync")
+        self.assertEqual(await acached_brand_listing(brand, (50, "", ""), fail), "sync")
+
+        async def build():
+            return "async"
+
+        self.assertEqual(await acached_brand_listing(brand, (50, "7", ""), build), "async")
+        self.assertEqual(await sync_to_async(cached_brand_listing)(brand, (50, "7", ""), fail), "async")
+
+        brand.cache_version += 1
+        self.assertEqual(await acached_brand_listing(brand, (50, "", ""), build), "async")
+
+
+class ReplacementCalculationGoldenTests(SimpleTestCase):
+    """Pins the exact outputs of the replacement equation, including the int truncation."""
+
+    today = date(2025, 3, 16)
+
+    # (hw_price, write_off_length, production date, repair_offer, service_cost, age, result, verdict)
+    cases = [
+        (100000, 5, date(2025, 3, 16), "0", "0", 0, -120, calculation.VERDICT_REPAIR),
+        (100000, 3, date(2021, 3, 16), "29900", "0", 48, 9, calculation.VERDICT_INDIVIDUAL),
+        (100000, 3, date(2021, 3, 16), "25000", "5000", 48, 9, calculation.VERDICT_INDIVIDUAL),
+        # 10.499 is truncated to 10, which is not above the threshold
+        (100000, 3, date(2021, 3, 16), "30500", "0", 48, 10, calculation.VERDICT_REPAIR),
+        (100000, 3, date(2021, 3, 16), "31001", "0", 48, 11, calculation.VERDICT_REPLACE),
+        # -9.901 is truncated towards zero to -9
+        (100000, 3, date(2021, 3, 16), "10100", "0", 48, -9, calculation.VERDICT_INDIVIDUAL),
+        (100000, 3, date(2021, 3, 16), "9500", "0", 48, -10, calculation.VERDICT_REPAIR),
+        (100000, 3, date(2021, 3, 16), "9000", "0", 48, -11, calculation.VERDICT_REPAIR),
+        (200000, 5, date(2017, 9, 16), "40000", "0", 90, 9, calculation.VERDICT_INDIVIDUAL),
+        (585000, 7, date(2020, 1, 1), "150000.50", "25000.25", 62, 32, calculation.VERDICT_REPLACE),
+    ]
+
+    def test_scalar_api(self):
+        for hw_price, write_off_length, produced, repair_offer, service_cost, age, result, verdict in self.cases:
+            with self.subTest(hw_price=hw_price, produced=produced, repair_offer=repair_offer):
+                self.assertEqual(calculation.age_in_months(produced, self.today), age)
+                value = calculation.score(hw_price, write_off_length, age, Decimal(repair_offer), Decimal(service_cost))
+                self.assertEqual(value, result)
+                self.assertEqual(calculation.verdict_for(value), verdict)
+
+    def test_messages(self):
+        self.assertEqual(
+            calculation.message_for(10),
+            "Replacement neproběhne, zařízení je buďto nové nebo je oprava výhodná. Výsledek rovnice je 10.",
+        )
+        self.assertEqual(calculation.message_for(-9), "Je to na individuálním posouzení, výsledek rovnice je -9.")
+        self.assertEqual(calculation.message_for(11), "Replacement proběhne, oprava je nákladná. Výsledek rovnice je 11.")
+
+    def test_age_at_the_end_of_month(self):
+        # relativedelta clamps 31 January + 1 month to the last day of February
+        self.assertEqual(calculation.age_in_months(date(2024, 1, 31), date(2024, 2, 29)), 1)
+        self.assertEqual(calculation.age_in_months(date(2024, 1, 31), date(2024, 2, 28)), 0)
+        self.assertEqual(calculation.age_in_months(date(2023, 1, 31), date(2023, 2, 28)), 1)
+        self.assertEqual(list(calculation.hardware_age_months([date(2024, 1, 31)], date(2024, 2, 29))), [1])
+        self.assertEqual(list(calculation.hardware_age_months([date(2024, 1, 31)], date(2024, 2, 28))), [0])
+
+    def test_future_production_date(self):
+        with self.assertRaises(ValueError):
+            calculation.age_in_months(date(2025, 3, 17), self.today)
+        with self.assertRaises(ValueError):
+            calculation.hardware_age_months([date(2025, 3, 17)], self.today)
+
+    def test_form_uses_the_calculation(self):
+        hardware = Hardware(hw_price=100000, write_off_length=3)
+        form = ReplacementForm(data={"repair_offer": "30500", "service_cost": "0", "hw_production_date": "2020-01-01"})
+        self.assertTrue(form.is_valid())
+        age = calculation.age_in_months(date(2020, 1, 1))
+        expected = calculation.score(100000, 3, age, Decimal("30500"), Decimal("0"))
+        self.assertEqual(form.calculate(hardware), (expected, calculation.message_for(expected)))
+
+
+class BatchCalculationEquivalenceTests(SimpleTestCase):
+    """Checks that the batch API gives the same results as the scalar API row by row."""
+
+    def test_golden_cases(self):
+        cases = ReplacementCalculationGoldenTests.cases
+        hw_prices, write_off_lengths, produced, repair_offers, service_costs, ages, results, verdicts = zip(*cases)
+        scores = calculation.score_batch(
+            hw_prices, write_off_lengths, produced,
+            [Decimal(value) for value in repair_offers], [Decimal(value) for value in service_costs],
+            today=ReplacementCalculationGoldenTests.today,
+        )
+        self.assertEqual(list(scores.age_months), list(ages))
+        self.assertEqual(list(scores.scores), list(results))
+        self.assertEqual(list(scores.verdicts), list(verdicts))
+
+    def test_matches_scalar_api(self):
+        generator = random.Random(2025)
+        rows = []
+        for _ in range(5000):
+            # Kazdy den za 19 let vcetne koncu mesicu a prestupnych roku
+            produced = date(2005, 1, 1) + timedelta(days=generator.randint(0, 6900))
+            rows.append((
+                generator.randint(1, 2000000), generator.randint(1, 10), produced,
+                Decimal(generator.randint(0, 3000000)) / 100, Decimal(generator.randint(0, 1000000)) / 100,
+            ))
+        hw_prices, write_off_lengths, produced, repair_offers, service_costs = zip(*rows)
+
+        for today in (date(2025, 2, 28), date(2024, 2, 29), date(2025, 3, 31), date(2025, 4, 30), date(2025, 6, 15)):
+            scores = calculation.score_batch(hw_prices, write_off_lengths, produced, repair_offers, service_costs,
+                                             today=today)
+            for index, (hw_price, write_off_length, production_date, repair_offer, service_cost) in enumerate(rows):
+                age = calculation.age_in_months(production_date, today)
+                value = calculation.score(hw_price, write_off_length, age, repair_offer, service_cost)
+                self.assertEqual(
+                    (scores.age_months[index], scores.scores[index], scores.verdicts[index]),
+                    (age, value, calculation.verdict_for(value)),
+                    (today, rows[index]),
+                )
+
+
+class ScoreMemoTests(SimpleTestCase):
+    """Checks the LRU and the shared cache of the calculation memo."""
+
+    inputs = (100000, 5, 30)
+
+    def test_least_recently_used_is_evicted(self):
+        memo = ScoreMemo(maxsize=2)
+        for repair_offer in (1000, 2000, 1000, 3000):
+            memo.score(*self.inputs, repair_offer, 0)
+        self.assertEqual([key[3] for key in memo.entries], [1000.0, 3000.0])
+        self.assertEqual(memo.stats(), {"hits": 1, "shared_hits": 0, "misses": 3, "size": 2, "maxsize": 2})
+
+        memo.score(*self.inputs, 2000, 0)
+        self.assertEqual([key[3] for key in memo.entries], [3000.0, 2000.0])
+        self.assertEqual(memo.stats()["misses"], 4)
+
+    def test_equal_amounts_share_the_entry(self):
+        memo = ScoreMemo()
+        expected = calculation.score(*self.inputs, 29900, 100)
+        for repair_offer, service_cost in ((Decimal("29900.00"), Decimal("100")), (29900, 100), ("29900", "100.0")):
+            self.assertEqual(memo.score(*self.inputs, repair_offer, service_cost), expected)
+        self.assertEqual((memo.stats()["hits"], memo.stats()["misses"], memo.stats()["size"]), (2, 1, 1))
+
+    def test_shared_cache(self):
+        shared_cache = LocMemCache("score-memo", {})
+        first, second = ScoreMemo(shared_cache=shared_cache), ScoreMemo(shared_cache=shared_cache)
+        expected = calculation.score(*self.inputs, 29900, 0)
+
+        self.assertEqual(first.score(*self.inputs, Decimal("29900.00"), Decimal("0.00")), expected)
+        # Jiny worker dostane vysledek ze sdilene cache, i kdyz castku zadal jinak
+        self.assertEqual(second.score(*self.inputs, 29900, 0), expected)
+        self.assertEqual((second.stats()["shared_hits"], second.stats()["misses"]), (1, 0))
+        self.assertEqual(second.score(*self.inputs, 29900, 0), expected)
+        self.assertEqual(second.stats()["hits"], 1)
+
+        with override_settings(REPLACEMENT_SCORE_SHARED_CACHE="default", REPLACEMENT_SCORE_MEMO_SIZE=10):
+            memo = ScoreMemo.from_settings()
+        self.assertIs(memo.shared_cache, caches["default"])
+        self.assertEqual(memo.maxsize, 10)
+
+
+class BreakEvenTests(SimpleTestCase):
+    """Checks the break-even repair costs against the scalar calculation."""
+
+    def test_verdict_changes_at_the_costs(self):
+        cases = [(hw_price, write_off_length, age)
+                 for hw_price in (999, 100000, 585000)
+                 for write_off_length in (3, 5, 7)
+                 for age in (0, 1, 35, 59, 60, 61, 84, 120)]
+        costs = calculation.break_even_batch(*zip(*cases))
+
+        def verdict(case, cents):
+            hw_price, write_off_length, age = case
+            return calculation.verdict_for(
+                calculation.score(hw_price, write_off_length, age, Decimal(int(cents)).scaleb(-2), Decimal(0))
+            )
+
+        for case, individual_from, repair_band_from, replacement_from in zip(
+            cases, costs.individual_from, costs.repair_band_from, costs.replacement_from
+        ):
+            with self.subTest(case=case):
+                self.assertLessEqual(individual_from, repair_band_from)
+                self.assertLess(repair_band_from, replacement_from)
+                self.assertEqual(verdict(case, individual_from - 1), calculation.VERDICT_REPAIR)
+                self.assertEqual(verdict(case, individual_from), calculation.VERDICT_INDIVIDUAL)
+                self.assertEqual(verdict(case, repair_band_from - 1), calculation.VERDICT_INDIVIDUAL)
+                self.assertEqual(verdict(case, repair_band_from), calculation.VERDICT_REPAIR)
+                self.assertEqual(verdict(case, replacement_from - 1), calculation.VERDICT_REPAIR)
+                self.assertEqual(verdict(case, replacement_from), calculation.VERDICT_REPLACE)
+
+
+@override_settings(REPLACEMENT_THRESHOLD_MAX_AGE_MONTHS=24)
+class BreakEvenThresholdTests(TestCase):
+    """Checks the rebuilds of the threshold table and its API."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.brand = Brand.objects.create(brand_name="KFC")
+        cls.token, cls.key = ApiToken.generate("procurement")
+
+    def create_hardware(self, hw_name="Fritéza", hw_price=120000):
+        return Hardware.objects.create(brand_name=self.brand, hw_name=hw_name, hw_price=hw_price, write_off_length=5)
+
+    def assert_thresholds_match(self, hardware):
+        hardware.refresh_from_db()
+        expected = calculation.break_even_batch([hardware.hw_price] * 25, [hardware.write_off_length] * 25, range(25))
+        stored = list(thresholds_for(hardware).values_list("age_months", "replacement_from"))
+        self.assertEqual(stored, [(age, Decimal(int(cents)).scaleb(-2))
+                                  for age, cents in enumerate(expected.replacement_from)])
+
+    def test_saved_hardware_is_rebuilt(self):
+        hardware = self.create_hardware()
+        self.assert_thresholds_match(hardware)
+
+        hardware.hw_price = 90000
+        hardware.save()
+        self.assert_thresholds_match(hardware)
+
+        Hardware.objects.filter(pk=hardware.pk).update(hw_price=0)
+        self.assertEqual(refresh_thresholds([hardware.pk]), 0)
+        self.assertFalse(thresholds_for(hardware).exists())
+
+    def test_import_rebuilds_after_each_batch(self):
+        rows = [(line, {"brand_name": "KFC", "hw_name": f"Stroj {line}", "hw_price": str(1000 * line),
+                        "write_off_length": "5"}) for line in range(2, 7)]
+        with self.captureOnCommitCallbacks() as callbacks:
+            HardwareImporter(batch_size=2).run(rows)
+        # Davky se zapsaly bez prahu, prepocet ceka na commit kazde z nich
+        self.assertEqual(len(callbacks), 3)
+        self.assertFalse(BreakEvenThreshold.objects.exists())
+        self.assertEqual(Hardware.objects.filter(refresh_pending=True).count(), 5)
+
+        for callback in callbacks:
+            callback()
+        self.assertFalse(Hardware.objects.filter(refresh_pending=True).exists())
+        for hardware in Hardware.objects.all():
+            self.assert_thresholds_match(hardware)
+
+    def test_api(self):
+        hardware = self.create_hardware()
+        url = reverse("replacement:api-thresholds", args=[hardware.pk])
+        authorization = {"HTTP_AUTHORIZATION": f"Token {self.key}"}
+
+        self.assertEqual(self.client.get(url).status_code, 401)
+        response = self.client.get(url, {"age_months": [0, 12]}, **authorization).json()
+        self.assertEqual((response["hardware_id"], response["pending"]), (hardware.pk, False))
+        expected = thresholds_for(hardware, [0, 12]).values_list("age_months", "individual_from")
+        self.assertEqual([(row["age_months"], row["individual_from"]) for row in response["thresholds"]],
+                         [(age, str(amount)) for age, amount in expected])
+        self.assertEqual(len(self.client.get(url, **authorization).json()["thresholds"]), 25)
+
+        self.assertEqual(self.client.get(url, {"age_months": "rok"}, **authorization).status_code, 400)
+        missing = reverse("replacement:api-thresholds", args=[hardware.pk + 1])
+        self.assertEqual(self.client.get(missing, **authorization).status_code, 404)
+
+        Hardware.objects.filter(pk=hardware.pk).update(refresh_pending=True)
+        self.assertTrue(self.client.get(url, **authorization).json()["pending"])
+
+
+class DecisionRecorderTests(TransactionTestCase):
+    """Checks the write-behind of the decision history: batching, failures and shutdown."""
+
+    def setUp(self):
+        self.hardware = Hardware.objects.create(
+            brand_name=Brand.objects.create(brand_name="KFC"), hw_name="Stroj", hw_price=100000, write_off_length=3
+        )
+
+    def decision(self, hardware_id=None):
+        return ReplacementDecision(
+            hardware_id=hardware_id or self.hardware.pk, hw_price=100000, write_off_length=3,
+            production_date=date(2021, 3, 16), age_months=48, repair_offer=Decimal("29900"),
+            service_cost=Decimal("0"), replacement_calculation=9, verdict=calculation.VERDICT_INDIVIDUAL,
+        )
+
+    def wait_for_rows(self, count, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while ReplacementDecision.objects.count() < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return ReplacementDecision.objects.count()
+
+    def test_record_does_not_query(self):
+        recorder = DecisionRecorder(batch_size=10)
+        with self.assertNumQueries(0):
+            recorder.record(self.decision())
+        self.assertEqual(recorder.stats()["pending"], 1)
+
+    def test_flush_by_size(self):
+        recorder = DecisionRecorder(batch_size=3, flush_interval=60)
+        recorder.start()
+        self.addCleanup(recorder.stop)
+        for _ in range(3):
+            recorder.record(self.decision())
+        self.assertEqual(self.wait_for_rows(3), 3)
+
+    def test_flush_by_time(self):
+        recorder = DecisionRecorder(batch_size=100, flush_interval=0.05)
+        recorder.start()
+        self.addCleanup(recorder.stop)
+        recorder.record(self.decision())
+        self.assertEqual(self.wait_for_rows(1), 1)
+
+    def test_stop_flushes_the_buffer(self):
+        recorder = DecisionRecorder(batch_size=100, flush_interval=60)
+        recorder.start()
+        for _ in range(5):
+            recorder.record(self.decision())
+        self.assertEqual(recorder.stop(), 0)
+        self.assertEqual(ReplacementDecision.objects.count(), 5)
+        self.assertIsNone(recorder.thread)
+
+        # Po zastaveni se zapisuje hned
+        recorder.record(self.decision())
+        self.assertEqual(ReplacementDecision.objects.count(), 6)
+
+    def test_failed_flush_keeps_the_batch(self):
+        recorder = DecisionRecorder(batch_size=2)
+        for _ in range(3):
+            recorder.record(self.decision())
+
+        with mock.patch.object(ReplacementDecision.objects, "bulk_create", side_effect=OperationalError("locked")):
+            with self.assertLogs("replacement.decisions", "ERROR"):
+                self.assertEqual(recorder.flush(), 0)
+        self.assertEqual(recorder.stats()["pending"], 3)
+        self.assertEqual(recorder.stats()["failures"], 1)
+
+        self.assertEqual(recorder.flush(), 3)
+        self.assertEqual(ReplacementDecision.objects.count(), 3)
+
+    def test_writer_thread_survives_a_failing_database(self):
+        recorder = DecisionRecorder(batch_size=100, flush_interval=0.05)
+        with mock.patch.object(ReplacementDecision.objects, "bulk_create", side_effect=OperationalError("down")):
+            with self.assertLogs("replacement.decisions", "ERROR"):
+                recorder.start()
+                self.addCleanup(recorder.stop)
+                recorder.record(self.decision())
+                deadline = time.monotonic() + 5
+                while not recorder.stats()["failures"] and time.monotonic() < deadline:
+                    time.sleep(0.01)
+        self.assertTrue(recorder.thread.is_alive())
+        self.assertEqual(self.wait_for_rows(1), 1)
+
+    def test_buffer_is_bounded(self):
+        recorder = DecisionRecorder(batch_size=100, max_pending=3)
+        with self.assertLogs("replacement.decisions", "ERROR"):
+            for _ in range(5):
+                recorder.record(self.decision())
+        self.assertEqual(recorder.stats()["pending"], 3)
+        self.assertEqual(recorder.stats()["dropped"], 2)
+
+    def test_constraint_violation_does_not_block_the_buffer(self):
+        recorder = DecisionRecorder(batch_size=10)
+        recorder.record(self.decision())
+        recorder.record(self.decision(hardware_id=self.hardware.pk + 1000))
+        recorder.record(self.decision())
+        with self.assertLogs("replacement.decisions", "ERROR"):
+            recorder.flush()
+        self.assertEqual(ReplacementDecision.objects.count(), 2)
+        self.assertEqual(recorder.stats(), {"pending": 0, "written": 2, "dropped": 1, "failures": 0})
+
+    def test_calculation_view_records_the_decision(self):
+        user = User.objects.create_user("technik", password="heslo")
+        user.groups.add(Group.objects.create(name="editor"))
+        self.client.force_login(user)
+        recorder = DecisionRecorder()
+
+        with mock.patch.object(decisions, "_recorder", recorder):
+            response = self.client.post(
+                reverse("replacement:replacement-calculation", args=[self.hardware.pk]),
+                {"repair_offer": "29900", "service_cost": "0", "hw_production_date": "2021-03-16"},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ReplacementDecision.objects.count(), 0)
+
+        recorder.flush()
+        decision = ReplacementDecision.objects.get()
+        self.assertEqual((decision.user, decision.hardware, decision.hw_price), (user, self.hardware, 100000))
+        self.assertEqual(decision.replacement_calculation, response.context["replacement_calculation"])
+        self.assertEqual(decision.verdict, calculation.verdict_for(decision.replacement_calculation))
+
+
+class AsyncViewTests(TestCase):
+    """Checks the async listing, detail and calculation views with the async test client."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.brand = Brand.objects.create(brand_name="KFC")
+        cls.fryer = Hardware.objects.create(brand_name=cls.brand, hw_name="Fritéza", hw_price=100000, write_off_length=5)
+        cls.grill = Hardware.objects.create(brand_name=cls.brand, hw_name="Grill", hw_price=80000, write_off_length=5)
+        cls.user = User.objects.create_user("technik", password="heslo")
+        cls.user.groups.add(Group.objects.create(name="editor"))
+
+    def setUp(self):
+        cache.clear()
+        self.async_client.force_login(self.user)
+
+    async def test_anonymous_user_is_redirected(self):
+        anonymous = AsyncClient()
+        for url in (reverse("replacement:async-brand-list", args=[self.brand.slug]),
+                    reverse("replacement:async-hw-detail", args=[self.fryer.pk]),
+                    reverse("replacement:async-replacement-calculation", args=[self.fryer.pk])):
+            response = await anonymous.get(url)
+            self.assertRedirects(response, f"{reverse('login')}?next={url}", fetch_redirect_response=False)
+
+    async def test_listing(self):
+        response = await self.async_client.get(reverse("replacement:async-brand-list", args=[self.brand.slug]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([hardware.pk for hardware in response.context["hardware"]], [self.fryer.pk, self.grill.pk])
+        brand = await Brand.objects.aget(pk=self.brand.pk)
+        self.assertEqual(response.context["listing_version"], brand.cache_version)
+
+        response = await self.async_client.get(reverse("replacement:async-brand-list", args=["neexistuje"]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_detail(self):
+        response = await self.async_client.get(reverse("replacement:async-hw-detail", args=[self.fryer.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Fritéza")
+        expected = [threshold.pk async for threshold in thresholds_for(self.fryer, detail_ages())]
+        self.assertEqual([threshold.pk for threshold in response.context["thresholds"]], expected)
+        self.assertTrue(expected)
+
+        response = await self.async_client.get(reverse("replacement:async-hw-detail", args=[self.grill.pk + 100]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_calculation_records_the_decision(self):
+        url = reverse("replacement:async-replacement-calculation", args=[self.fryer.pk])
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context["form"].is_bound)
+
+        recorder = DecisionRecorder()
+        with mock.patch.object(decisions, "_recorder", recorder):
+            response = await self.async_client.post(
+                url, {"repair_offer": "29900", "service_cost": "0", "hw_production_date": "2021-03-16"}
+            )
+            invalid = await self.async_client.post(url, {"repair_offer": "x"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(invalid.status_code, 200)
+        self.assertTrue(invalid.context["form"].errors)
+
+        await sync_to_async(recorder.flush)()
+        decision = await ReplacementDecision.objects.select_related("user", "hardware").aget()
+        self.assertEqual((decision.user, decision.hardware), (self.user, self.fryer))
+        self.assertEqual(decision.replacement_calculation, response.context["replacement_calculation"])
+
+
+class ScoreApiTests(TestCase):
+    """Checks the authentication, limits and per-item validation of the scoring API."""
+
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(brand_name="KFC")
+        cls.hardware = Hardware.objects.create(brand_name=brand, hw_name="Fritéza", hw_price=100000, write_off_length=3)
+        cls.token, cls.key = ApiToken.generate("ticketing")
+
+    def setUp(self):
+        recorder = DecisionRecorder()
+        patcher = mock.patch.object(decisions, "_recorder", recorder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.recorder = recorder
+
+    def post(self, body, key=None):
+        content = body if isinstance(body, str) else json.dumps(body)
+        return self.client.post(
+            reverse("replacement:api-score"), content, content_type="application/json",
+            HTTP_AUTHORIZATION=f"Token {key or self.key}",
+        )
+
+    def item(self, **values):
+        return {"hardware_id": self.hardware.pk, "production_date": "2021-03-16", "repair_offer": "29900",
+                "service_cost": "0", **values}
+
+    def test_missing_or_invalid_token(self):
+        response = self.client.post(reverse("replacement:api-score"), "[]", content_type="application/json")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response["WWW-Authenticate"], "Token")
+        self.assertEqual(self.post([], key="neplatny").status_code, 401)
+
+        ApiToken.objects.filter(pk=self.token.pk).update(is_active=False)
+        self.assertEqual(self.post([]).status_code, 401)
+
+    @override_settings(REPLACEMENT_API_MAX_ITEMS=2, REPLACEMENT_API_MAX_BODY_SIZE=1000)
+    def test_rejected_requests(self):
+        self.assertEqual(self.post([self.item()] * 3).status_code, 413)
+        self.assertEqual(self.post([self.item(service_cost="0" * 1000)]).status_code, 413)
+        self.assertEqual(self.post("[{").status_code, 400)
+        self.assertEqual(self.post(self.item()).status_code, 400)
+
+    def test_item_errors(self):
+        items = [
+            self.item(production_date=20210316),
+            self.item(production_date=["2021-03-16"]),
+            self.item(production_date={"year": 2021}),
+            self.item(hardware_id=10 ** 20),
+            self.item(hardware_id=True),
+            self.item(hardware_id=self.hardware.pk + 1),
+            self.item(production_date="2999-01-01", repair_offer="abc"),
+            {"hardware_id": self.hardware.pk},
+            "polozka",
+        ]
+        response = self.post(items)
+        self.assertEqual(response.status_code, 200)
+        errors = [{name: [error["code"] for error in field_errors] for name, field_errors in result["errors"].items()}
+                  for result in response.json()["results"]]
+        self.assertEqual(errors, [
+            {"production_date": ["invalid_type"]},
+            {"production_date": ["invalid_type"]},
+            {"production_date": ["invalid_type"]},
+            {"hardware_id": ["max_value"]},
+            {"hardware_id": ["invalid_type"]},
+            {"hardware_id": ["not_found"]},
+            {"production_date": ["future"], "repair_offer": ["invalid"]},
+            {"production_date": ["required"], "repair_offer": ["required"], "service_cost": ["required"]},
+            {"__all__": ["invalid"]},
+        ])
+        self.recorder.flush()
+        self.assertFalse(ReplacementDecision.objects.exists())
+
+    def test_mixed_batch(self):
+        response = self.post([self.item(), self.item(repair_offer=[1]), self.item(repair_offer=31001, service_cost=0)])
+        results = response.json()["results"]
+
+        self.assertEqual([result["index"] for result in results], [0, 1, 2])
+        age = calculation.age_in_months(date(2021, 3, 16))
+        expected = [
+            calculation.score(100000, 3, age, Decimal("29900"), Decimal("0")),
+            calculation.score(100000, 3, age, Decimal("31001"), Decimal("0")),
+        ]
+        self.assertEqual([results[0]["replacement_calculation"], results[2]["replacement_calculation"]], expected)
+        self.assertEqual(results[0]["age_months"], age)
+        self.assertEqual(results[1]["errors"]["repair_offer"][0]["code"], "invalid_type")
+        self.recorder.flush()
+        self.assertEqual(
+            sorted(ReplacementDecision.objects.values_list("replacement_calculation", "api_token")),
+            sorted((value, self.token.pk) for value in expected),
+        )
+
+
+class BrandSummaryTests(TestCase):
+    """Checks that the incrementally maintained brand summaries match a recomputation."""
+
+    def setUp(self):
+        self.kfc = Brand.objects.create(brand_name="KFC")
+        self.starbucks = Brand.objects.create(brand_name="Starbucks")
+        self.hardware = [
+            Hardware.objects.create(brand_name=self.kfc, hw_name=f"Stroj {i}", hw_price=1000 * (i + 1), write_off_length=3 + i % 2)
+            for i in range(4)
+        ]
+
+    def assert_consistent(self):
+        self.assertEqual(summaries.compare_summaries(), [])
+
+    def test_created_hardware(self):
+        summary = BrandSummary.objects.get(brand=self.kfc)
+        self.assertEqual((summary.hardware_count, summary.hw_price_total, summary.average_hw_price), (4, 10000, 2500))
+        self.assertEqual(summaries.stored_summaries()[self.kfc.pk]["write_offs"], {3: 2, 4: 2})
+        self.assert_consistent()
+
+    def test_updated_and_moved_hardware(self):
+        self.hardware[0].hw_price = 5000
+        self.hardware[0].save()
+        self.hardware[1].brand_name = self.starbucks
+        self.hardware[1].write_off_length = 7
+        self.hardware[1].save()
+        self.assert_consistent()
+        self.assertEqual(BrandSummary.objects.get(brand=self.starbucks).hardware_count, 1)
+
+    def test_save_without_loaded_values(self):
+        Hardware(pk=self.hardware[0].pk, brand_name=self.starbucks, hw_name="Stroj 0", hw_price=1, write_off_length=5).save()
+        self.assert_consistent()
+
+    def test_deleted_hardware_and_brand(self):
+        self.hardware[0].delete()
+        Hardware.objects.filter(pk__in=[self.hardware[1].pk, self.hardware[2].pk]).delete()
+        self.assert_consistent()
+
+        self.kfc.delete()
+        self.assertFalse(BrandSummary.objects.filter(brand_id=self.kfc.pk).exists())
+        self.assert_consistent()
+
+    def test_bulk_changed_hardware(self):
+        old = {pk: (brand_id, hw_price, write_off_length) for pk, brand_id, hw_price, write_off_length
+               in Hardware.objects.values_list("pk", "brand_name_id", "hw_price", "write_off_length")}
+        Hardware.objects.filter(brand_name=self.kfc).update(hw_price=F("hw_price") * 2, write_off_length=5)
+        self.assertNotEqual(summaries.compare_summaries(), [])
+        changes = [(old[pk], (old[pk][0], old[pk][1] * 2, 5)) for pk in old]
+        hardware_bulk_changed.send(sender=Hardware, brand_ids={self.kfc.pk}, changes=changes)
+        self.assert_consistent()
+
+    def test_import_and_repricing_add_differences(self):
+        rows = [(line, {"brand_name": "KFC", "hw_name": f"Stroj {line % 6}", "hw_price": str(500 * line),
+                        "write_off_length": str(3 + line % 3)}) for line in range(2, 12)]
+        with CaptureQueriesContext(connection) as queries:
+            HardwareImporter(batch_size=3).run(rows)
+            repricing.reprice(Hardware.objects.filter(hw_price__gt=2000), percent=Decimal("10"))
+        self.assert_consistent()
+        # Souhrny se upravi rozdily, hardware brandu se znovu neagreguje
+        self.assertFalse([query for query in queries if "GROUP BY" in query["sql"]])
+
+    def test_recorded_and_deleted_decisions(self):
+        recorder = DecisionRecorder()
+        for repair_offer, value in ((Decimal("100"), -120), (Decimal("99999"), 50), (Decimal("99999"), 50)):
+            recorder.record(ReplacementDecision(
+                hardware=self.hardware[0], brand=self.kfc, hw_price=1000, write_off_length=3,
+                production_date=date(2024, 1, 1), age_months=12, repair_offer=repair_offer, service_cost=0,
+                replacement_calculation=value, verdict=calculation.verdict_for(value),
+            ))
+        recorder.flush()
+        summary = BrandSummary.objects.get(brand=self.kfc)
+        self.assertEqual((summary.replace_count, summary.individual_count, summary.repair_count), (2, 0, 1))
+        self.assert_consistent()
+
+        ReplacementDecision.objects.filter(verdict=calculation.VERDICT_REPLACE).first().delete()
+        self.assertEqual(BrandSummary.objects.get(brand=self.kfc).replace_count, 1)
+        self.assert_consistent()
+
+    def test_check_and_rebuild(self):
+        BrandSummary.objects.filter(brand=self.kfc).update(hardware_count=99)
+        BrandSummary.objects.filter(brand=self.starbucks).delete()
+        self.assertEqual(summaries.compare_summaries(), [(self.kfc.pk, "hardware_count", 99, 4)])
+
+        summaries.rebuild_summaries()
+        self.assert_consistent()
+        self.assertTrue(BrandSummary.objects.filter(brand=self.starbucks).exists())
+
+
+class HardwareImporterTests(TestCase):
+    """Checks the batched import of the hardware catalog."""
+
+    CSV = ("brand_name,hw_name,hw_price,write_off_length\n"
+           "KFC,Fritéza,120 000,5\nKFC,Grill,80000,5\nBurger King,Kávovar,5000,3\n")
+
+    def rows(self, text):
+        return read_hardware_rows(io.StringIO(text))
+
+    def test_reimport_writes_nothing(self):
+        HardwareImporter().run(self.rows(self.CSV))
+        with CaptureQueriesContext(connection) as queries:
+            stats = HardwareImporter().run(self.rows(self.CSV))
+        self.assertEqual((stats.rows, stats.created, stats.updated, stats.unchanged), (3, 0, 0, 3))
+        self.assertFalse([query for query in queries if query["sql"].startswith(("INSERT", "UPDATE", "DELETE"))])
+
+    def test_changed_rows_are_bulk_updated(self):
+        HardwareImporter().run(self.rows(self.CSV))
+        pks = dict(Hardware.objects.values_list("hw_name", "pk"))
+        with CaptureQueriesContext(connection) as queries:
+            stats = HardwareImporter().run(self.rows(self.CSV.replace("80000,5", "85000,6")))
+        self.assertEqual((stats.created, stats.updated, stats.unchanged), (0, 1, 2))
+        self.assertEqual(dict(Hardware.objects.values_list("hw_name", "pk")), pks)
+        self.assertEqual(Hardware.objects.values_list("hw_price", "write_off_length").get(hw_name="Grill"), (85000, 6))
+        self.assertFalse([query for query in queries if query["sql"].startswith('INSERT INTO "replacement_hardware"')])
+        # bulk_update zapise vsechny zmenene radky jednim UPDATE s CASE
+        updates = [query for query in queries if query["sql"].startswith('UPDATE "replacement_hardware" SET "hw_price"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn("CASE", updates[0]["sql"])
+
+    def test_duplicate_and_invalid_rows_are_reported(self):
+        warnings = []
+        stats = HardwareImporter(on_warning=warnings.append).run(self.rows(
+            self.CSV + "KFC,Grill,90000,5\n,Mixér,100,3\nKFC,Mixér,sto,3\nKFC,Toustovač,100,x\n"
+        ))
+        self.assertEqual(warnings, [
+            "Line 6: missing brand_name, row skipped.",
+            "Line 7: invalid hw_price or write_off_length, row skipped.",
+            "Line 8: invalid hw_price or write_off_length, row skipped.",
+            "Duplicate row for KFC / Grill, row skipped.",
+        ])
+        self.assertEqual((stats.rows, stats.created, stats.skipped), (7, 3, 4))
+        # Prvni radek se stejnym klicem vyhrava
+        self.assertEqual(Hardware.objects.get(hw_name="Grill").hw_price, 80000)
+
+    def test_delete_missing(self):
+        HardwareImporter().run(self.rows(self.CSV))
+        grill = Hardware.objects.get(hw_name="Grill")
+        text = self.CSV.replace("KFC,Grill,80000,5\n", "")
+
+        stats = HardwareImporter().run(self.rows(text))
+        self.assertEqual((stats.missing, stats.deleted), ([grill.pk], 0))
+        self.assertTrue(Hardware.objects.filter(pk=grill.pk).exists())
+
+        stats = HardwareImporter(delete_missing=True).run(self.rows(text))
+        self.assertEqual((stats.missing, stats.deleted, stats.protected), ([grill.pk], 1, []))
+        self.assertEqual(Hardware.objects.count(), 2)
+
+    def test_command_reads_stdin(self):
+        stdout = io.StringIO()
+        with mock.patch("sys.stdin", io.TextIOWrapper(io.BytesIO(self.CSV.encode()))):
+            call_command("import_data_hw", "-", stdout=stdout)
+        self.assertIn("Data imported successfully! 3 created, 0 updated, 0 unchanged, 0 skipped of 3 rows",
+                      stdout.getvalue())
+        self.assertEqual(Hardware.objects.get(hw_name="Fritéza").hw_price, 120000)
+
+    def test_every_written_batch_notifies_the_receivers(self):
+        HardwareImporter().run(self.rows(self.CSV))
+        kfc, burger_king = Brand.objects.get(brand_name="KFC"), Brand.objects.get(brand_name="Burger King")
+        versions = {brand.pk: brand.cache_version for brand in (kfc, burger_king)}
+        sent = []
+
+        def receiver(sender, brand_ids, hardware_ids, **kwargs):
+            sent.append((brand_ids, hardware_ids))
+
+        hardware_bulk_changed.connect(receiver)
+        self.addCleanup(hardware_bulk_changed.disconnect, receiver)
+        text = self.CSV.replace("120 000,5", "130000,5") + "KFC,Mixér,100,3\nKFC,Toustovač,200,3\n"
+        HardwareImporter(batch_size=2).run(self.rows(text))
+
+        pks = dict(Hardware.objects.values_list("hw_name", "pk"))
+        # Davky (Friteza, Grill), (Kavovar, Mixer), (Toustovac), posilaji se jen zapsane radky
+        self.assertEqual(sent, [({kfc.pk}, {pks["Fritéza"]}), ({kfc.pk}, {pks["Mixér"]}), ({kfc.pk}, {pks["Toustovač"]})])
+        kfc.refresh_from_db()
+        burger_king.refresh_from_db()
+        self.assertEqual(kfc.cache_version, versions[kfc.pk] + 3)
+        self.assertEqual(burger_king.cache_version, versions[burger_king.pk])
+
+
+class ImportCommandBatchTests(TransactionTestCase):
+    """Checks that import_data_hw commits every batch on its own."""
+
+    def setUp(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as csv_file:
+            csv_file.write("brand_name,hw_name,hw_price,write_off_length\n")
+            csv_file.writelines(f"KFC,Stroj {i},{1000 * i},5\n" for i in range(1, 6))
+        self.addCleanup(os.unlink, csv_file.name)
+        self.path = csv_file.name
+
+    def test_batches_smaller_than_the_file(self):
+        stdout = io.StringIO()
+        call_command("import_data_hw", self.path, batch_size=2, stdout=stdout)
+        self.assertIn("Data imported successfully! 5 created, 0 updated, 0 unchanged, 0 skipped of 5 rows",
+                      stdout.getvalue())
+        self.assertEqual(Hardware.objects.count(), 5)
+        self.assertFalse(Hardware.objects.filter(refresh_pending=True).exists())
+
+    def test_failed_batch_keeps_the_committed_ones(self):
+        send_changed = HardwareImporter.send_changed
+        calls = []
+
+        def fail_third_batch(importer, hardware, changes):
+            calls.append(hardware)
+            if len(calls) == 3:
+                raise OperationalError("database is locked")
+            send_changed(importer, hardware, changes)
+
+        with mock.patch.object(HardwareImporter, "send_changed", fail_third_batch), \
+                self.assertRaises(OperationalError):
+            call_command("import_data_hw", self.path, batch_size=2, stdout=io.StringIO())
+        # Prvni dve davky zustaly zapsane, treti se vratila
+        self.assertEqual(sorted(Hardware.objects.values_list("hw_price", flat=True)), [1000, 2000, 3000, 4000])
+
+        stdout = io.StringIO()
+        call_command("import_data_hw", self.path, batch_size=2, stdout=stdout)
+        self.assertIn("1 created, 0 updated, 4 unchanged", stdout.getvalue())
+
+    def test_failed_batch_keeps_its_new_brands(self):
+        importer = HardwareImporter(batch_size=2)
+        importer.load_brands()
+        importer.load_existing()
+        importer.seen = set()
+        batch = [("Starbucks", "Kávovar", 5000, 3), ("KFC", "Fritéza", 1000, 5)]
+
+        with mock.patch.object(HardwareImporter, "send_changed", side_effect=OperationalError("database is locked")), \
+                self.assertRaises(OperationalError):
+            importer.write_batch(batch, ImportStats())
+        self.assertFalse(Hardware.objects.exists())
+        self.assertEqual(dict(Brand.objects.values_list("brand_name", "pk")), importer.brands)
+
+        # Opakovana davka pouzije znacky z mapy
+        importer.seen = set()
+        importer.write_batch(batch, ImportStats())
+        self.assertEqual(sorted(Hardware.objects.values_list("brand_name__brand_name", "hw_name")),
+                         [("KFC", "Fritéza"), ("Starbucks", "Kávovar")])
+
+
+class HardwareSearchTests(TestCase):
+    """Checks the trigram search index, its triggers and the searches using it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.kfc = Brand.objects.create(brand_name="KFC")
+        cls.burger_king = Brand.objects.create(brand_name="Burger King")
+        cls.fryer = Hardware.objects.create(brand_name=cls.kfc, hw_name="Fritéza XL", hw_price=120000, write_off_length=5)
+        cls.small_fryer = Hardware.objects.create(brand_name=cls.kfc, hw_name="Fritéza S", hw_price=60000,
+                                                  write_off_length=5)
+        cls.grill = Hardware.objects.create(brand_name=cls.burger_king, hw_name="Grill XL", hw_price=80000,
+                                            write_off_length=5)
+
+    def setUp(self):
+        if not search.index_available():
+            self.skipTest("SQLite without FTS5 trigram tokenizer.")
+
+    def indexed(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT rowid, hw_name, brand_name FROM {search.SEARCH_TABLE} ORDER BY rowid")
+            return cursor.fetchall()
+
+    def found(self, text):
+        return [hardware.pk for hardware in search.search_hardware(text)]
+
+    def test_triggers_follow_the_hardware_and_brands(self):
+        self.assertEqual(self.indexed(), [(self.fryer.pk, "Fritéza XL", "KFC"), (self.small_fryer.pk, "Fritéza S", "KFC"),
+                                          (self.grill.pk, "Grill XL", "Burger King")])
+
+        self.fryer.hw_name = "Fritéza XXL"
+        self.fryer.brand_name = self.burger_king
+        self.fryer.save()
+        self.small_fryer.delete()
+        self.kfc.brand_name = "Kentucky"
+        self.kfc.save()
+        Brand.objects.filter(pk=self.burger_king.pk).update(brand_name="BK")
+        mixer = Hardware.objects.create(brand_name=self.kfc, hw_name="Mixér", hw_price=100, write_off_length=3)
+
+        self.assertEqual(self.indexed(), [(self.fryer.pk, "Fritéza XXL", "BK"), (self.grill.pk, "Grill XL", "BK"),
+                                          (mixer.pk, "Mixér", "Kentucky")])
+        self.assertEqual(self.found("Kentucky"), [mixer.pk])
+        self.assertEqual(self.found("Burger"), [])
+
+    def test_triggers_exist_after_migrate(self):
+        # Migrace, ktera prestavi tabulku, triggery v SQLite zahodi
+        self.assertEqual(search.missing_triggers(), [])
+
+    def test_rebuild_search_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {search.SEARCH_TABLE} WHERE rowid = %s", [self.grill.pk])
+            cursor.execute(f"UPDATE {search.SEARCH_TABLE} SET brand_name = 'BK' WHERE rowid = %s", [self.fryer.pk])
+        stdout = io.StringIO()
+        call_command("rebuild_search_index", stdout=stdout)
+
+        self.assertIn("3 hardware indexed", stdout.getvalue())
+        self.assertEqual(self.indexed(), [(self.fryer.pk, "Fritéza XL", "KFC"), (self.small_fryer.pk, "Fritéza S", "KFC"),
+                                          (self.grill.pk, "Grill XL", "Burger King")])
+        self.assertEqual(self.found("Grill"), [self.grill.pk])
+
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER replacement_brand_search_update")
+        with self.assertRaisesMessage(CommandError, "replacement_brand_search_update"):
+            call_command("rebuild_search_index", stdout=io.StringIO())
+
+    def test_short_terms_filter_the_index_matches(self):
+        self.assertTrue(search.uses_index(["Fritéza", "XL"]))
+        self.assertFalse(search.uses_index(["XL"]))
+        self.assertIsInstance(search.search_hardware("fritéza xl"), search.RankedSearchResults)
+
+        for text in ("fritéza xl", "XL gri", "Fritéza s", "Fritéza _", "kfc %", "Fritéza XL Grill", "xl"):
+            expected = Hardware.objects.filter(search.icontains_filter(search.search_terms(text)))
+            self.assertEqual(sorted(self.found(text)), sorted(expected.values_list("pk", flat=True)), text)
+        self.assertEqual(len(search.search_hardware("fritéza xl")), 1)
+
+    def test_admin_search(self):
+        self.client.force_login(User.objects.create_superuser("admin", password="heslo"))
+        url = reverse("admin:replacement_hardware_changelist")
+
+        def found(text):
+            response = self.client.get(url, {"q": text})
+            return sorted(hardware.pk for hardware in response.context["cl"].result_list)
+
+        self.assertEqual(found("Fritéza XL"), [self.fryer.pk])
+        self.assertEqual(found("king"), [self.grill.pk])
+        # Cislo hleda i presnou cenu, kratke hledani bez indexu hleda v search_fields
+        self.assertEqual(found("60000"), [self.small_fryer.pk])
+        self.assertEqual(found("Fritéza 60000"), [self.small_fryer.pk])
+        self.assertEqual(found("XL 80000"), [self.grill.pk])
+        self.assertEqual(found("Grill 120000"), [])
+        self.assertEqual(found("XL"), [self.fryer.pk, self.grill.pk])
+        self.assertEqual(found("80"), [self.grill.pk])
+
+
+class AssetValuationTests(TestCase):
+    """Checks the valuation computed by the database against the Python calculation."""
+
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(brand_name="KFC")
+        cls.hardware = Hardware.objects.create(brand_name=brand, hw_name="Fritéza", hw_price=120000, write_off_length=5)
+        production_dates = [date(2025, 1, 31), date(2024, 2, 29), date(2023, 3, 15), date(2021, 6, 30), date(2010, 1, 1)]
+        Asset.objects.bulk_create(
+            Asset(hardware=cls.hardware, serial_number=f"SN-{i}", store="Praha 1" if i % 2 else "Brno", production_date=day)
+            for i, day in enumerate(production_dates)
+        )
+
+    def test_matches_python_calculation(self):
+        # Bezny den, posledni den mesice a prestupny rok
+        for today in (date(2025, 6, 15), date(2025, 4, 30), date(2025, 2, 28), date(2024, 2, 29)):
+            for asset in valuation.with_valuation(Asset.objects.filter(production_date__lte=today), today):
+                age = calculation.age_in_months(asset.production_date, today)
+                residual_value = max(0, 60 - age) / 60 * 120000
+                self.assertEqual(asset.age_months, age, (today, asset.production_date))
+                self.assertAlmostEqual(asset.residual_value, residual_value, places=2)
+
+    def test_fleet_is_one_query(self):
+        with self.assertNumQueries(1):
+            names = [asset.hardware.brand_name.brand_name for asset in valuation.with_valuation(Asset.objects.all())]
+        self.assertEqual(len(names), 5)
+
+    def test_totals_per_bucket(self):
+        totals = valuation.valuation_totals(Asset.objects.all(), today=date(2025, 6, 15))
+        counts = {total["bucket"]: total["count"] for total in totals}
+        self.assertEqual(counts, {"0-25": 1, "25-50": 2, "50-75": 0, "75-100": 1, "written-off": 1})
+        self.assertEqual(totals[-1]["residual_value"], 0)
+
+    def test_hardware_with_assets_is_not_deleted(self):
+        user = User.objects.create_user("technik", password="heslo")
+        self.client.force_login(user)
+        response = self.client.post(reverse("replacement:hw-delete", args=[self.hardware.pk]))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Hardware.objects.filter(pk=self.hardware.pk).exists())
+
+    def test_import_keeps_hardware_with_assets(self):
+        unused = Hardware.objects.create(brand_name=self.hardware.brand_name, hw_name="Grill", hw_price=1, write_off_length=3)
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as csv_file:
+            csv_file.write("brand_name,hw_name,hw_price,write_off_length\nKFC,Kávovar,5000,3\n")
+        self.addCleanup(os.unlink, csv_file.name)
+
+        stdout = io.StringIO()
+        call_command("import_data_hw", csv_file.name, delete_missing=True, stdout=stdout)
+        self.assertIn("1 hardware rows not in the file were deleted.", stdout.getvalue())
+        self.assertIn(f"1 hardware rows not in the file were kept, they have devices in stores: {self.hardware.pk}",
+                      stdout.getvalue())
+        self.assertTrue(Hardware.objects.filter(pk=self.hardware.pk).exists())
+        self.assertFalse(Hardware.objects.filter(pk=unused.pk).exists())
+
+
+class RescoreFleetTests(TestCase):
+    """Checks the monthly re-scoring of the devices and its resume."""
+
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(brand_name="KFC")
+        cls.hardware = Hardware.objects.create(brand_name=brand, hw_name="Fritéza", hw_price=120000, write_off_length=5)
+        Asset.objects.bulk_create(
+            Asset(hardware=cls.hardware, serial_number=f"SN-{i}", store="Brno", production_date=date(2020, 1 + i % 12, 10))
+            for i in range(30)
+        )
+        # Budouci datum vyroby ohodnotit nejde
+        Asset.objects.create(hardware=cls.hardware, serial_number="SN-budouci", store="Brno", production_date=date(2030, 1, 1))
+
+    def rescore(self, **options):
+        stdout = io.StringIO()
+        call_command("rescore_fleet", workers=1, chunk_size=10, as_of=date(2025, 6, 15), stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_scores_match_calculation(self):
+        self.rescore()
+        self.assertEqual(AssetScore.objects.count(), 30)
+        assets = valuation.with_valuation(Asset.objects.select_related("score").filter(score__isnull=False), date(2025, 6, 15))
+        for asset in assets:
+            self.assertEqual(asset.score.age_months, asset.age_months)
+            self.assertAlmostEqual(float(asset.score.residual_value), asset.residual_value, places=2)
+            costs = calculation.break_even_batch([120000], [5], [asset.age_months])
+            self.assertEqual(asset.score.replacement_from, Decimal(int(costs.replacement_from[0])).scaleb(-2))
+
+    def test_residual_value_rounds_half_up(self):
+        # 123 / 24 * 1 = 5,125 Kc, zaokrouhleni na sude by dalo 5,12
+        hardware = Hardware.objects.create(brand_name=self.hardware.brand_name, hw_name="Mixér", hw_price=123,
+                                           write_off_length=2)
+        asset = Asset.objects.create(hardware=hardware, serial_number="SN-mixer", store="Brno",
+                                     production_date=date(2023, 7, 15))
+        self.assertEqual(calculation.residual_value_hellers(123, 2, 23), 513)
+        self.assertEqual(calculation.residual_value_hellers(3, 2, 23), 13)
+
+        self.rescore()
+        self.assertEqual(AssetScore.objects.get(pk=asset.pk).residual_value, Decimal("5.13"))
+        self.assertEqual(valuation.with_valuation(Asset.objects.filter(pk=asset.pk), date(2025, 6, 15)).get().residual_value,
+                         5.13)
+
+    def test_resumes_unfinished_chunks(self):
+        self.rescore()
+        self.assertIn("already scored", self.rescore())
+
+        first_pk = Asset.objects.order_by("pk").first().pk
+        AssetScore.objects.filter(pk=first_pk).delete()
+        AssetScore.objects.update(age_months=0)
+        self.assertIn("Scoring 1 chunks", self.rescore())
+        # Prepocita se jen chunk se smazanym skore
+        chunk_start = (first_pk - 1) // 10 * 10 + 1
+        self.assertEqual(
+            set(AssetScore.objects.exclude(age_months=0).values_list("pk", flat=True)),
+            set(Asset.objects.filter(pk__range=(chunk_start, chunk_start + 9)).values_list("pk", flat=True)),
+        )
+
+
+class RepricingTests(TestCase):
+    """Checks the bulk re-pricing and the refresh of the data derived from the prices."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.brand = Brand.objects.create(brand_name="KFC")
+        other = Brand.objects.create(brand_name="Starbucks")
+        cls.fryer = Hardware.objects.create(brand_name=cls.brand, hw_name="Fritéza", hw_price=999, write_off_length=5)
+        cls.grill = Hardware.objects.create(brand_name=cls.brand, hw_name="Grill", hw_price=10, write_off_length=3)
+        cls.other = Hardware.objects.create(brand_name=other, hw_name="Fritéza", hw_price=1000, write_off_length=5)
+        cls.asset = Asset.objects.create(hardware=cls.fryer, serial_number="SN-1", store="Brno",
+                                         production_date=date(2023, 1, 10))
+        call_command("rescore_fleet", workers=1, as_of=date(2025, 6, 15), stdout=io.StringIO())
+
+    def test_single_update_rounds_like_decimal(self):
+        queryset = repricing.filter_hardware(brand=self.brand)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(repricing.reprice(queryset, percent=Decimal("7.5")), 2)
+        updates = [query["sql"] for query in queries
+                   if query["sql"].startswith('UPDATE "replacement_hardware" SET "hw_price"')]
+        self.assertEqual(len(updates), 1)
+
+        # 999 * 1,075 = 1073,925 a 10 * 1,075 = 10,75
+        self.assertEqual(
+            dict(Hardware.objects.values_list("pk", "hw_price")),
+            {self.fryer.pk: 1074, self.grill.pk: 11, self.other.pk: 1000},
+        )
+        repricing.reprice(Hardware.objects.filter(pk=self.grill.pk), amount=-50)
+        self.assertEqual(Hardware.objects.get(pk=self.grill.pk).hw_price, 0)
+
+    def test_rejects_invalid_percentages(self):
+        for percent in ("Infinity", "-Infinity", "NaN", "sNaN", "7.125", "-100"):
+            with self.subTest(percent=percent), self.assertRaises(ValueError):
+                repricing.new_price_expression(percent=Decimal(percent))
+        with self.assertRaisesMessage(CommandError, "finite"):
+            call_command("reprice_hardware", all=True, percent=Decimal("Infinity"), stdout=io.StringIO())
+        self.assertEqual(Hardware.objects.get(pk=self.fryer.pk).hw_price, 999)
+
+    def test_refreshes_derived_data(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            repricing.reprice(repricing.filter_hardware(name_pattern="frit*"), percent=10)
+        self.fryer.refresh_from_db()
+        self.assertEqual((self.fryer.hw_price, self.fryer.refresh_pending), (1099, True))
+        self.assertEqual(BrandSummary.objects.get(brand=self.brand).hw_price_total, 1099 + 10)
+
+        # Prahy a skore se prepocitaji az po commitu
+        for callback in callbacks:
+            callback()
+        self.fryer.refresh_from_db()
+        self.assertFalse(self.fryer.refresh_pending)
+
+        expected = calculation.break_even_batch([1099], [5], [0])
+        self.assertEqual(
+            thresholds_for(self.fryer, [0]).get().replacement_from,
+            Decimal(int(expected.replacement_from[0])).scaleb(-2),
+        )
+        score = AssetScore.objects.get(pk=self.asset.pk)
+        self.assertEqual(score.scored_on, date(2025, 6, 15))
+        self.assertAlmostEqual(float(score.residual_value), (60 - 29) / 60 * 1099, places=2)
+
+    def test_dry_run_and_admin_preview_write_nothing(self):
+        stdout = io.StringIO()
+        call_command("reprice_hardware", brand=self.brand.slug, amount=100, dry_run=True, stdout=stdout)
+        self.assertIn("2 hardware, total price 1009 -> 1209.", stdout.getvalue())
+
+        self.client.force_login(User.objects.create_superuser("admin", password="heslo"))
+        url = reverse("admin:replacement_hardware_changelist")
+        data = {"action": "reprice_selected", "_selected_action": [self.fryer.pk], "amount": 100}
+        response = self.client.post(url, {**data, "preview": "1"})
+        self.assertContains(response, "1099")
+        self.assertEqual(Hardware.objects.get(pk=self.fryer.pk).hw_price, 999)
+
+        self.client.post(url, {**data, "apply": "1"})
+        self.assertEqual(Hardware.objects.get(pk=self.fryer.pk).hw_price, 1099)
+
+    def test_admin_rebuilds_in_background(self):
+        self.client.force_login(User.objects.create_superuser("admin", password="heslo"))
+        data = {"action": "reprice_selected", "_selected_action": [self.fryer.pk, self.grill.pk], "percent": 10,
+                "apply": "1"}
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(reverse("admin:replacement_hardware_changelist"), data)
+        self.assertEqual(callbacks, [])
+        job = Job.objects.get(kind="refresh_hardware")
+        self.assertEqual(job.payload, {"hardware_ids": sorted([self.fryer.pk, self.grill.pk])})
+        self.assertEqual(Hardware.objects.filter(refresh_pending=True).count(), 2)
+
+        jobs.Worker().run(burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result["hardware"]), (Job.STATUS_DONE, 2))
+        self.assertFalse(Hardware.objects.filter(refresh_pending=True).exists())
+        score = AssetScore.objects.get(pk=self.asset.pk)
+        self.assertAlmostEqual(float(score.residual_value), (60 - 29) / 60 * 1099, places=2)
+
+
+class ExportTests(TestCase):
+    """Checks the CSV and XLSX exports and their scenario."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.brand = Brand.objects.create(brand_name="KFC")
+        cls.fryer = Hardware.objects.create(brand_name=cls.brand, hw_name="Fritéza", hw_price=100000, write_off_length=5)
+        cls.formula = Hardware.objects.create(brand_name=cls.brand, hw_name='=HYPERLINK("http://x";"y")',
+                                              hw_price=5000, write_off_length=3)
+        cls.unpriced = Hardware.objects.create(brand_name=cls.brand, hw_name="Grill", hw_price=0, write_off_length=5)
+        cls.user = User.objects.create_user("technik", password="heslo")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def export(self, file_format, **params):
+        return self.client.get(reverse("replacement:brand-export", args=[self.brand.slug, file_format]), params)
+
+    def csv_rows(self, response):
+        return list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode("utf-8-sig"))))
+
+    def test_csv(self):
+        response = self.export("csv")
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn(f'filename="replacement-{self.brand.slug}-', response["Content-Disposition"])
+        self.assertEqual(self.csv_rows(response), [
+            export.HEADER,
+            [str(self.formula.pk), "KFC", '\'=HYPERLINK("http://x";"y")', "5000", "3"],
+            [str(self.fryer.pk), "KFC", "Fritéza", "100000", "5"],
+            [str(self.unpriced.pk), "KFC", "Grill", "0", "5"],
+        ])
+
+    def test_csv_escapes_formulas(self):
+        self.assertEqual([export.csv_cell(value) for value in ("=1+1", "+420", "-2", "@SUM(A1)", "\t=1", "a=b")],
+                         ["'=1+1", "'+420", "'-2", "'@SUM(A1)", "'\t=1", "a=b"])
+        self.assertEqual([export.csv_cell(value) for value in (-12, 0.5, "")], [-12, 0.5, ""])
+
+    def test_xlsx(self):
+        response = self.export("xlsx")
+        with zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content))) as workbook:
+            sheet = ElementTree.fromstring(workbook.read("xl/worksheets/sheet1.xml"))
+        namespace = {"s": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+        rows = [[cell.findtext("s:v", namespaces=namespace) or cell.findtext("s:is/s:t", namespaces=namespace)
+                 for cell in row] for row in sheet.iterfind("s:sheetData/s:row", namespace)]
+        self.assertEqual(rows[0], export.HEADER)
+        # Inline text se nevyhodnocuje, vzorec zustava bez uprav
+        self.assertEqual(rows[1], [str(self.formula.pk), "KFC", '=HYPERLINK("http://x";"y")', "5000", "3"])
+        self.assertEqual(len(rows), 4)
+
+    def test_scenario(self):
+        production_date = date(2021, 3, 16)
+        rows = self.csv_rows(self.export("csv", production_date="2021-03-16", repair_offer="29900", service_cost="100"))
+        self.assertEqual(rows[0], export.HEADER + export.SCENARIO_HEADER)
+
+        age = calculation.age_in_months(production_date)
+        value = calculation.score(100000, 5, age, 29900, 100)
+        self.assertEqual(rows[2][5:], [str(age), str(value), export.VERDICT_LABELS[calculation.verdict_for(value)]])
+        # Bez ceny nelze spocitat
+        self.assertEqual(rows[3][5:], ["", "", ""])
+
+    def test_invalid_scenario(self):
+        response = self.export("csv", production_date="2021-03-16")
+        self.assertContains(response, "Pro výpočet zadejte výrobní datum i cenovou nabídku.", status_code=400)
+        response = self.export("csv", production_date=(date.today() + timedelta(days=1)).isoformat(), repair_offer="1")
+        self.assertContains(response, "Datum výroby musí být v minulosti.", status_code=400)
+        self.assertEqual(self.export("pdf").status_code, 404)
+
+
+class JobQueueTests(TestCase):
+    """Checks the claims, leases and retries of the background jobs and the import and export jobs."""
+
+    def setUp(self):
+        jobs_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(jobs_dir.cleanup)
+        settings_override = override_settings(REPLACEMENT_JOBS_DIR=jobs_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user("importer", password="heslo")
+        self.client.force_login(self.user)
+
+    def test_claim_is_exclusive_until_lease_expires(self):
+        job = jobs.enqueue("import_hardware", {"file": "missing.csv"})
+        first, second = jobs.Worker("first"), jobs.Worker("second")
+
+        self.assertEqual(first.claim().pk, job.pk)
+        self.assertIsNone(second.claim())
+
+        # Worker "first" prestal prodluzovat zamek
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        claimed = second.claim()
+        self.assertEqual((claimed.pk, claimed.locked_by, claimed.attempts), (job.pk, "second", 2))
+        with self.assertRaises(jobs.LeaseLost):
+            jobs.Progress(job, "first", 60)(10)
+
+    def test_failed_job_is_retried_then_failed(self):
+        handler = mock.Mock(side_effect=RuntimeError("Soubor nejde přečíst"))
+        with mock.patch.dict(jobs.HANDLERS, {"broken": handler}), self.assertLogs("replacement.jobs", "ERROR"):
+            job = jobs.enqueue("broken", max_attempts=2)
+            jobs.Worker(retry_delay=0).run(burst=True)
+
+        job.refresh_from_db()
+        self.assertEqual(handler.call_count, 2)
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_FAILED, 2))
+        self.assertEqual(job.error_summary, "RuntimeError: Soubor nejde přečíst")
+
+    def test_import_job(self):
+        csv_file = SimpleUploadedFile(
+            "hw.csv", "brand_name,hw_name,hw_price,write_off_length\nKFC,Fritéza,120 000,5\nKFC,Grill,x,5\n".encode()
+        )
+        response = self.client.post(reverse("replacement:hw-import"), {"csv_file": csv_file})
+        self.assertRedirects(response, reverse("replacement:job-list"))
+
+        jobs.Worker().run(burst=True)
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.STATUS_DONE)
+        self.assertEqual((job.result["created"], job.result["skipped"]), (1, 1))
+        self.assertEqual((job.progress_done, job.progress_total), (2, 2))
+        self.assertTrue(Hardware.objects.filter(hw_name="Fritéza", hw_price=120000).exists())
+
+    def test_export_job_download(self):
+        brand = Brand.objects.create(brand_name="KFC")
+        Hardware.objects.bulk_create(
+            Hardware(brand_name=brand, hw_name=f"Stroj {i:02d}", hw_price=10000 + i, write_off_length=5)
+            for i in range(5)
+        )
+        self.client.post(reverse("replacement:brand-export-job", args=[brand.slug, "csv"]))
+        jobs.Worker().run(burst=True)
+        job = Job.objects.get()
+
+        status = self.client.get(reverse("replacement:job-status", args=[job.pk])).json()
+        self.assertEqual((status["status"], status["progress_percent"]), (Job.STATUS_DONE, 100))
+        response = self.client.get(status["download_url"])
+        content = b"".join(response.streaming_content).decode("utf-8-sig").splitlines()
+        self.assertEqual(len(content), 6)
+        self.assertIn(f'filename="replacement-{brand.slug}-', response["Content-Disposition"])
+
+        # Cizi uloha neni videt
+        self.client.force_login(User.objects.create_user("jiny"))
+        self.assertEqual(self.client.get(status["download_url"]).status_code, 404)
+
+
+class SeedDataTests(TestCase):
+    """Checks the generated test data."""
+
+    def test_seeding_again_only_adds_missing(self):
+        call_command("seed_data", brands=2, hardware=15, assets=2, users=3, stdout=io.StringIO())
+        self.assertEqual(Hardware.objects.filter(brand_name__brand_name__startswith="Seed brand").count(), 30)
+        self.assertEqual(Asset.objects.count(), 60)
+        self.assertEqual(BrandSummary.objects.get(brand__brand_name="Seed brand 001").hardware_count, 15)
+        self.assertEqual(User.objects.filter(username__startswith="loadtest-", groups__name="editor").count(), 3)
+        self.assertTrue(User.objects.get(username="loadtest-3").check_password("loadtest"))
+
+        prices = dict(Hardware.objects.values_list("pk", "hw_price"))
+        stdout = io.StringIO()
+        call_command("seed_data", brands=2, hardware=15, assets=2, users=3, stdout=stdout)
+        self.assertIn("0 created, 0 updated, 30 unchanged", stdout.getvalue())
+        self.assertEqual(dict(Hardware.objects.values_list("pk", "hw_price")), prices)
+        self.assertEqual(Asset.objects.count(), 60)
+
+
+class LoadTestTests(LiveServerTestCase):
+    """Runs a short load test against the live test server."""
+
+    def test_flows_run_without_errors(self):
+        seeding.seed_hardware(2, 10)
+        seeding.seed_users(2, "loadtest")
+        hardware = list(Hardware.objects.values_list("pk", "brand_name_id"))
+
+        recorder = DecisionRecorder()
+
+        with mock.patch.object(decisions, "_recorder", recorder):
+            stats, failed, elapsed = loadtest.run_load(
+                self.live_server_url, ["loadtest-1", "loadtest-2"], "loadtest", 1.5,
+                list(Brand.objects.values_list("slug", flat=True)), hardware,
+            )
+        recorder.flush()
+        summary = {row["name"]: row for row in stats.summary(elapsed)}
+        self.assertEqual(failed, 0)
+        self.assertEqual(summary["total"]["errors"], 0)
+        self.assertEqual(summary["login POST"]["requests"], 2)
+        self.assertGreater(summary["replacement:brand-list GET"]["requests"], 0)
+        calculations = summary.get("replacement:replacement-calculation POST", {"requests": 0})["requests"]
+        self.assertEqual(ReplacementDecision.objects.count(), calculations)
+        # Zarizeni zalozena behem testu jsou zase smazana
+        self.assertEqual(Hardware.objects.count(), len(hardware))
+
+
+class GroupNamesTests(TestCase):
+    """Checks that the group names are loaded once per user object, i.e. per request."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.editor = User.objects.create_user("editor")
+        cls.editor.groups.add(Group.objects.create(name="editor"))
+        cls.technician = User.objects.create_user("technik")
+
+    def test_one_query_per_request(self):
+        user = User.objects.get(pk=self.editor.pk)
+        with self.assertNumQueries(1):
+            self.assertTrue(is_member_of_group(user, "editor"))
+            self.assertTrue(is_member_of_group(user, ["admin", "editor"]))
+            self.assertEqual(get_group_names(user), {"editor"})
+        with self.assertNumQueries(0):
+            self.assertEqual(get_group_names(AnonymousUser()), frozenset())
+
+    def test_not_shared_between_users_and_requests(self):
+        editor = User.objects.get(pk=self.editor.pk)
+        self.assertEqual(get_group_names(editor), {"editor"})
+        self.assertEqual(get_group_names(User.objects.get(pk=self.technician.pk)), frozenset())
+
+        # Dalsi pozadavek nacte uzivatele znovu a vidi zmenu skupin
+        editor.groups.clear()
+        self.assertEqual(get_group_names(editor), {"editor"})
+        self.assertEqual(get_group_names(User.objects.get(pk=self.editor.pk)), frozenset())
+
+
+class MetricsViewTests(TestCase):
+    """Checks the access to the Prometheus metrics."""
+
+    def test_only_staff_reads_the_metrics(self):
+        url = reverse("metrics")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.create_user("technik"))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(User.objects.create_user("spravce", is_staff=True))
+        self.client.get(reverse("replacement:home-page"))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        self.assertContains(response, 'replacement_http_requests_total{view="replacement:home-page",method="GET",status="200"}')
+        self.assertContains(response, 'replacement_score_memo_total{result="miss"}')
+
+    def query_counts(self, registry):
+        histograms, _ = registry.collect()
+        return {view: total for (name, view), (_, total) in histograms.items()
+                if name == "replacement_db_queries_per_request"}
+
+    def test_queries_of_sync_and_async_requests(self):
+        brand = Brand.objects.create(brand_name="KFC")
+        self.client.force_login(User.objects.create_user("technik"))
+        self.async_client.force_login(User.objects.get(username="technik"))
+
+        with mock.patch("project.metrics.registry", MetricsRegistry()) as registry:
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse("replacement:brand-list", args=[brand.slug]))
+            async_url = reverse("replacement:async-brand-list", args=[brand.slug])
+
+            async def fetch():
+                return await self.async_client.get(async_url)
+
+            async_to_sync(fetch)()
+        counts = self.query_counts(registry)
+        self.assertEqual(counts["replacement:brand-list"], len(queries))
+        self.assertGreater(counts["replacement:async-brand-list"], 0)
+
+        # Wrapper je na spojeni jednou, mimo pozadavek nic nezaznamena
+        install_query_timer(connection)
+        self.assertEqual(connection.execute_wrappers.count(time_query), 1)
+        Brand.objects.count()
+        self.assertEqual(self.query_counts(registry), counts)
+
+    def test_overhead_benchmark(self):
+        stdout = io.StringIO()
+        call_command("benchmark_metrics_overhead", requests=200, repeat=1, budget=10000, stdout=stdout)
+        self.assertIn("Metrics overhead within", stdout.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("benchmark_metrics_overhead", requests=200, repeat=1, budget=-1, stdout=io.StringIO())
+
+
+class SqlitePragmaTests(SimpleTestCase):
+    """Checks that new SQLite connections get the pragmas of SQLITE_PRAGMAS."""
+
+    # Hodnoty, ktere vraci PRAGMA synchronous
+    synchronous_levels = {"OFF": 0, "NORMAL": 1, "FULL": 2, "EXTRA": 3}
+
+    def connect(self, alias):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_dict = {**connections["default"].settings_dict, "NAME": os.path.join(directory.name, "db.sqlite3")}
+        wrapper = connections["default"].__class__(settings_dict, alias=alias)
+        wrapper.ensure_connection()
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragmas(self, wrapper, names):
+        with wrapper.cursor() as cursor:
+            return {name: cursor.execute(f"PRAGMA {name}").fetchone()[0] for name in names}
+
+    def test_fresh_connection(self):
+        configured = settings.SQLITE_PRAGMAS
+        self.assertEqual(
+            self.pragmas(self.connect("pragma-check"), ["journal_mode", "busy_timeout", "synchronous", "foreign_keys"]),
+            {
+                "journal_mode": configured["journal_mode"].lower(),
+                "busy_timeout": configured["busy_timeout"],
+                "synchronous": self.synchronous_levels[configured["synchronous"]],
+                "foreign_keys": 1,
+            },
+        )
+
+    @override_settings(REPLACEMENT_READ_REPLICAS=["replica-check"])
+    def test_replica_connection_keeps_the_file_settings(self):
+        pragmas = self.pragmas(self.connect("replica-check"), ["journal_mode", "busy_timeout"])
+        self.assertEqual(pragmas, {"journal_mode": "delete", "busy_timeout": settings.SQLITE_PRAGMAS["busy_timeout"]})
+
+
+@override_settings(REPLACEMENT_READ_REPLICAS=["replica"])
+class ReplicaRoutingTests(SimpleTestCase):
+    """Checks which database the router picks for the queries of a request."""
+
+    def setUp(self):
+        self.router = replicas.ReplicaRouter()
+
+    def call_middleware(self, request, view):
+        def get_response(request):
+            view()
+            return HttpResponse()
+
+        return replicas.ReplicaRoutingMiddleware(get_response)(request)
+
+    def test_reads_of_opted_in_requests(self):
+        routes = []
+
+        def view():
+            routes.append(self.router.db_for_read(Hardware))
+            replicas.use_replicas()
+            routes.append(self.router.db_for_read(Hardware))
+            routes.append(self.router.db_for_read(User))
+
+        self.call_middleware(RequestFactory().get("/"), view)
+        self.assertEqual(routes, [None, "replica", None])
+        self.assertIsNone(self.router.db_for_read(Hardware))
+
+    def test_write_pins_request_and_sets_cookie(self):
+        routes = []
+
+        def view():
+            replicas.use_replicas()
+            routes.append(self.router.db_for_write(Hardware))
+            routes.append(self.router.db_for_read(Hardware))
+
+        response = self.call_middleware(RequestFactory().get("/"), view)
+        self.assertEqual(routes, ["default", None])
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+
+    def test_pinned_requests(self):
+        routes = []
+
+        def view():
+            replicas.use_replicas()
+            routes.append(self.router.db_for_read(Hardware))
+
+        self.call_middleware(RequestFactory().post("/"), view)
+        factory = RequestFactory()
+        factory.cookies[replicas.PIN_COOKIE] = "1"
+        self.call_middleware(factory.get("/"), view)
+        self.assertEqual(routes, [None, None])
+
+    def test_no_migrations_on_replicas(self):
+        self.assertFalse(self.router.allow_migrate("replica", "replacement"))
+        self.assertIsNone(self.router.allow_migrate("default", "replacement"))
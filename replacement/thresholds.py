@@ -0,0 +1,118 @@
+"""
+Break-even repair costs
+
+Precomputes the table BreakEvenThreshold (hardware x age in months) from
+calculation.break_even_batch. The rows of a hardware are rebuilt whenever its price
+or write-off length changes (see refresh), pages then only read them.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from replacement import calculation
+from replacement.models import BreakEvenThreshold, Hardware
+
+DEFAULT_CHUNK_SIZE = 200
+
+
+def threshold_rows(hardware_rows, max_age_months):
+    """
+    Computes the threshold rows of the hardware for ages 0 to max_age_months.
+
+    Hardware without a price or write-off length can't be scored and gets no rows.
+
+    :param hardware_rows: List of (pk, hw_price, write_off_length) tuples.
+    :param max_age_months: Highest age in months.
+    :return: List of (hardware_id, age_months, individual_from, repair_band_from, replacement_from)
+        tuples with the amounts as Decimals.
+    """
+    hardware_rows = [row for row in hardware_rows if row[1] and row[2]]
+    if not hardware_rows:
+        return []
+
+    ages = range(max_age_months + 1)
+    costs = calculation.break_even_batch(
+        [hw_price for _, hw_price, _ in hardware_rows for _ in ages],
+        [write_off_length for _, _, write_off_length in hardware_rows for _ in ages],
+        [age for _ in hardware_rows for age in ages],
+    )
+    keys = [(pk, age) for pk, _, _ in hardware_rows for age in ages]
+    return [
+        (pk, age, Decimal(individual_from).scaleb(-2), Decimal(repair_band_from).scaleb(-2),
+         Decimal(replacement_from).scaleb(-2))
+        for (pk, age), individual_from, repair_band_from, replacement_from in zip(
+            keys, costs.individual_from.tolist(), costs.repair_band_from.tolist(), costs.replacement_from.tolist()
+        )
+    ]
+
+
+def insert_threshold_rows(rows, model=BreakEvenThreshold, using="default"):
+    """
+    Inserts threshold rows with a single executemany.
+
+    The table has a row per hardware and month of age, so a large catalog has millions
+    of them; building model instances for bulk_create took over ten times longer.
+
+    :param rows: Tuples from threshold_rows.
+    :param model: Threshold model, migrations pass the historical one.
+    :param using: Database alias.
+    """
+    if not rows:
+        return
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    columns = ["hardware_id", "age_months", "individual_from", "repair_band_from", "replacement_from"]
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        quote_name(model._meta.db_table),
+        ", ".join(quote_name(column) for column in columns),
+        ", ".join(["%s"] * len(columns)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def refresh_thresholds(hardware_ids, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Rebuilds the threshold rows of the given hardware.
+
+    :param hardware_ids: Primary keys of the changed hardware.
+    :param chunk_size: Number of hardware rebuilt in one transaction.
+    :return: Number of threshold rows written.
+    """
+    hardware_ids = sorted(set(hardware_ids))
+    max_age_months = settings.REPLACEMENT_THRESHOLD_MAX_AGE_MONTHS
+    written = 0
+
+    for start in range(0, len(hardware_ids), chunk_size):
+        chunk = hardware_ids[start:start + chunk_size]
+        rows = threshold_rows(
+            Hardware.objects.filter(pk__in=chunk).values_list("pk", "hw_price", "write_off_length"),
+            max_age_months,
+        )
+        with transaction.atomic():
+            BreakEvenThreshold.objects.filter(hardware_id__in=chunk).delete()
+            insert_threshold_rows(rows)
+        written += len(rows)
+    return written
+
+
+def detail_ages():
+    """
+    :return: Ages in months shown on the hardware detail, every year up to the maximal age.
+    """
+    return range(0, settings.REPLACEMENT_THRESHOLD_MAX_AGE_MONTHS + 1, 12)
+
+
+def thresholds_for(hardware, ages=None):
+    """
+    Returns the thresholds of the hardware.
+
+    :param hardware: Hardware instance or primary key.
+    :param ages: Optional ages in months to return, all ages by default.
+    :return: Queryset ordered by age.
+    """
+    queryset = BreakEvenThreshold.objects.filter(hardware=hardware).order_by("age_months")
+    if ages is not None:
+        queryset = queryset.filter(age_months__in=ages)
+    return queryset
@@ -1,22 +1,45 @@
 
 from django.urls import path
+from django.views.generic import RedirectView
 
-from replacement.views import KfcListingView, StarbucksListingView, \
-    BurgerkingListingView, PizzahutListingView, ReplacementCalculationView, HardwareUpdateView, HardwareCreateView, \
-    HomePageTemplateView, HardwareDeleteView, HardwareDetailListingView
+from replacement.api import BreakEvenThresholdApiView, ReplacementScoreApiView
+from replacement.views import BrandListingView, ReplacementCalculationView, HardwareUpdateView, HardwareCreateView, \
+    HomePageTemplateView, BrandDashboardView, HardwareDeleteView, HardwareDetailListingView, HardwareSearchView, AsyncBrandListingView, \
+    AsyncHardwareDetailView, AsyncReplacementCalculationView, HardwareExportView, AssetFleetView, JobListView, \
+    JobStatusView, JobDownloadView, HardwareImportJobView, HardwareExportJobView
 
 app_name = 'replacement'
 
 urlpatterns = [
     path('', HomePageTemplateView.as_view(), name='home-page'),
-    path('kfc/', KfcListingView.as_view(), name='kfc-list'),
-    path('sbx/', StarbucksListingView.as_view(), name='sbx-list'),
-    path('bk/', BurgerkingListingView.as_view(), name='bk-list'),
-    path('ph/', PizzahutListingView.as_view(), name='ph-list'),
+    path('brand/<slug:slug>/', BrandListingView.as_view(), name='brand-list'),
+    # Puvodni adresy brandu, presmeruji na brand/<slug>/
+    path('kfc/', RedirectView.as_view(pattern_name='replacement:brand-list'), {'slug': 'kfc'}, name='kfc-list'),
+    path('sbx/', RedirectView.as_view(pattern_name='replacement:brand-list'), {'slug': 'starbucks'}, name='sbx-list'),
+    path('bk/', RedirectView.as_view(pattern_name='replacement:brand-list'), {'slug': 'burger-king'}, name='bk-list'),
+    path('ph/', RedirectView.as_view(pattern_name='replacement:brand-list'), {'slug': 'pizza-hut'}, name='ph-list'),
+    path('brand/<slug:slug>/export/<str:file_format>/', HardwareExportView.as_view(), name='brand-export'),
+    path('export/<str:file_format>/', HardwareExportView.as_view(), name='export'),
+    # Ulohy na pozadi (run_workers)
+    path('brand/<slug:slug>/export/<str:file_format>/job/', HardwareExportJobView.as_view(), name='brand-export-job'),
+    path('export/<str:file_format>/job/', HardwareExportJobView.as_view(), name='export-job'),
+    path('import/', HardwareImportJobView.as_view(), name='hw-import'),
+    path('jobs/', JobListView.as_view(), name='job-list'),
+    path('jobs/<int:pk>/status/', JobStatusView.as_view(), name='job-status'),
+    path('jobs/<int:pk>/download/', JobDownloadView.as_view(), name='job-download'),
+    path('search/', HardwareSearchView.as_view(), name='hw-search'),
+    path('brand/<slug:slug>/fleet/', AssetFleetView.as_view(), name='brand-fleet'),
+    path('store/<str:store>/fleet/', AssetFleetView.as_view(), name='store-fleet'),
+    path('dashboard/', BrandDashboardView.as_view(), name='brand-dashboard'),
     path('form/<int:pk>/', ReplacementCalculationView.as_view(), name='replacement-calculation'),
+    path('api/score/', ReplacementScoreApiView.as_view(), name='api-score'),
+    path('api/thresholds/<int:pk>/', BreakEvenThresholdApiView.as_view(), name='api-thresholds'),
     path('hw-update/<int:pk>/', HardwareUpdateView.as_view(), name='hw-update'),
     path('hw-create/', HardwareCreateView.as_view(), name='hw-create'),
     path('hardware-delete/<int:pk>/', HardwareDeleteView.as_view(), name='hw-delete'),
     path('hw-detail/<int:pk>/', HardwareDetailListingView.as_view(), name='hw-detail'),
+    # Async verze pro ASGI server
+    path('async/brand/<slug:slug>/', AsyncBrandListingView.as_view(), name='async-brand-list'),
+    path('async/hw-detail/<int:pk>/', AsyncHardwareDetailView.as_view(), name='async-hw-detail'),
+    path('async/form/<int:pk>/', AsyncReplacementCalculationView.as_view(), name='async-replacement-calculation'),
 ]
-
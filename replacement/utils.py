@@ -2,12 +2,39 @@
 Tools
 
 """
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db.models import Q
+from django.http import Http404
 from django.urls import reverse_lazy
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 
+from project.replicas import use_replicas
 from replacement.models import Brand
 
 
+def get_group_names(user):
+    """
+    Returns the names of the groups the user belongs to.
+
+    The names are loaded with a single query and kept on the user object, which lives
+    for one request, so any number of rights checks in the request cost one query.
+
+    :param user: The user object.
+    :return: Frozen set of group names.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+
+    group_names = getattr(user, "_group_names_cache", None)
+    if group_names is None:
+        group_names = frozenset(user.groups.values_list("name", flat=True))
+        user._group_names_cache = group_names
+    return group_names
+
+
 def is_member_of_group(user, group_names):
     """
     Checks if a user belongs to a specific group or groups.
@@ -18,11 +45,9 @@ def is_member_of_group(user, group_names):
     """
     if isinstance(group_names, str):
         # Check if the user belongs to a single group.
-        rights_exist = user.groups.filter(name=group_names).exists()
-    else:
-        # Check if the user belongs to any group in a list of groups.
-        rights_exist = user.groups.filter(name__in=group_names).exists()
-    return rights_exist
+        return group_names in get_group_names(user)
+    # Check if the user belongs to any group in a list of groups.
+    return not get_group_names(user).isdisjoint(group_names)
 
 class RedirectToCorrectBrandMixin:
     """
@@ -40,3 +65,201 @@ class RedirectToCorrectBrandMixin:
         return reverse_lazy('replacement:home-page')
 
 
+class KeysetPage:
+    """
+    One page of a keyset-paginated queryset.
+    Provides the same has_next/has_previous interface as Django's Page.
+    """
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginates a queryset by (field, pk) keyset instead of OFFSET.
+
+    The cursor of a page is the (field, pk) value of its last or first row, so every
+    page is a single indexed range query, no matter how deep it is.
+    """
+    def __init__(self, queryset, per_page, field="hw_name"):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.field = field
+
+    @staticmethod
+    def encode_cursor(obj_values):
+        """
+        Encodes the (field, pk) values of a row to an opaque URL-safe cursor.
+
+        :param obj_values: Tuple with the field value and the primary key.
+        :return: Cursor string.
+        """
+        return urlsafe_base64_encode(json.dumps(obj_values).encode())
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """
+        Decodes a cursor created by encode_cursor.
+
+        :param cursor: Cursor string from the URL.
+        :raises Http404: If the cursor is not valid.
+        :return: Tuple with the field value and the primary key.
+        """
+        try:
+            value, pk = json.loads(urlsafe_base64_decode(cursor))
+            return value, int(pk)
+        except (ValueError, TypeError):
+            raise Http404("Neplatná stránka.")
+
+    def cursor_for(self, obj):
+        """
+        Returns the cursor pointing at the given row.
+
+        :param obj: Model instance from the queryset.
+        :return: Cursor string.
+        """
+        return self.encode_cursor((getattr(obj, self.field), obj.pk))
+
+    def page_queryset(self, after=None, before=None):
+        """
+        Returns the queryset of the page following the 'after' cursor or preceding the 'before' cursor.
+
+        :param after: Cursor of the last row of the previous page.
+        :param before: Cursor of the first row of the next page.
+        :return: Sliced queryset with one extra row, see build_page.
+        """
+        queryset = self.queryset
+        if before:
+            value, pk = self.decode_cursor(before)
+            queryset = queryset.filter(
+                Q(**{f"{self.field}__lte": value}), Q(**{f"{self.field}__lt": value}) | Q(pk__lt=pk)
+            ).order_by(f"-{self.field}", "-pk")
+        else:
+            queryset = queryset.order_by(self.field, "pk")
+            if after:
+                value, pk = self.decode_cursor(after)
+                # The plain range condition lets the database seek the index to the cursor
+                queryset = queryset.filter(
+                    Q(**{f"{self.field}__gte": value}), Q(**{f"{self.field}__gt": value}) | Q(pk__gt=pk)
+                )
+
+        # One extra row tells whether there is another page in this direction
+        return queryset[:self.per_page + 1]
+
+    def build_page(self, rows, after=None, before=None):
+        """
+        Builds the page from the rows fetched by page_queryset.
+
+        :param rows: List of rows of the page queryset.
+        :param after: Cursor the rows were fetched with.
+        :param before: Cursor the rows were fetched with.
+        :return: KeysetPage with the rows and the cursors of the neighbouring pages.
+        """
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if before:
+            rows.reverse()
+            next_cursor = self.cursor_for(rows[-1]) if rows else None
+            previous_cursor = self.cursor_for(rows[0]) if has_more else None
+        else:
+            next_cursor = self.cursor_for(rows[-1]) if has_more else None
+            previous_cursor = self.cursor_for(rows[0]) if after and rows else None
+
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+    def page(self, after=None, before=None):
+        """
+        Returns the page following the 'after' cursor or preceding the 'before' cursor.
+
+        :param after: Cursor of the last row of the previous page.
+        :param before: Cursor of the first row of the next page.
+        :return: KeysetPage with the rows and the cursors of the neighbouring pages.
+        """
+        rows = list(self.page_queryset(after, before))
+        return self.build_page(rows, after, before)
+
+    async def apage(self, after=None, before=None):
+        """
+        Async version of page, fetches the rows with the async ORM.
+
+        :param after: Cursor of the last row of the previous page.
+        :param before: Cursor of the first row of the next page.
+        :return: KeysetPage with the rows and the cursors of the neighbouring pages.
+        """
+        rows = [row async for row in self.page_queryset(after, before)]
+        return self.build_page(rows, after, before)
+
+
+class KeysetPaginationMixin:
+    """
+    Mixin for list views replacing the OFFSET paginator with KeysetPaginator.
+    Reads the 'after' and 'before' cursors from the query string.
+    """
+    keyset_field = "hw_name"
+
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Paginates the queryset by keyset.
+
+        :param queryset: Queryset to paginate.
+        :param page_size: Number of rows on a page.
+        :return: Tuple (paginator, page, object_list, is_paginated) as expected by ListView.
+        """
+        paginator = KeysetPaginator(queryset, page_size, field=self.keyset_field)
+        page = self.get_keyset_page(paginator)
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_keyset_page(self, paginator):
+        """
+        Returns the page selected by the cursors in the query string.
+
+        :param paginator: KeysetPaginator of the view's queryset.
+        :return: KeysetPage.
+        """
+        return paginator.page(after=self.request.GET.get("after"), before=self.request.GET.get("before"))
+
+
+class AsyncLoginRequiredMixin(LoginRequiredMixin):
+    """
+    LoginRequiredMixin for views with async handlers.
+
+    The lazy request.user loads the user from the database, which is not allowed in
+    async code, so it is resolved in a thread before the handler runs. Templates
+    rendered afterwards get the already loaded user.
+    """
+    async def dispatch(self, request, *args, **kwargs):
+        is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+        if not is_authenticated:
+            return self.handle_no_permission()
+        return await super(LoginRequiredMixin, self).dispatch(request, *args, **kwargs)
+
+
+class ReplicaReadMixin:
+    """
+    Lets the view read from the read replicas, see project.replicas.
+
+    Put it first among the bases, so all queries of the view may use a replica; users and
+    sessions are always read from the primary. A request that writes is still pinned to
+    the primary database.
+    """
+    def dispatch(self, request, *args, **kwargs):
+        use_replicas()
+        return super().dispatch(request, *args, **kwargs)
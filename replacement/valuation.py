@@ -0,0 +1,154 @@
+"""
+Fleet valuation
+
+The age in months, the residual value and the depreciation bucket of Assets are
+computed by the database as annotations, so a listing of a store's or brand's fleet
+with current values is one query however many devices it has.
+
+The expressions follow calculation.age_in_months and the residual value of
+calculation.score; "today" is a constant of the query, so the month-end rule of
+age_in_months is decided in Python when the query is built. On SQLite the date parts
+are taken with the native strftime instead of Django's Python function, which is
+several times faster over a whole fleet.
+"""
+from calendar import monthrange
+from datetime import datetime
+
+from django.db.models import BigIntegerField, Case, Count, F, FloatField, IntegerField, Sum, Value, When
+from django.db.models.functions import Cast, ExtractDay, ExtractMonth, ExtractYear, Greatest, NullIf
+from django.db.models.lookups import GreaterThan
+
+BUCKET_0_25 = "0-25"
+BUCKET_25_50 = "25-50"
+BUCKET_50_75 = "50-75"
+BUCKET_75_100 = "75-100"
+BUCKET_WRITTEN_OFF = "written-off"
+
+# Cast doby odpisu, ktera uz uplynula
+DEPRECIATION_BUCKETS = [
+    (BUCKET_0_25, "Odepsáno do 25 %"),
+    (BUCKET_25_50, "Odepsáno 25–50 %"),
+    (BUCKET_50_75, "Odepsáno 50–75 %"),
+    (BUCKET_75_100, "Odepsáno 75–100 %"),
+    (BUCKET_WRITTEN_OFF, "Plně odepsáno"),
+]
+
+
+class StrftimeExtractMixin:
+    """Extracts the date part with strftime on SQLite, other databases use the Extract's SQL."""
+    strftime_format = None
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        sql, params = compiler.compile(self.lhs)
+        # %% kvuli nahrazovani parametru v dotazu
+        return f"CAST(strftime('{self.strftime_format}', {sql}) AS INTEGER)", params
+
+
+class DateYear(StrftimeExtractMixin, ExtractYear):
+    strftime_format = "%%Y"
+
+
+class DateMonth(StrftimeExtractMixin, ExtractMonth):
+    strftime_format = "%%m"
+
+
+class DateDay(StrftimeExtractMixin, ExtractDay):
+    strftime_format = "%%d"
+
+
+def age_months_expression(today):
+    """
+    Age of the device in whole months, see calculation.age_in_months.
+
+    A production date in the future counts as age 0.
+
+    :param today: Date the age is calculated for.
+    :return: Expression for the annotation.
+    """
+    months = (
+        (Value(today.year) - DateYear("production_date")) * 12
+        + Value(today.month) - DateMonth("production_date")
+    )
+    # Posledni den mesice se pocita kazdy zapocaty mesic
+    if today.day != monthrange(today.year, today.month)[1]:
+        months = months - Case(
+            When(GreaterThan(DateDay("production_date"), today.day), then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    return Greatest(months, Value(0), output_field=IntegerField())
+
+
+def residual_value_expression():
+    """
+    Residual value of the device from the annotated age_months, rounded to hellers half up
+    in integers like calculation.residual_value_hellers.
+
+    :return: Expression for the annotation, NULL for a zero write-off length.
+    """
+    write_off_months = NullIf(F("hardware__write_off_length") * 12, Value(0))
+    remaining_months = Cast(Greatest(write_off_months - F("age_months"), Value(0)), BigIntegerField())
+    # Celociselne deleni, citatel je kladny
+    hellers = (
+        (remaining_months * F("hardware__hw_price") * Value(200) + write_off_months) / (Value(2) * write_off_months)
+    )
+    return Cast(hellers, FloatField()) / Value(100.0)
+
+
+def depreciation_bucket_expression():
+    """
+    Bucket of the elapsed part of the write-off length from the annotated age_months.
+
+    :return: Expression for the annotation, one of the values of DEPRECIATION_BUCKETS.
+    """
+    write_off_length = F("hardware__write_off_length")
+    return Case(
+        When(age_months__lt=write_off_length * 3, then=Value(BUCKET_0_25)),
+        When(age_months__lt=write_off_length * 6, then=Value(BUCKET_25_50)),
+        When(age_months__lt=write_off_length * 9, then=Value(BUCKET_50_75)),
+        When(age_months__lt=write_off_length * 12, then=Value(BUCKET_75_100)),
+        default=Value(BUCKET_WRITTEN_OFF),
+    )
+
+
+def with_valuation(queryset, today=None):
+    """
+    Annotates the assets with age_months, residual_value and depreciation_bucket.
+
+    :param queryset: Queryset of Assets.
+    :param today: Date the valuation is made for, defaults to today.
+    :return: Annotated queryset with the hardware and its brand selected.
+    """
+    today = today or datetime.today().date()
+    return (
+        queryset.select_related("hardware__brand_name")
+        .annotate(age_months=age_months_expression(today))
+        .annotate(residual_value=residual_value_expression(), depreciation_bucket=depreciation_bucket_expression())
+    )
+
+
+def valuation_totals(queryset, today=None):
+    """
+    Counts the assets and sums their residual values per depreciation bucket in one query.
+
+    :param queryset: Queryset of Assets.
+    :param today: Date the valuation is made for, defaults to today.
+    :return: List of dictionaries with bucket, label, count and residual_value in the order
+        of DEPRECIATION_BUCKETS, with the buckets without assets included.
+    """
+    rows = (
+        with_valuation(queryset, today)
+        .values("depreciation_bucket")
+        .annotate(count=Count("pk"), total=Sum("residual_value"))
+        .order_by()
+    )
+    totals = {row["depreciation_bucket"]: row for row in rows}
+    return [
+        {
+            "bucket": bucket,
+            "label": label,
+            "count": totals.get(bucket, {}).get("count", 0),
+            "residual_value": totals.get(bucket, {}).get("total") or 0,
+        }
+        for bucket, label in DEPRECIATION_BUCKETS
+    ]
@@ -1,12 +1,27 @@
+from datetime import datetime
+
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.shortcuts import get_object_or_404
+from django.db.models import Prefetch, ProtectedError
+from django.http import FileResponse, Http404, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse, \
+    StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse, reverse_lazy
+from django.views import View
 from django.views.generic import ListView, FormView, UpdateView, CreateView, TemplateView, DeleteView, \
     DetailView
 from django.contrib import messages
 
-from replacement.forms import ReplacementForm, HardwareForm
-from replacement.models import Hardware
-from replacement.utils import RedirectToCorrectBrandMixin
+from replacement import export, valuation
+from replacement.cache import acached_brand_listing, cached_brand_listing
+from replacement.context_processors import abrands
+from replacement.forms import ExportScenarioForm, HardwareImportForm, ReplacementForm, HardwareForm
+from replacement.jobs import enqueue, job_file, store_job_file
+from replacement.models import Asset, Brand, BrandWriteOffSummary, Hardware, Job
+from replacement.search import search_hardware
+from replacement.thresholds import detail_ages, thresholds_for
+from replacement.utils import AsyncLoginRequiredMixin, KeysetPaginationMixin, KeysetPaginator, \
+    RedirectToCorrectBrandMixin, ReplicaReadMixin
 
 
 class HomePageTemplateView(LoginRequiredMixin, TemplateView):
@@ -28,11 +43,32 @@ class HomePageTemplateView(LoginRequiredMixin, TemplateView):
         return context
 
 
+class BrandDashboardView(ReplicaReadMixin, LoginRequiredMixin, ListView):
+    """Login required dashboard with the summary of every brand.
+    Reads the incrementally maintained BrandSummary tables, no aggregation over the hardware.
+    """
+    template_name = "brand_dashboard_view_page_template.html"
+    context_object_name = "brands"
+
+    def get_queryset(self):
+        """
+        Returns the brands with their summaries and write-off distributions.
+
+        :return: Queryset of brands.
+        """
+        write_offs = BrandWriteOffSummary.objects.filter(hardware_count__gt=0)
+        return (
+            Brand.objects.select_related("summary")
+            .prefetch_related(Prefetch("write_off_summaries", queryset=write_offs))
+            .order_by("brand_name")
+        )
+
+
 # ***********************************
 # Hardware views
 # ***********************************
 
-class HardwareDetailListingView(LoginRequiredMixin, DetailView):
+class HardwareDetailListingView(ReplicaReadMixin, LoginRequiredMixin, DetailView):
     """Login required view for hardware detail page.
     Displays detailed information about a specific hardware item.
     """
@@ -42,13 +78,13 @@ class HardwareDetailListingView(LoginRequiredMixin, DetailView):
 
     def get_context_data(self, **kwargs):
         """
-        Adds the user's username to the context for display on the page.
+        Adds the precomputed break-even repair costs for every year of age.
 
         :param kwargs: Additional context arguments passed to the method.
-        :return: Context with the user's username.
+        :return: Context with the thresholds.
         """
         context = super().get_context_data(**kwargs)
-
+        context["thresholds"] = thresholds_for(self.object, detail_ages())
         return context
 
 
@@ -131,10 +167,16 @@ class HardwareDeleteView(LoginRequiredMixin, RedirectToCorrectBrandMixin, Delete
         """Displays a success message when the hardware is successfully deleted.
 
         :param form: The form for hardware deletion.
-        :return: Redirects to the success URL after deletion.
-        """
+        :return: Redirects to the success URL after deletion, or back to the page when devices of
+            the hardware are still in use.
+        """
+        try:
+            response = super().form_valid(form)
+        except ProtectedError:
+            messages.error(self.request, "Stroj nelze vymazat, v prodejnách jsou jeho zařízení v provozu.")
+            return HttpResponseRedirect(self.request.get_full_path())
         messages.success(self.request, f"Stroj byl úspěšně vymazán")
-        return super().form_valid(form)
+        return response
 
 
     def get_context_data(self, **kwargs):
@@ -156,6 +198,17 @@ class ReplacementCalculationView(LoginRequiredMixin, FormView):
     form_class = ReplacementForm
     access_rights = ["editor"]
 
+    def get_initial(self):
+        """
+        Prefills the production date from the query string, as linked from the fleet listing.
+
+        :return: Initial data of the form.
+        """
+        initial = super().get_initial()
+        if self.request.GET.get("hw_production_date"):
+            initial["hw_production_date"] = self.request.GET["hw_production_date"]
+        return initial
+
     def get_context_data(self, **kwargs):
         """
         Adds the hardware details to the context for the replacement calculation.
@@ -167,7 +220,6 @@ class ReplacementCalculationView(LoginRequiredMixin, FormView):
 
         hardware_id = self.kwargs.get('pk') # Get hardware ID from URL
         context['hardware'] = get_object_or_404(Hardware, pk=hardware_id) # Fetch hardware by ID
-        print(context)
         return context
 
     def form_valid(self, form):
@@ -181,11 +233,11 @@ class ReplacementCalculationView(LoginRequiredMixin, FormView):
         hardware = get_object_or_404(Hardware, pk=hardware_id)
 
         replacement_calculation, message = form.calculate(hardware) # Perform the calculation
+        form.record_decision(hardware, replacement_calculation, user=self.request.user)
 
         context = self.get_context_data(form=form)
         context['replacement_calculation'] = replacement_calculation
         context['message'] = message # Add the calculation result and message to context
-        print(message)
         return self.render_to_response(context) # Render the result
 
 
@@ -196,112 +248,441 @@ class ReplacementCalculationView(LoginRequiredMixin, FormView):
 # ***********************************
 
 
-class KfcListingView(LoginRequiredMixin, ListView):
-    """Brand listing view, shows Hw of KFC"""
-    template_name = "kfc_listing_view_page_template.html"
+class BrandListingView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
+    """Brand listing view, shows Hw of the brand given by the slug in the URL.
+    Paginated by keyset on (hw_name, id), so every page costs the same.
+    """
+    template_name = "brand_listing_view_page_template.html"
     model = Hardware
     context_object_name = "hardware"
     access_rights = ["editor"]
+    paginate_by = 50
 
     def get_queryset(self):
         """
-        Filters and returns hardware items for the KFC brand.
+        Filters and returns hardware items for the brand from the URL.
 
-        :return: Queryset of hardware for KFC and order by hw_name alphabetically.
+        :return: Queryset of hardware for the brand.
         """
-        return Hardware.objects.filter(brand_name__brand_name="KFC").order_by("hw_name")
+        self.brand = get_object_or_404(Brand, slug=self.kwargs["slug"])
+        return Hardware.objects.filter(brand_name=self.brand)
+
+    def get_keyset_page(self, paginator):
+        """
+        Returns the page from the cache, the cache is invalidated by signals whenever the brand changes.
+
+        :param paginator: KeysetPaginator of the brand's hardware.
+        :return: KeysetPage.
+        """
+        after = self.request.GET.get("after", "")
+        before = self.request.GET.get("before", "")
+        return cached_brand_listing(
+            self.brand,
+            (paginator.per_page, after, before),
+            lambda: super(BrandListingView, self).get_keyset_page(paginator),
+        )
 
     def get_context_data(self, **kwargs):
         """
-        Adds the user's username to the context for display on the page.
+        Adds the brand, the user's username and the cache version of the rows to the context.
 
         :param kwargs: Additional context arguments passed to the method.
-        :return: Context with the user's username.
+        :return: Context with the brand, the user's username and the row cache settings.
         """
         context = super().get_context_data(**kwargs)
+        context["brand"] = self.brand
         context["user_name"] = self.request.user.username
+        context["listing_version"] = self.brand.cache_version
+        context["listing_cache_timeout"] = settings.REPLACEMENT_LISTING_CACHE_TIMEOUT
 
         return context
 
-class StarbucksListingView(LoginRequiredMixin, ListView):
-    """Brand listing view, shows Hw of Starbucks"""
-    template_name = "starbucks_listing_view_page_template.html"
-    model = Hardware
-    context_object_name = "hardware"
+
+# ***********************************
+# Export
+# ***********************************
+
+
+class HardwareExportView(ReplicaReadMixin, LoginRequiredMixin, View):
+    """Streams the hardware of one brand (slug in the URL) or of all brands as CSV or XLSX.
+    With ?production_date=&repair_offer=&service_cost= every device is also scored for that scenario.
+    """
+    content_types = {
+        "csv": "text/csv; charset=utf-8",
+        "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    }
+
+    def get(self, request, *args, **kwargs):
+        """
+        Starts streaming the export.
+
+        :param request: The HTTP request object.
+        :return: Streaming response with the file.
+        """
+        file_format = self.kwargs["file_format"]
+        if file_format not in self.content_types:
+            raise Http404("Neznámý formát exportu.")
+
+        form = ExportScenarioForm(request.GET)
+        if not form.is_valid():
+            return HttpResponseBadRequest(" ".join(form.errors.get("__all__", [])) or form.errors.as_text())
+        scenario = form.scenario()
+
+        brand = get_object_or_404(Brand, slug=self.kwargs["slug"]) if "slug" in self.kwargs else None
+        queryset, name = export.export_queryset(brand)
+
+        chunks = export.export_chunks(queryset, scenario, chunk_size=settings.REPLACEMENT_EXPORT_CHUNK_SIZE)
+        header = export.header_for(scenario)
+        if file_format == "csv":
+            content = export.stream_csv(chunks, header)
+        else:
+            content = export.stream_xlsx(chunks, header)
+
+        response = StreamingHttpResponse(content, content_type=self.content_types[file_format])
+        filename = export.export_filename(name, file_format, datetime.today().date())
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
+# ***********************************
+# Background jobs
+# ***********************************
+
+
+class JobQuerysetMixin:
+    """Limits the jobs to those of the user, staff sees the jobs of everybody."""
+
+    def get_queryset(self):
+        """
+        Returns the jobs the user may see.
+
+        :return: Queryset of jobs.
+        """
+        jobs = Job.objects.select_related("user")
+        if self.request.user.is_staff:
+            return jobs
+        return jobs.filter(user=self.request.user)
+
+
+class JobListView(LoginRequiredMixin, JobQuerysetMixin, ListView):
+    """Login required list of the background jobs, the page polls the progress of the unfinished ones."""
+    template_name = "job_list_view_page_template.html"
+    context_object_name = "jobs"
+    paginate_by = 50
+
+
+class JobStatusView(LoginRequiredMixin, JobQuerysetMixin, View):
+    """Returns the status and progress of a job as JSON, polled by the jobs page."""
+
+    def get(self, request, *args, **kwargs):
+        """
+        Returns the status of the job.
+
+        :param request: The HTTP request object.
+        :return: JSON response with the status, progress, error and result of the job.
+        """
+        job = get_object_or_404(self.get_queryset(), pk=self.kwargs["pk"])
+        download = job.status == Job.STATUS_DONE and bool((job.result or {}).get("file"))
+        return JsonResponse({
+            "id": job.pk,
+            "status": job.status,
+            "status_label": job.get_status_display(),
+            "is_finished": job.is_finished,
+            "progress_done": job.progress_done,
+            "progress_total": job.progress_total,
+            "progress_percent": job.progress_percent,
+            "progress_message": job.progress_message,
+            "attempts": job.attempts,
+            "error": job.error_summary,
+            "result": job.result if job.is_finished else None,
+            "download_url": reverse("replacement:job-download", args=[job.pk]) if download else None,
+        })
+
+
+class JobDownloadView(LoginRequiredMixin, JobQuerysetMixin, View):
+    """Downloads the file produced by a finished job."""
+
+    def get(self, request, *args, **kwargs):
+        """
+        Sends the file of the job.
+
+        :param request: The HTTP request object.
+        :raises Http404: If the job has no file or the file was already deleted.
+        :return: File response.
+        """
+        job = get_object_or_404(self.get_queryset(), pk=self.kwargs["pk"], status=Job.STATUS_DONE)
+        result = job.result or {}
+        if not result.get("file"):
+            raise Http404("Úloha nemá soubor ke stažení.")
+        try:
+            file = open(job_file(result["file"]), "rb")
+        except OSError:
+            raise Http404("Soubor úlohy už byl smazán.")
+        return FileResponse(file, as_attachment=True, filename=result.get("filename") or result["file"])
+
+
+class HardwareImportJobView(LoginRequiredMixin, FormView):
+    """Login required upload of a CSV file with hardware, imported by the background workers."""
+    template_name = "hardware_import_view_page_template.html"
+    form_class = HardwareImportForm
+    success_url = reverse_lazy("replacement:job-list")
     access_rights = ["editor"]
 
+    def form_valid(self, form):
+        """
+        Stores the uploaded file and queues its import.
+
+        :param form: The form with the uploaded file.
+        :return: Redirects to the list of jobs.
+        """
+        name = store_job_file(form.cleaned_data["csv_file"].chunks(), suffix=".csv")
+        job = enqueue(
+            "import_hardware",
+            {"file": name, "delete_missing": form.cleaned_data["delete_missing"]},
+            user=self.request.user,
+        )
+        messages.success(self.request, f"Import byl zařazen do fronty jako úloha {job.pk}.")
+        return super().form_valid(form)
+
+
+class HardwareExportJobView(LoginRequiredMixin, View):
+    """Queues the export of one brand (slug in the URL) or of all brands as a background job.
+    Accepts the same scenario parameters in the query string as HardwareExportView.
+    """
+
+    def post(self, request, *args, **kwargs):
+        """
+        Queues the export.
+
+        :param request: The HTTP request object.
+        :return: Redirects to the list of jobs.
+        """
+        file_format = self.kwargs["file_format"]
+        if file_format not in HardwareExportView.content_types:
+            raise Http404("Neznámý formát exportu.")
+        brand = get_object_or_404(Brand, slug=self.kwargs["slug"]) if "slug" in self.kwargs else None
+
+        form = ExportScenarioForm(request.GET)
+        if not form.is_valid():
+            return HttpResponseBadRequest(" ".join(form.errors.get("__all__", [])) or form.errors.as_text())
+
+        job = enqueue(
+            "export_hardware",
+            {
+                "format": file_format,
+                "brand": brand.slug if brand else None,
+                "scenario": {name: request.GET[name] for name in form.fields if request.GET.get(name)},
+            },
+            user=request.user,
+        )
+        messages.success(request, f"Export byl zařazen do fronty jako úloha {job.pk}.")
+        return HttpResponseRedirect(reverse("replacement:job-list"))
+
+
+# ***********************************
+# Fleet
+# ***********************************
+
+
+class AssetFleetView(ReplicaReadMixin, LoginRequiredMixin, KeysetPaginationMixin, ListView):
+    """Lists the devices of a brand (slug in the URL) or of a store with their current residual values.
+    The valuation is computed by the database, one query per page and one for the totals.
+    """
+    template_name = "asset_fleet_view_page_template.html"
+    context_object_name = "assets"
+    access_rights = ["editor"]
+    paginate_by = 50
+    keyset_field = "serial_number"
+
     def get_queryset(self):
         """
-        Filters and returns hardware items for the Starbucks brand.
+        Returns the assets of the brand or the store with the valuation annotations.
 
-        :return: Queryset of hardware for Starbucks and order by hw_name alphabetically.
+        :return: Annotated queryset of assets.
         """
-        return Hardware.objects.filter(brand_name__brand_name="Starbucks").order_by("hw_name")
+        if "slug" in self.kwargs:
+            self.brand = get_object_or_404(Brand, slug=self.kwargs["slug"])
+            self.store = None
+            self.fleet = Asset.objects.filter(hardware__brand_name=self.brand)
+        else:
+            self.brand = None
+            self.store = self.kwargs["store"]
+            self.fleet = Asset.objects.filter(store=self.store)
+        # Prahy opravy z mesicniho prepoctu (rescore_fleet)
+        return valuation.with_valuation(self.fleet).select_related("score")
 
     def get_context_data(self, **kwargs):
         """
-        Adds the user's username to the context for display on the page.
+        Adds the brand or the store, the totals per depreciation bucket and the user's username to the context.
 
         :param kwargs: Additional context arguments passed to the method.
-        :return: Context with the user's username.
+        :return: Context with the fleet and its totals.
         """
         context = super().get_context_data(**kwargs)
+        context["brand"] = self.brand
+        context["store"] = self.store
+        context["totals"] = valuation.valuation_totals(self.fleet)
         context["user_name"] = self.request.user.username
 
         return context
 
-class BurgerkingListingView(LoginRequiredMixin, ListView):
-    """Brand listing view, shows Hw of Burger King"""
-    template_name = "burger_king_listing_view_page_template.html"
-    model = Hardware
+
+# ***********************************
+# Search
+# ***********************************
+
+
+class HardwareSearchView(ReplicaReadMixin, LoginRequiredMixin, ListView):
+    """Searches the hardware of all brands by the ?q= parameter.
+    Results are ranked by relevance and paginated.
+    """
+    template_name = "hardware_search_view_page_template.html"
     context_object_name = "hardware"
     access_rights = ["editor"]
-    brand_name = "Burger King"
+    paginate_by = 50
 
     def get_queryset(self):
         """
-        Filters and returns hardware items for the Burger King brand.
+        Returns the hardware matching the search text.
 
-        :return: Queryset of hardware for Burger King and order by hw_name alphabetically.
+        :return: Ranked search results.
         """
-        return Hardware.objects.filter(brand_name__brand_name="Burger King").order_by("hw_name")
+        self.query = self.request.GET.get("q", "").strip()
+        # Hledani muze jit na repliku, viz ReplicaReadMixin
+        return search_hardware(self.query, using=Hardware.objects.db)
 
     def get_context_data(self, **kwargs):
         """
-        Adds the user's username to the context for display on the page.
+        Adds the search text and the user's username to the context for display on the page.
 
         :param kwargs: Additional context arguments passed to the method.
-        :return: Context with the user's username.
+        :return: Context with the search text and the user's username.
         """
         context = super().get_context_data(**kwargs)
+        context["query"] = self.query
         context["user_name"] = self.request.user.username
 
         return context
 
-class PizzahutListingView(LoginRequiredMixin, ListView):
-    """Brand listing view, shows Hw of Pizza Hut"""
-    template_name = "pizza_hut_listing_view_page_template.html"
-    model = Hardware
-    context_object_name = "hardware"
+
+# ***********************************
+# Async views
+# ***********************************
+# Same pages as BrandListingView, HardwareDetailListingView and ReplacementCalculationView,
+# served without the sync-to-async thread pool under an ASGI server.
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    """
+    Async version of get_object_or_404.
+
+    :param queryset: Queryset to search.
+    :param kwargs: Lookup parameters.
+    :raises Http404: If the object does not exist.
+    :return: The object.
+    """
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f"{queryset.model._meta.verbose_name} neexistuje.")
+
+
+class AsyncBrandListingView(AsyncLoginRequiredMixin, View):
+    """Async brand listing view, see BrandListingView."""
+    template_name = "brand_listing_view_page_template.html"
     access_rights = ["editor"]
+    paginate_by = 50
+
+    async def get(self, request, *args, **kwargs):
+        """
+        Renders the keyset page of the brand's hardware selected by the cursors in the query string.
+
+        :param request: The HTTP request object.
+        :return: Rendered listing page.
+        """
+        brand = await aget_object_or_404(Brand.objects, slug=self.kwargs["slug"])
+        paginator = KeysetPaginator(Hardware.objects.filter(brand_name=brand), self.paginate_by)
+        after = request.GET.get("after", "")
+        before = request.GET.get("before", "")
+        page = await acached_brand_listing(
+            brand,
+            (paginator.per_page, after, before),
+            lambda: paginator.apage(after=after, before=before),
+        )
+
+        context = {
+            "brand": brand,
+            "hardware": page.object_list,
+            "page_obj": page,
+            "paginator": paginator,
+            "is_paginated": page.has_other_pages(),
+            "user_name": request.user.username,
+            "listing_version": brand.cache_version,
+            "listing_cache_timeout": settings.REPLACEMENT_LISTING_CACHE_TIMEOUT,
+            **await abrands(request),
+        }
+        return render(request, self.template_name, context)
+
+
+class AsyncHardwareDetailView(ReplicaReadMixin, AsyncLoginRequiredMixin, View):
+    """Async hardware detail view, see HardwareDetailListingView."""
+    template_name = "hardware_detail_view_page_template.html"
 
-    def get_queryset(self):
+    async def get(self, request, *args, **kwargs):
         """
-        Filters and returns hardware items for the Pizza Hut brand.
+        Renders the detail of the hardware.
 
-        :return: Queryset of hardware for Pizza Hut and order by hw_name alphabetically.
+        :param request: The HTTP request object.
+        :return: Rendered detail page.
         """
+        hardware = await aget_object_or_404(Hardware.objects.select_related("brand_name"), pk=self.kwargs["pk"])
+        thresholds = [threshold async for threshold in thresholds_for(hardware, detail_ages())]
+        context = {"hardware": hardware, "object": hardware, "thresholds": thresholds, **await abrands(request)}
+        return render(request, self.template_name, context)
 
-        return Hardware.objects.filter(brand_name__brand_name="Pizza hut").order_by("hw_name")
 
-    def get_context_data(self, **kwargs):
+class AsyncReplacementCalculationView(AsyncLoginRequiredMixin, View):
+    """Async replacement calculation view, see ReplacementCalculationView."""
+    template_name = "replacement_calculation_form_page_template.html"
+    access_rights = ["editor"]
+
+    async def get(self, request, *args, **kwargs):
         """
-        Adds the user's username to the context for display on the page.
+        Renders the empty calculation form.
 
-        :param kwargs: Additional context arguments passed to the method.
-        :return: Context with the user's username.
+        :param request: The HTTP request object.
+        :return: Rendered form page.
         """
-        context = super().get_context_data(**kwargs)
-        context["user_name"] = self.request.user.username
+        hardware = await aget_object_or_404(Hardware.objects, pk=self.kwargs["pk"])
+        return await self.render_form(request, ReplacementForm(), hardware)
+
+    async def post(self, request, *args, **kwargs):
+        """
+        Performs the replacement calculation based on the input form data.
+
+        :param request: The HTTP request object.
+        :return: Rendered form page with the calculation result.
+        """
+        hardware = await aget_object_or_404(Hardware.objects, pk=self.kwargs["pk"])
+        form = ReplacementForm(data=request.POST)
+        if not form.is_valid():
+            return await self.render_form(request, form, hardware)
 
-        return context
\ No newline at end of file
+        replacement_calculation, message = form.calculate(hardware) # Vypocet nepouziva databazi
+        form.record_decision(hardware, replacement_calculation, user=request.user) # Jen do bufferu, bez dotazu
+        return await self.render_form(
+            request, form, hardware, replacement_calculation=replacement_calculation, message=message
+        )
+
+    async def render_form(self, request, form, hardware, **extra_context):
+        """
+        Renders the form page.
+
+        :param request: The HTTP request object.
+        :param form: ReplacementForm to display.
+        :param hardware: Hardware being calculated.
+        :param extra_context: Calculation result and message.
+        :return: Rendered form page.
+        """
+        context = {"form": form, "hardware": hardware, **extra_context, **await abrands(request)}
+        return render(request, self.template_name, context)